@@ -0,0 +1,181 @@
+"""HTTP-level benchmark of the books and auth endpoints, with regression gates.
+
+Seeds a synthetic catalogue, then drives the ASGI app in-process through
+httpx: each scenario sends --requests requests from --concurrency clients
+and reports p50/p95/p99 latency, throughput and peak RSS growth. The
+response cache and rate limits are off so every request reaches the
+database.
+
+    python -m benchmarks.api_bench --books 100000 --output results.json
+    python -m benchmarks.api_bench --books 100000 --baseline results.json --threshold 0.2
+
+With --baseline the run fails (exit 1) when a scenario's p95 grows, or its
+throughput drops, by more than --threshold relative to the baseline.
+"""
+import argparse
+import asyncio
+import json
+import random
+import resource
+import sys
+import time
+import uuid
+
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from src.cache import cache
+from src.database import create_engine, get_async_session
+from src.main import app
+from src.schemas import ALLOWED_GENRES
+from src.utils.limiter import limiter
+from .seed import seed_catalogue
+
+PASSWORD = "bench-password"
+
+
+def percentile(samples: list, p: float) -> float:
+    return samples[min(int(len(samples) * p), len(samples) - 1)]
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def import_csv(rng: random.Random, rows: int) -> str:
+    lines = ["title,author,genre,published_year"]
+    for _ in range(rows):
+        lines.append(f"Bench {uuid.uuid4().hex[:12]},Bench Author {rng.randrange(50)},"
+                     f"{rng.choice(ALLOWED_GENRES)},{rng.randint(1900, 2020)}")
+    return "\n".join(lines) + "\n"
+
+
+def scenarios(args, username: str, headers: dict):
+    """name -> (rng -> request kwargs)"""
+    books = args.books
+    return {
+        "list": lambda rng: dict(method="GET", url="/books/", params={
+            "skip": rng.randrange(min(books, 10000)), "limit": 20}),
+        "list_filtered": lambda rng: dict(method="GET", url="/books/", params={
+            "genre": rng.choice(ALLOWED_GENRES), "year_from": 1990, "year_to": 1999,
+            "sort": "published_year", "limit": 50}),
+        "get": lambda rng: dict(method="GET", url=f"/books/{rng.randint(1, books)}"),
+        "export": lambda rng: dict(method="GET", url="/books/export", params={
+            "format": "ndjson", "genre": rng.choice(ALLOWED_GENRES), "year_from": (y := rng.randint(1900, 2020)),
+            "year_to": y}),
+        "import": lambda rng: dict(method="POST", url="/books/import", headers=headers, files={
+            "file": ("bench.csv", import_csv(rng, args.import_rows), "text/csv")}),
+        "token": lambda rng: dict(method="POST", url="/auth/token",
+                                  data={"username": username, "password": PASSWORD}),
+    }
+
+
+async def drive(client: AsyncClient, make_request, args) -> dict:
+    latencies, errors = [], 0
+    remaining = iter(range(args.requests))
+    rss_before = peak_rss_mb()
+
+    async def worker(seed: int):
+        nonlocal errors
+        rng = random.Random(seed)
+        for _ in remaining:
+            t = time.perf_counter()
+            r = await client.request(**make_request(rng))
+            latencies.append(time.perf_counter() - t)
+            if r.status_code >= 400 and r.status_code != 404:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        "throughput_rps": round(len(latencies) / elapsed, 1),
+        "peak_rss_growth_mb": round(peak_rss_mb() - rss_before, 1),
+    }
+
+
+def regressions(results: dict, baseline: dict, threshold: float) -> list:
+    failures = []
+    for name, current in results["scenarios"].items():
+        base = baseline.get("scenarios", {}).get(name)
+        if base is None:
+            continue
+        if current["p95_ms"] > base["p95_ms"] * (1 + threshold):
+            failures.append(f"{name}: p95 {base['p95_ms']}ms -> {current['p95_ms']}ms")
+        if current["throughput_rps"] < base["throughput_rps"] * (1 - threshold):
+            failures.append(f"{name}: throughput {base['throughput_rps']} -> {current['throughput_rps']} req/s")
+    return failures
+
+
+async def run(args) -> int:
+    engine = create_engine(args.url)
+    started = time.perf_counter()
+    await seed_catalogue(engine, args.books)
+    print(f"catalogue of {args.books} books ready in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+    session_maker = async_sessionmaker(engine, expire_on_commit=False)
+
+    async def bench_session():
+        async with session_maker() as session:
+            yield session
+
+    app.dependency_overrides[get_async_session] = bench_session
+    limiter.enabled = False
+    cache.enabled = False
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://bench") as client:
+        username = f"bench-{uuid.uuid4().hex[:8]}"
+        r = await client.post("/auth/register", json={"username": username, "password": PASSWORD})
+        headers = {"Authorization": f"Bearer {r.json()['access_token']}"}
+
+        results = {
+            "books": args.books, "dialect": engine.dialect.name, "concurrency": args.concurrency,
+            "scenarios": {},
+        }
+        available = scenarios(args, username, headers)
+        for name in args.scenarios:
+            stats = await drive(client, available[name], args)
+            results["scenarios"][name] = stats
+            print(f"{name:<14} " + " ".join(f"{k}={v}" for k, v in stats.items()), file=sys.stderr)
+
+    app.dependency_overrides.clear()
+    await engine.dispose()
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            failures = regressions(results, json.load(f), args.threshold)
+        for failure in failures:
+            print(f"REGRESSION {failure}", file=sys.stderr)
+        return 1 if failures else 0
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="sqlite+aiosqlite:///bench_api.db")
+    parser.add_argument("--books", type=int, default=100_000, help="e.g. 10000, 100000 or 1000000")
+    parser.add_argument("--requests", type=int, default=500, help="per scenario")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--import-rows", type=int, default=500, help="rows per import request")
+    parser.add_argument("--scenarios", nargs="+", default=["list", "list_filtered", "get", "export", "import", "token"])
+    parser.add_argument("--output", help="write results JSON here instead of stdout")
+    parser.add_argument("--baseline", help="results JSON of an earlier run to gate against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed relative regression")
+    sys.exit(asyncio.run(run(parser.parse_args())))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Login latency under a burst of concurrent logins, inline bcrypt vs the hash pool.
+
+Each login is one bcrypt verification. While they run, a ticker measures how
+late the event loop wakes it up, which is what every other request on the
+worker would wait on top of its own work.
+
+    python -m benchmarks.auth_bench --logins 64 --rounds 12
+"""
+import argparse
+import asyncio
+import time
+
+from passlib.context import CryptContext
+
+from src.auth import HashPool
+from .search_bench import summarize
+
+TICK = 0.01
+
+
+async def ticker(stalls: list, done: asyncio.Event):
+    while not done.is_set():
+        t = time.perf_counter()
+        await asyncio.sleep(TICK)
+        stalls.append(max(time.perf_counter() - t - TICK, 0))
+
+
+async def burst(verify, logins: int):
+    latencies, stalls = [], []
+    done = asyncio.Event()
+    tick = asyncio.create_task(ticker(stalls, done))
+
+    # all logins arrive at once; latency counts from arrival, queueing included
+    start = time.perf_counter()
+
+    async def login():
+        await verify()
+        latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(login() for _ in range(logins)))
+    done.set()
+    await tick
+    return latencies, stalls
+
+
+async def run(args):
+    context = CryptContext(schemes=["bcrypt"], bcrypt__rounds=args.rounds)
+    hashed = context.hash("password123")
+
+    async def inline():
+        context.verify("password123", hashed)
+
+    print(f"logins={args.logins} rounds={args.rounds}")
+    latencies, stalls = await burst(inline, args.logins)
+    print(summarize("inline", latencies), f"loop stall max={max(stalls, default=0) * 1000:.0f}ms")
+
+    for workers in args.workers:
+        pool = HashPool(workers=workers, queue_limit=args.logins)
+        latencies, stalls = await burst(lambda: pool.run(context.verify, "password123", hashed), args.logins)
+        print(summarize(f"pool={workers}", latencies), f"loop stall max={max(stalls, default=0) * 1000:.0f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--logins", type=int, default=64)
+    parser.add_argument("--rounds", type=int, default=12)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""Connection pool load test: request latency and pool waits per pool configuration.
+
+Each simulated request checks out a connection, runs one query and holds the
+connection for --hold ms (standing in for the rest of its transaction), with
+--clients requests in flight at once. Latency includes the wait for a
+connection; requests that wait past --timeout count as pool timeouts.
+
+    python -m benchmarks.pool_bench --url postgresql+asyncpg://... --configs 5:0 10:10 20:20
+"""
+import argparse
+import asyncio
+import time
+
+from sqlalchemy import text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+
+from src.database import InstrumentedQueuePool, create_engine, pool_stats
+from .search_bench import summarize
+
+
+async def load(engine, args):
+    latencies, timeouts, peak_waiting = [], 0, 0
+    deadline = time.perf_counter() + args.seconds
+
+    async def client():
+        nonlocal timeouts
+        while time.perf_counter() < deadline:
+            t = time.perf_counter()
+            try:
+                async with engine.connect() as conn:
+                    await conn.execute(text("SELECT 1"))
+                    await asyncio.sleep(args.hold / 1000)
+            except PoolTimeoutError:
+                timeouts += 1
+                continue
+            latencies.append(time.perf_counter() - t)
+
+    async def sampler():
+        nonlocal peak_waiting
+        while time.perf_counter() < deadline:
+            peak_waiting = max(peak_waiting, pool_stats(engine)["waiting"])
+            await asyncio.sleep(0.01)
+
+    await asyncio.gather(sampler(), *(client() for _ in range(args.clients)))
+    return latencies, timeouts, peak_waiting
+
+
+async def run(args):
+    print(f"clients={args.clients} hold={args.hold}ms seconds={args.seconds} url={args.url.split('@')[-1]}")
+    for config in args.configs:
+        size, overflow = map(int, config.split(":"))
+        engine = create_engine(args.url, poolclass=InstrumentedQueuePool, pool_size=size,
+                               max_overflow=overflow, pool_timeout=args.timeout)
+        latencies, timeouts, peak_waiting = await load(engine, args)
+        print(summarize(config, latencies),
+              f"rps={len(latencies) / args.seconds:7.0f} timeouts={timeouts} peak_waiting={peak_waiting}")
+        await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--url", default="sqlite+aiosqlite:///bench_pool.db")
+    parser.add_argument("--configs", nargs="+", default=["5:0", "10:10", "20:20"], help="pool_size:max_overflow")
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--hold", type=float, default=20, help="ms a connection is held per request")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--timeout", type=float, default=1, help="pool_timeout in seconds")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""Search latency: /books/search engines vs the ILIKE filter they replace.
+
+Times the database engine (FTS5 / tsvector + pg_trgm), the in-process
+inverted index and a plain ILIKE query over the same seeded catalogue.
+
+    python -m benchmarks.search_bench --books 1000000 --url postgresql+asyncpg://...
+"""
+import argparse
+import asyncio
+import random
+import resource
+import statistics
+import time
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from src import models
+from src.search import search_books
+from src.search_index import InvertedIndex
+from .seed import seed_catalogue
+
+
+def summarize(name: str, samples: list) -> str:
+    samples = sorted(samples)
+    pct = lambda p: samples[min(int(len(samples) * p), len(samples) - 1)] * 1000
+    return (f"{name:<8} n={len(samples):<5} mean={statistics.fmean(samples) * 1000:8.2f}ms "
+            f"p50={pct(0.5):8.2f}ms p95={pct(0.95):8.2f}ms p99={pct(0.99):8.2f}ms")
+
+
+async def run(args):
+    engine = create_async_engine(args.url)
+    started = time.perf_counter()
+    words = await seed_catalogue(engine, args.books)
+    print(f"catalogue ready in {time.perf_counter() - started:.1f}s")
+
+    rng = random.Random(7)
+    # common words, rare words and 3-letter prefixes
+    queries = rng.sample(words[:200], 10) + rng.sample(words[200:], 10) + [w[:3] for w in rng.sample(words, 10)]
+    queries = (queries * (args.queries // len(queries) + 1))[:args.queries]
+
+    session_maker = async_sessionmaker(engine)
+    timings = {"search": [], "index": [], "fuzzy": [], "ilike": []}
+    async with session_maker() as session:
+        index = InvertedIndex()
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        t = time.perf_counter()
+        await index.build(session)
+        print(f"index of {len(index)} books built in {time.perf_counter() - t:.1f}s, "
+              f"peak RSS +{(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss) / 1024:.0f}MB")
+
+        for q in queries:
+            t = time.perf_counter()
+            index.search(q, limit=20)
+            timings["index"].append(time.perf_counter() - t)
+
+            t = time.perf_counter()
+            index.search(q[:-1] + "x", limit=20, mode="fuzzy")
+            timings["fuzzy"].append(time.perf_counter() - t)
+
+            t = time.perf_counter()
+            await search_books(session, q, limit=20)
+            timings["search"].append(time.perf_counter() - t)
+
+            t = time.perf_counter()
+            stmt = (select(models.Book).join(models.Book.author)
+                    .where(models.Book.title.ilike(f"%{q}%") | models.Author.name.ilike(f"%{q}%"))
+                    .order_by(models.Book.id).limit(20))
+            (await session.execute(stmt)).scalars().all()
+            timings["ilike"].append(time.perf_counter() - t)
+
+    print(f"books={args.books} dialect={engine.dialect.name}")
+    for name, samples in timings.items():
+        print(summarize(name, samples))
+    await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--url", default="sqlite+aiosqlite:///bench_search.db")
+    parser.add_argument("--books", type=int, default=1_000_000)
+    parser.add_argument("--queries", type=int, default=300)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
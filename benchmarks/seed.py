@@ -0,0 +1,78 @@
+"""Synthetic catalogue generator shared by the benchmark scripts.
+
+Author and genre popularity are Zipf-skewed and titles are drawn from a
+skewed vocabulary, so a few terms are very common and most are rare, like a
+real catalogue.
+"""
+import itertools
+import random
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from src import models
+from src.models import Base
+from src.schemas import ALLOWED_GENRES
+
+SYLLABLES = ["ka", "lo", "mi", "ra", "den", "thor", "vel", "an", "is", "mor", "quin", "sel", "tur", "ba", "ne"]
+SURNAMES = ["Smith", "Tolkien", "Austen", "Orwell", "Christie", "Asimov", "Herbert", "Le Guin", "Pratchett"]
+
+
+def zipf_weights(n: int, s: float = 1.1):
+    return list(itertools.accumulate(1 / (i + 1) ** s for i in range(n)))
+
+
+def vocabulary(size: int, rng: random.Random):
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choices(SYLLABLES, k=rng.randint(2, 4))))
+    return sorted(words)
+
+
+def generate_rows(books: int, authors: int, seed: int = 42, vocab_size: int = 20000):
+    """Yields (author names, book rows keyed by author index) deterministically"""
+    rng = random.Random(seed)
+    words = vocabulary(vocab_size, rng)
+    rng.shuffle(words)
+    word_weights = zipf_weights(len(words))
+    author_weights = zipf_weights(authors, 0.9)
+    genre_weights = zipf_weights(len(ALLOWED_GENRES), 0.7)
+
+    names = [f"{rng.choice(words).title()} {rng.choice(SURNAMES)} {i}" for i in range(authors)]
+    author_idx = rng.choices(range(authors), cum_weights=author_weights, k=books)
+    genres = rng.choices(ALLOWED_GENRES, cum_weights=genre_weights, k=books)
+    rows = (
+        {
+            "title": " ".join(rng.choices(words, cum_weights=word_weights, k=rng.randint(1, 5))).title(),
+            "genre": genres[i],
+            "published_year": min(2024, int(rng.triangular(1800, 2024, 2010))),
+            "author": author_idx[i],
+        }
+        for i in range(books)
+    )
+    return names, rows, words
+
+
+async def seed_catalogue(engine: AsyncEngine, books: int, authors: int = None, batch_size: int = 10000,
+                         seed: int = 42) -> list:
+    """Creates the schema and fills it unless it already holds `books` rows; returns the vocabulary"""
+    authors = authors or max(books // 20, 1)
+    names, rows, words = generate_rows(books, authors, seed)
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        existing = (await conn.execute(select(func.count()).select_from(models.Book))).scalar_one()
+    if existing >= books:
+        return words
+
+    async with engine.begin() as conn:
+        for i in range(0, authors, batch_size):
+            await conn.execute(insert(models.Author.__table__),
+                               [{"name": n} for n in names[i:i + batch_size]])
+        ids = dict((await conn.execute(select(models.Author.name, models.Author.id))).all())
+
+        while chunk := list(itertools.islice(rows, batch_size)):
+            for row in chunk:
+                row["author_id"] = ids[names[row.pop("author")]]
+            await conn.execute(insert(models.Book.__table__), chunk)
+    return words
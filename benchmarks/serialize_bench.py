@@ -0,0 +1,77 @@
+"""List-page latency: ORM + from_orm serialization vs the lean row encoder.
+
+"orm" is the old GET /books/ body: select(Book) with selectinload(author),
+BookRead validation per row, jsonable_encoder and json.dumps. "rows" is the
+current one: a single JOINed core query encoded by schemas.BOOK_READ_ROW.
+Both fetch keyset pages (as with ?cursor=) and are timed from query to
+response bytes, at each page size.
+
+    python -m benchmarks.serialize_bench --books 100000 --sizes 20 100 1000
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import selectinload
+
+from src import models, schemas
+from src.crud import select_book_rows
+from src.utils.encoding import orjson
+from .search_bench import summarize
+from .seed import seed_catalogue
+
+
+async def orm_page(session, after: int, limit: int) -> bytes:
+    q = (select(models.Book).options(selectinload(models.Book.author))
+         .where(models.Book.id > after).order_by(models.Book.id).limit(limit))
+    books = (await session.execute(q)).scalars().all()
+    content = [schemas.BookRead.model_validate(b) for b in books]
+    return json.dumps(jsonable_encoder(content), separators=(",", ":")).encode()
+
+
+async def row_page(session, after: int, limit: int) -> bytes:
+    q = select_book_rows().where(models.Book.id > after).order_by(models.Book.id).limit(limit)
+    return schemas.BOOK_READ_ROW.encode_many((await session.execute(q)).all())
+
+
+async def run(args):
+    engine = create_async_engine(args.url)
+    await seed_catalogue(engine, args.books)
+    session_maker = async_sessionmaker(engine)
+    rng = random.Random(7)
+
+    print(f"books={args.books} dialect={engine.dialect.name} encoder={'orjson' if orjson else 'json'}")
+    for size in args.sizes:
+        starts = [rng.randrange(max(args.books - size, 1)) for _ in range(args.pages)]
+        timings = {"orm": [], "rows": []}
+        for after in starts:
+            # fresh sessions so the ORM identity map doesn't carry objects between pages
+            for name, page in (("orm", orm_page), ("rows", row_page)):
+                async with session_maker() as session:
+                    t = time.perf_counter()
+                    await page(session, after, size)
+                    timings[name].append(time.perf_counter() - t)
+        async with session_maker() as session:
+            a, b = await orm_page(session, starts[0], size), await row_page(session, starts[0], size)
+        assert json.loads(a) == json.loads(b), "encoders disagree"
+        for name, samples in timings.items():
+            print(summarize(f"{name}@{size}", samples))
+    await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--url", default="sqlite+aiosqlite:///bench_search.db")
+    parser.add_argument("--books", type=int, default=100_000)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[20, 100, 1000])
+    parser.add_argument("--pages", type=int, default=200)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
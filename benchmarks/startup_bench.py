@@ -0,0 +1,71 @@
+"""Cold-start cost: import time of src.main, startup handlers and the first request.
+
+Each repetition runs in a fresh interpreter, so module caches and pools start
+empty, against DATABASE_URL (a migrated SQLite file by default) and reports:
+
+    import_ms          importing src.main (the app, routes and their dependencies)
+    startup_ms         the startup handlers (pool prewarm, search index, job manager)
+    first_request_ms   the first GET /books/ through the ASGI app
+    ready_ms           all of the above, i.e. time to first response
+
+    python -m benchmarks.startup_bench --runs 10
+    python -X importtime -c "import src.main" 2> import.log   # per-module breakdown
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+PROBE = """
+import asyncio, json, time
+t0 = time.perf_counter()
+from src.main import app
+t1 = time.perf_counter()
+from httpx import ASGITransport, AsyncClient
+
+async def main():
+    async with app.router.lifespan_context(app):
+        t2 = time.perf_counter()
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://bench") as client:
+            r = await client.get("/books/")
+        t3 = time.perf_counter()
+    assert r.status_code == 200, r.text
+    print(json.dumps({"import_ms": (t1 - t0) * 1000, "startup_ms": (t2 - t1) * 1000,
+                      "first_request_ms": (t3 - t2) * 1000, "ready_ms": (t3 - t0) * 1000}))
+
+asyncio.run(main())
+"""
+
+
+def migrate():
+    # migrations/env.py reads DATABASE_URL through src.config
+    from alembic import command
+    from alembic.config import Config
+
+    config = Config()
+    config.set_main_option("script_location", "migrations")
+    command.upgrade(config, "head")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="sqlite+aiosqlite:///bench_startup.db")
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    os.environ["DATABASE_URL"] = args.url
+    migrate()
+    runs = []
+    for _ in range(args.runs):
+        out = subprocess.run([sys.executable, "-c", PROBE], check=True, capture_output=True, text=True)
+        runs.append(json.loads(out.stdout.strip().splitlines()[-1]))
+    for key in runs[0]:
+        samples = [r[key] for r in runs]
+        print(f"{key:<17} median={statistics.median(samples):8.1f}ms  min={min(samples):8.1f}ms  "
+              f"max={max(samples):8.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
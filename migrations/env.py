@@ -29,17 +29,26 @@ def run_migrations_offline():
     with context.begin_transaction():
         context.run_migrations()
 
+def do_run_migrations(connection):
+    context.configure(connection=connection, target_metadata=target_metadata)
+    with context.begin_transaction():
+        context.run_migrations()
+
 def run_migrations_online():
+    # a caller (e.g. a test) may hand over an open connection instead of DATABASE_URL
+    connection = config.attributes.get("connection")
+    if connection is not None:
+        do_run_migrations(connection)
+        return
+
     connectable = create_async_engine(DATABASE_URL, poolclass=pool.NullPool, future=True)
 
-    async def do_run_migrations():
+    async def run_async_migrations():
         async with connectable.connect() as connection:
-            await connection.run_sync(
-                lambda sync_conn: context.configure(connection=sync_conn, target_metadata=target_metadata)
-            )
-            await connection.run_sync(lambda sync_conn: context.run_migrations())
+            await connection.run_sync(do_run_migrations)
+        await connectable.dispose()
 
-    asyncio.run(do_run_migrations())
+    asyncio.run(run_async_migrations())
 
 if context.is_offline_mode():
     run_migrations_offline()
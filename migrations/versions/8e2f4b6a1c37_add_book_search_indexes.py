@@ -0,0 +1,69 @@
+"""add book search indexes
+
+Revision ID: 8e2f4b6a1c37
+Revises: 5c1e7a93d2b4
+Create Date: 2026-10-17 11:02:10.518233
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '8e2f4b6a1c37'
+down_revision: Union[str, Sequence[str], None] = '5c1e7a93d2b4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+SQLITE_FTS = [
+    "CREATE VIRTUAL TABLE books_fts USING fts5(title, author, tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+    """CREATE TRIGGER books_fts_ai AFTER INSERT ON books BEGIN
+        INSERT INTO books_fts(rowid, title, author)
+        VALUES (new.id, new.title, (SELECT name FROM authors WHERE id = new.author_id));
+    END""",
+    """CREATE TRIGGER books_fts_ad AFTER DELETE ON books BEGIN
+        DELETE FROM books_fts WHERE rowid = old.id;
+    END""",
+    """CREATE TRIGGER books_fts_au AFTER UPDATE OF title, author_id ON books BEGIN
+        UPDATE books_fts SET title = new.title, author = (SELECT name FROM authors WHERE id = new.author_id)
+        WHERE rowid = new.id;
+    END""",
+    """CREATE TRIGGER authors_fts_au AFTER UPDATE OF name ON authors BEGIN
+        UPDATE books_fts SET author = new.name WHERE rowid IN (SELECT id FROM books WHERE author_id = new.id);
+    END""",
+    """INSERT INTO books_fts(rowid, title, author)
+       SELECT b.id, b.title, a.name FROM books b JOIN authors a ON a.id = b.author_id""",
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        op.create_index('ix_books_title_fts', 'books', [sa.text("to_tsvector('simple', title)")],
+                        postgresql_using='gin')
+        op.create_index('ix_authors_name_fts', 'authors', [sa.text("to_tsvector('simple', name)")],
+                        postgresql_using='gin')
+        op.create_index('ix_books_title_trgm', 'books', ['title'], postgresql_using='gin',
+                        postgresql_ops={'title': 'gin_trgm_ops'})
+        op.create_index('ix_authors_name_trgm', 'authors', ['name'], postgresql_using='gin',
+                        postgresql_ops={'name': 'gin_trgm_ops'})
+    elif dialect == 'sqlite':
+        for stmt in SQLITE_FTS:
+            op.execute(stmt)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        op.drop_index('ix_authors_name_trgm', table_name='authors')
+        op.drop_index('ix_books_title_trgm', table_name='books')
+        op.drop_index('ix_authors_name_fts', table_name='authors')
+        op.drop_index('ix_books_title_fts', table_name='books')
+    elif dialect == 'sqlite':
+        op.execute("DROP TRIGGER IF EXISTS authors_fts_au")
+        op.execute("DROP TABLE IF EXISTS books_fts")
@@ -0,0 +1,46 @@
+"""add book versions and catalogue state
+
+Revision ID: b71d3f09a5e2
+Revises: 8e2f4b6a1c37
+Create Date: 2026-10-17 13:40:52.104117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'b71d3f09a5e2'
+down_revision: Union[str, Sequence[str], None] = '8e2f4b6a1c37'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    sqlite = op.get_bind().dialect.name == "sqlite"
+    op.add_column('books', sa.Column('version', sa.Integer(), nullable=False, server_default=sa.text('1')))
+    # SQLite can't ADD COLUMN with a non-constant default, so backfill instead
+    op.add_column('books', sa.Column(
+        'updated_at', sa.DateTime(), nullable=False,
+        server_default=sa.text("'1970-01-01 00:00:00'") if sqlite else sa.func.now(),
+    ))
+    if sqlite:
+        op.execute("UPDATE books SET updated_at = CURRENT_TIMESTAMP")
+
+    op.create_table(
+        'catalogue_state',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id'),
+    )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('catalogue_state')
+    op.drop_column('books', 'updated_at')
+    op.drop_column('books', 'version')
@@ -0,0 +1,41 @@
+"""add book recommendations
+
+Revision ID: d4a8c2e6f910
+Revises: b71d3f09a5e2
+Create Date: 2026-10-17 15:12:37.820416
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'd4a8c2e6f910'
+down_revision: Union[str, Sequence[str], None] = 'b71d3f09a5e2'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'book_recommendations',
+        sa.Column('book_id', sa.Integer(), nullable=False),
+        sa.Column('rank', sa.Integer(), nullable=False),
+        sa.Column('recommended_id', sa.Integer(), nullable=False),
+        sa.Column('score', sa.Float(), nullable=False),
+        sa.ForeignKeyConstraint(['book_id'], ['books.id'], ondelete='CASCADE'),
+        sa.ForeignKeyConstraint(['recommended_id'], ['books.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('book_id', 'rank'),
+    )
+    op.create_index(op.f('ix_book_recommendations_recommended_id'), 'book_recommendations',
+                    ['recommended_id'], unique=False)
+    # lists are filled by `python -m src.recommendations`
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index(op.f('ix_book_recommendations_recommended_id'), table_name='book_recommendations')
+    op.drop_table('book_recommendations')
@@ -0,0 +1,50 @@
+"""add book facet counts
+
+Revision ID: e93b5d7a2c14
+Revises: d4a8c2e6f910
+Create Date: 2026-10-17 16:05:48.331902
+
+"""
+from itertools import product
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e93b5d7a2c14'
+down_revision: Union[str, Sequence[str], None] = 'd4a8c2e6f910'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (expression, "all" sentinel) per dimension, as in src/facets.py
+DIMENSIONS = [
+    ("COALESCE(genre, '')", "'*'"),
+    ("COALESCE(published_year / 10 * 10, -2)", "-1"),
+    ("author_id", "0"),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table(
+        'book_facet_counts',
+        sa.Column('genre', sa.String(), nullable=False),
+        sa.Column('decade', sa.Integer(), nullable=False),
+        sa.Column('author_id', sa.Integer(), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('genre', 'decade', 'author_id'),
+    )
+    # one grouping set per combination of kept dimensions
+    for kept in product((True, False), repeat=3):
+        columns = [expr if keep else everything for (expr, everything), keep in zip(DIMENSIONS, kept)]
+        grouped = [expr for (expr, _), keep in zip(DIMENSIONS, kept) if keep]
+        group_by = f" GROUP BY {', '.join(grouped)}" if grouped else ""
+        op.execute(f"INSERT INTO book_facet_counts (genre, decade, author_id, count) "
+                   f"SELECT {', '.join(columns)}, COUNT(*) FROM books{group_by}")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_table('book_facet_counts')
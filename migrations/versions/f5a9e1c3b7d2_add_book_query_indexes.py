@@ -0,0 +1,35 @@
+"""add book query indexes
+
+Revision ID: f5a9e1c3b7d2
+Revises: e93b5d7a2c14
+Create Date: 2026-10-17 18:20:37.904615
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'f5a9e1c3b7d2'
+down_revision: Union[str, Sequence[str], None] = 'e93b5d7a2c14'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # genre filter with a year range, sorted by year: one range scan in (published_year, id) order
+    op.create_index('ix_books_genre_year_id', 'books', ['genre', 'published_year', 'id'], unique=False)
+    # author joins (list/export author filter, recommendation candidates) and their id order
+    op.create_index('ix_books_author_id_id', 'books', ['author_id', 'id'], unique=False)
+    # a prefix of ix_books_genre_year_id
+    op.drop_index(op.f('ix_books_genre'), table_name='books')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.create_index(op.f('ix_books_genre'), 'books', ['genre'], unique=False)
+    op.drop_index('ix_books_author_id_id', table_name='books')
+    op.drop_index('ix_books_genre_year_id', table_name='books')
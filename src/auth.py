@@ -1,4 +1,9 @@
+import asyncio
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from typing import Callable, Dict, Optional, Set, Tuple
 
 from fastapi.security import OAuth2PasswordBearer
 from jose import jwt
@@ -8,27 +13,68 @@ from sqlalchemy.ext.asyncio import AsyncSession
 
 from .database import get_async_session
 from . import schemas, models
-from sqlalchemy import select
-from .config import SECRET_KEY, ACCESS_TOKEN_EXPIRE_MINUTES, ALGORITHM
+from .metrics import timed
+from sqlalchemy import event, select, update
+from sqlalchemy.orm import Session
+from .config import (
+    SECRET_KEY, ACCESS_TOKEN_EXPIRE_MINUTES, ALGORITHM, AUTH_CACHE_TTL, AUTH_CACHE_MAX_ENTRIES,
+    BCRYPT_ROUNDS, HASH_WORKERS, HASH_QUEUE_LIMIT
+)
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/token")
 
 
-def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+class HashPool:
+    """Bounded thread pool for bcrypt, which releases the GIL while hashing
 
+    Calls beyond `queue_limit` pending ones are refused with a 503 instead of
+    queueing for seconds behind a login burst.
+    """
 
-def get_password_hash(password):
-    return pwd_context.hash(password)
+    def __init__(self, workers: int = HASH_WORKERS, queue_limit: int = HASH_QUEUE_LIMIT):
+        self.queue_limit = queue_limit
+        self.pending = 0
+        self.rejected = 0
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+
+    async def run(self, fn: Callable, *args):
+        if self.pending >= self.queue_limit:
+            self.rejected += 1
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                                detail="Authentication is busy, retry shortly", headers={"Retry-After": "1"})
+        self.pending += 1
+        try:
+            with timed("bcrypt"):
+                return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            self.pending -= 1
+
+
+hash_pool = HashPool()
+
+
+async def verify_password(plain_password, hashed_password):
+    return await hash_pool.run(pwd_context.verify, plain_password, hashed_password)
+
+
+async def get_password_hash(password):
+    return await hash_pool.run(pwd_context.hash, password)
 
 
 async def authenticate_user(db: AsyncSession, username: str, password: str):
     q = select(models.User).where(models.User.username == username)
     res = await db.execute(q)
     user = res.scalar_one_or_none()
-    if not user or not verify_password(password, user.hashed_password):
+    if not user or not user.is_active:
+        return None
+    valid, new_hash = await hash_pool.run(pwd_context.verify_and_update, password, user.hashed_password)
+    if not valid:
         return None
+    if new_hash:
+        # stored with an outdated BCRYPT_ROUNDS
+        user.hashed_password = new_hash
+        await db.commit()
     return user
 
 
@@ -39,6 +85,97 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None):
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
+class PrincipalCache:
+    """Verified principals by bearer token, so repeat requests skip JWT decoding and the users lookup
+
+    An entry lives for at most `ttl` seconds and never past its token's exp.
+    Changes to a user (deactivation, deletion) drop all of its tokens once
+    the changing transaction commits.
+    """
+
+    def __init__(self, ttl: int = AUTH_CACHE_TTL, max_entries: int = AUTH_CACHE_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._entries: "OrderedDict[str, Tuple[float, schemas.Principal]]" = OrderedDict()
+        self._tokens: Dict[str, Set[str]] = {}
+
+    def stats(self) -> Dict[str, int]:
+        # every hit is a users lookup that didn't happen
+        return {"hits": self.hits, "misses": self.misses, "invalidations": self.invalidations,
+                "entries": len(self._entries)}
+
+    def get(self, token: str) -> Optional[schemas.Principal]:
+        entry = self._entries.get(token)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                self._drop(token)
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._entries.move_to_end(token)
+        return entry[1]
+
+    def set(self, token: str, principal: schemas.Principal, exp: Optional[float]):
+        ttl = self.ttl if exp is None else min(self.ttl, exp - time.time())
+        if ttl <= 0:
+            return
+        self._entries[token] = (time.monotonic() + ttl, principal)
+        self._entries.move_to_end(token)
+        self._tokens.setdefault(principal.username, set()).add(token)
+        while len(self._entries) > self.max_entries:
+            self._drop(next(iter(self._entries)))
+
+    def _drop(self, token: str):
+        _, principal = self._entries.pop(token)
+        tokens = self._tokens.get(principal.username)
+        if tokens is not None:
+            tokens.discard(token)
+            if not tokens:
+                del self._tokens[principal.username]
+
+    def invalidate(self, username: str):
+        for token in self._tokens.pop(username, ()):
+            self._entries.pop(token, None)
+        self.invalidations += 1
+
+    def clear(self):
+        self._entries.clear()
+        self._tokens.clear()
+
+
+principal_cache = PrincipalCache()
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changed_users(session, flush_context):
+    changed = session.info.setdefault("changed_usernames", set())
+    for obj in list(session.dirty) + list(session.deleted):
+        if isinstance(obj, models.User):
+            changed.add(obj.username)
+
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_changed_users(session):
+    for username in session.info.pop("changed_usernames", ()):
+        principal_cache.invalidate(username)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_changed_users(session):
+    session.info.pop("changed_usernames", None)
+
+
+async def deactivate_user(db: AsyncSession, username: str):
+    """Revokes a user's access; their cached tokens stop working on commit"""
+    await db.execute(update(models.User).where(models.User.username == username).values(is_active=0))
+    # a bulk UPDATE bypasses the flush events above
+    db.sync_session.info.setdefault("changed_usernames", set()).add(username)
+    await db.commit()
+
+
 async def get_current_user(
     token: str = Depends(oauth2_scheme),
     db: AsyncSession = Depends(get_async_session),
@@ -48,6 +185,10 @@ async def get_current_user(
         detail="Could not validate credentials",
         headers={"WWW-Authenticate": "Bearer"},
     )
+    principal = principal_cache.get(token)
+    if principal is not None:
+        return principal
+
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         username: str = payload.get("sub")
@@ -61,4 +202,8 @@ async def get_current_user(
     user = res.scalar_one_or_none()
     if user is None:
         raise credentials_exception
-    return user
+    if not user.is_active:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Inactive user")
+    principal = schemas.Principal.model_validate(user)
+    principal_cache.set(token, principal, payload.get("exp"))
+    return principal
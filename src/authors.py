@@ -0,0 +1,135 @@
+"""Author name -> id resolution shared by the create, update, batch and import paths
+
+Names are looked up in a per-process LRU first. Misses are inserted with
+INSERT ... ON CONFLICT DO NOTHING RETURNING, so concurrent writers of the
+same new author never trip the unique constraint, and nothing is committed
+on the caller's behalf. Ids reach the LRU only once the transaction that
+resolved them commits, so a rolled-back insert is never cached.
+"""
+from collections import OrderedDict
+from typing import Dict, Iterable
+
+from sqlalchemy import event, insert, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, make_transient_to_detached
+
+from . import models
+from .config import AUTHOR_CACHE_MAX_ENTRIES
+
+INSERT_CHUNK_SIZE = 1000
+
+
+class AuthorCache:
+    """Bounded LRU of author ids by name
+
+    Authors are never renamed or deleted by the app; clear() it after doing
+    either by hand.
+    """
+
+    def __init__(self, max_entries: int = AUTHOR_CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._ids: "OrderedDict[str, int]" = OrderedDict()
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._ids)}
+
+    def get(self, name: str):
+        author_id = self._ids.get(name)
+        if author_id is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._ids.move_to_end(name)
+        return author_id
+
+    def update(self, ids: Dict[str, int]):
+        for name, author_id in ids.items():
+            self._ids[name] = author_id
+            self._ids.move_to_end(name)
+        while len(self._ids) > self.max_entries:
+            self._ids.popitem(last=False)
+
+    def clear(self):
+        self._ids.clear()
+
+
+author_cache = AuthorCache()
+
+
+@event.listens_for(Session, "after_commit")
+def _cache_resolved_authors(session):
+    resolved = session.info.pop("resolved_authors", None)
+    if resolved:
+        author_cache.update(resolved)
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_resolved_authors(session):
+    session.info.pop("resolved_authors", None)
+
+
+def _insert_ignore(dialect_name: str, table):
+    """INSERT ... ON CONFLICT DO NOTHING for the dialects we run on"""
+    if dialect_name == "postgresql":
+        return pg_insert(table).on_conflict_do_nothing()
+    if dialect_name == "sqlite":
+        return sqlite_insert(table).on_conflict_do_nothing()
+    return insert(table)
+
+
+async def _fetch_or_insert(session: AsyncSession, names: set) -> Dict[str, int]:
+    t = models.Author.__table__
+    dialect = (await session.connection()).dialect.name
+    ids: Dict[str, int] = {}
+    for chunk in (sorted(names)[i:i + INSERT_CHUNK_SIZE] for i in range(0, len(names), INSERT_CHUNK_SIZE)):
+        stmt = _insert_ignore(dialect, t).values([{"name": n} for n in chunk])
+        if dialect == "postgresql":
+            # one round trip: new rows from RETURNING, existing ones from the statement's snapshot
+            inserted = stmt.returning(t.c.name, t.c.id).cte("inserted")
+            q = select(inserted.c.name, inserted.c.id).union_all(
+                select(t.c.name, t.c.id).where(t.c.name.in_(chunk))
+            )
+        elif dialect == "sqlite":
+            q = stmt.returning(t.c.name, t.c.id)
+        else:
+            q = None
+            await session.execute(stmt)
+        if q is not None:
+            ids.update((await session.execute(q)).all())
+
+    # rows that already existed (SQLite) or that a concurrent transaction committed meanwhile
+    missing = names - ids.keys()
+    if missing:
+        q = select(t.c.name, t.c.id).where(t.c.name.in_(missing))
+        ids.update((await session.execute(q)).all())
+    return ids
+
+
+async def resolve_author_ids(session: AsyncSession, names: Iterable[str]) -> Dict[str, int]:
+    """Maps author names to ids, inserting the missing ones in the caller's transaction"""
+    pending = session.sync_session.info.setdefault("resolved_authors", {})
+    ids = {}
+    misses = set()
+    for name in set(names):
+        author_id = pending.get(name) or author_cache.get(name)
+        if author_id is None:
+            misses.add(name)
+        else:
+            ids[name] = author_id
+    if misses:
+        found = await _fetch_or_insert(session, misses)
+        pending.update(found)
+        ids.update(found)
+    return ids
+
+
+async def resolve_author(session: AsyncSession, name: str) -> models.Author:
+    """The author as a persistent instance, without loading its row"""
+    ids = await resolve_author_ids(session, [name])
+    author = models.Author(id=ids[name], name=name)
+    make_transient_to_detached(author)
+    return await session.merge(author, load=False)
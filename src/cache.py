@@ -0,0 +1,170 @@
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import Response
+
+from .config import CACHE_BACKEND, CACHE_MAX_ENTRIES, CACHE_TTL, CACHE_URL
+from .metrics import timed
+from .utils.encoding import dumps
+
+GENERATION_KEY = "bms:catalogue:generation"
+
+
+class MemoryBackend:
+    """In-process LRU with a per-entry TTL
+
+    Counters (incr) live outside the LRU: an evicted generation would restart
+    at 0 and bring back entries of older generations.
+    """
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.evictions = 0
+        self._data: "OrderedDict[str, Tuple[Optional[float], bytes]]" = OrderedDict()
+        self._counters: Dict[str, int] = {}
+
+    async def get(self, key: str) -> Optional[bytes]:
+        if key in self._counters:
+            return str(self._counters[key]).encode()
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires, value = entry
+        if expires is not None and expires < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: bytes, ex: Optional[int] = None):
+        self._data[key] = (time.monotonic() + ex if ex else None, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+            self.evictions += 1
+
+    async def delete(self, *keys: str):
+        for key in keys:
+            self._data.pop(key, None)
+
+    async def incr(self, key: str) -> int:
+        value = self._counters[key] = self._counters.get(key, 0) + 1
+        return value
+
+    async def clear(self):
+        self._data.clear()
+        self._counters.clear()
+
+
+class RedisBackend:
+    """Any redis.asyncio-compatible client (get/set(ex=)/delete/incr)
+
+    Entries carry a TTL and the generation counter doesn't, so run Redis with a
+    volatile-* (or noeviction) maxmemory-policy: allkeys-* may evict the counter.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.evictions = 0  # evictions happen server-side, see INFO stats
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self.client.get(key)
+
+    async def set(self, key: str, value: bytes, ex: Optional[int] = None):
+        await self.client.set(key, value, ex=ex)
+
+    async def delete(self, *keys: str):
+        await self.client.delete(*keys)
+
+    async def incr(self, key: str) -> int:
+        return await self.client.incr(key)
+
+    async def clear(self):
+        await self.client.flushdb()
+
+
+class ResponseCache:
+    """Read-through cache of serialized JSON responses
+
+    Single books are keyed on their row version, read before the lookup, so
+    an entry only goes stale when its own row changes. List, facet and
+    recommendation keys embed a catalogue generation that every write bumps,
+    which retires them all at once without enumerating keys. The generation
+    is read before the query runs: a read racing a write fills a key of the
+    old generation, which nobody asks for again. Query reads served by a
+    replica that trails the primary are not stored (store=False), since it
+    may not have the write that produced the current generation.
+    """
+
+    def __init__(self, backend, ttl: int = CACHE_TTL, enabled: bool = True):
+        self.backend = backend
+        self.ttl = ttl
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "evictions": self.backend.evictions}
+
+    @staticmethod
+    def book_key(book_id: int, version: int, updated_at: datetime) -> str:
+        """Key of one book's entry at one row version"""
+        # updated_at tells a new row apart from a deleted one whose id SQLite handed out again
+        return f"bms:book:{book_id}:{version}:{updated_at.isoformat()}"
+
+    async def generation(self) -> int:
+        return int((await self.backend.get(GENERATION_KEY)) or 0)
+
+    @staticmethod
+    def digest(**params) -> str:
+        return hashlib.blake2b(json.dumps(params, sort_keys=True, default=str).encode(), digest_size=16).hexdigest()
+
+    async def query_key(self, kind: str, **params) -> str:
+        """Key of a list/recommend query, tied to the current catalogue generation"""
+        return f"bms:{kind}:{await self.generation()}:{self.digest(**params)}"
+
+    async def get(self, key: str) -> Optional[Response]:
+        if not self.enabled:
+            return None
+        raw = await self.backend.get(key)
+        if raw is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        # entries are "<headers json>\n<body>"; compact JSON never contains a raw newline
+        headers, body = raw.split(b"\n", 1)
+        return Response(body, media_type="application/json", headers=json.loads(headers))
+
+    async def respond(self, key: str, content, headers: Optional[Dict[str, str]] = None,
+                      store: bool = True) -> Response:
+        """Serializes content once, stores it (unless store=False) and returns it as the response"""
+        with timed("serialization"):
+            body = dumps(jsonable_encoder(content))
+        return await self.respond_encoded(key, body, headers, store)
+
+    async def respond_encoded(self, key: str, body: bytes, headers: Optional[Dict[str, str]] = None,
+                              store: bool = True) -> Response:
+        """respond() for a body that is already JSON"""
+        headers = headers or {}
+        if self.enabled and store:
+            await self.backend.set(key, json.dumps(headers).encode() + b"\n" + body, ex=self.ttl)
+        return Response(body, media_type="application/json", headers=headers)
+
+    async def invalidate_catalogue(self):
+        await self.backend.incr(GENERATION_KEY)
+
+
+def create_backend():
+    if CACHE_BACKEND == "redis":
+        import redis.asyncio as redis  # optional dependency
+
+        return RedisBackend(redis.from_url(CACHE_URL))
+    return MemoryBackend()
+
+
+cache = ResponseCache(create_backend(), enabled=CACHE_BACKEND != "none")
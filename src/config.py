@@ -1,6 +1,7 @@
 from dotenv import load_dotenv
 
 import os
+import tempfile
 
 load_dotenv()
 
@@ -16,4 +17,122 @@ SECRET_KEY = os.environ.get("SECRET_KEY")
 ALGORITHM = os.environ.get("ALGORITHM")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.environ.get("ACCESS_TOKEN_EXPIRE_MINUTES"))
 
-DATABASE_URL = f"postgresql+asyncpg://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+# DATABASE_URL overrides the DB_* parts (e.g. sqlite+aiosqlite:///dev.db for local runs)
+DATABASE_URL = os.environ.get(
+    "DATABASE_URL", f"postgresql+asyncpg://{DB_USER}:{DB_PASS}@{DB_HOST}:{DB_PORT}/{DB_NAME}"
+)
+# development only: create missing tables on startup instead of running migrations
+DB_CREATE_SCHEMA = os.environ.get("DB_CREATE_SCHEMA", "false").lower() in ("1", "true", "yes")
+
+# connection pool, per worker process: at most DB_POOL_SIZE + DB_MAX_OVERFLOW connections, and a
+# request waits DB_POOL_TIMEOUT seconds for one before failing
+DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 10))
+DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", 10))
+DB_POOL_TIMEOUT = float(os.environ.get("DB_POOL_TIMEOUT", 10))
+DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", 1800))
+DB_POOL_PRE_PING = os.environ.get("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
+# connections opened per engine at startup so the first requests don't pay for connecting; 0 disables
+DB_POOL_PREWARM = int(os.environ.get("DB_POOL_PREWARM", DB_POOL_SIZE))
+# server-side statement_timeout in milliseconds, 0 for none
+DB_STATEMENT_TIMEOUT_MS = int(os.environ.get("DB_STATEMENT_TIMEOUT_MS", 30000))
+DB_STATEMENT_CACHE_SIZE = int(os.environ.get("DB_STATEMENT_CACHE_SIZE", 100))
+# total connections all workers of one host may open to the primary (and to each replica); the launcher
+# shrinks each worker's pool size and overflow to fit it. 0 leaves DB_POOL_SIZE/DB_MAX_OVERFLOW as they are
+DB_MAX_CONNECTIONS = int(os.environ.get("DB_MAX_CONNECTIONS", 0))
+# /ready fails when no pooled connection can be checked out and queried within this many seconds
+READY_TIMEOUT = float(os.environ.get("READY_TIMEOUT", 2))
+# read replicas (comma-separated URLs) for GET endpoints; a replica further behind than
+# REPLICA_MAX_LAG_SECONDS is skipped, and a client reads from the primary for
+# READ_YOUR_WRITES_SECONDS after its own writes
+DATABASE_REPLICA_URLS = [u.strip() for u in os.environ.get("DATABASE_REPLICA_URLS", "").split(",") if u.strip()]
+REPLICA_MAX_LAG_SECONDS = float(os.environ.get("REPLICA_MAX_LAG_SECONDS", 5))
+REPLICA_CHECK_INTERVAL = float(os.environ.get("REPLICA_CHECK_INTERVAL", 2))
+# a replica that doesn't answer the lag check within this many seconds is treated as unreachable
+REPLICA_CHECK_TIMEOUT = float(os.environ.get("REPLICA_CHECK_TIMEOUT", 1))
+READ_YOUR_WRITES_SECONDS = int(os.environ.get("READ_YOUR_WRITES_SECONDS", 10))
+
+# pgbouncer in transaction mode: no prepared-statement caches and no startup parameters
+DB_PGBOUNCER = os.environ.get("DB_PGBOUNCER", "false").lower() in ("1", "true", "yes")
+
+IMPORT_BATCH_SIZE = int(os.environ.get("IMPORT_BATCH_SIZE", 1000))
+IMPORT_WORKERS = int(os.environ.get("IMPORT_WORKERS", 2))
+IMPORT_JOB_DIR = os.environ.get("IMPORT_JOB_DIR", os.path.join(tempfile.gettempdir(), "bms-import-jobs"))
+# a running job whose heartbeat is older than this is considered orphaned
+IMPORT_JOB_STALE_SECONDS = int(os.environ.get("IMPORT_JOB_STALE_SECONDS", 300))
+IMPORT_JOB_MAX_REJECTIONS = int(os.environ.get("IMPORT_JOB_MAX_REJECTIONS", 1000))
+
+EXPORT_CHUNK_SIZE = int(os.environ.get("EXPORT_CHUNK_SIZE", 5000))
+
+# most items one /books/batch request may carry
+BATCH_MAX_ITEMS = int(os.environ.get("BATCH_MAX_ITEMS", 1000))
+
+# length of each book's materialized recommendation list
+RECOMMEND_NEIGHBOURS = int(os.environ.get("RECOMMEND_NEIGHBOURS", 20))
+
+# response cache: "memory" (per-process LRU/TTL), "redis" (shared, CACHE_URL) or "none";
+# with several workers on the memory backend, CACHE_TTL bounds cross-worker staleness
+CACHE_BACKEND = os.environ.get("CACHE_BACKEND", "memory")
+CACHE_URL = os.environ.get("CACHE_URL", "redis://localhost:6379/0")
+CACHE_TTL = int(os.environ.get("CACHE_TTL", 30))
+CACHE_MAX_ENTRIES = int(os.environ.get("CACHE_MAX_ENTRIES", 10000))
+
+# rate limits per route group, keyed by JWT subject (client IP when anonymous). RATE_LIMIT_STORAGE_URI
+# is a `limits` storage URI; use redis://... so that all workers share one budget
+RATE_LIMIT_AUTH = os.environ.get("RATE_LIMIT_AUTH", "5/minute")
+RATE_LIMIT_READ = os.environ.get("RATE_LIMIT_READ", "120/minute")
+RATE_LIMIT_SEARCH = os.environ.get("RATE_LIMIT_SEARCH", "60/minute")
+RATE_LIMIT_WRITE = os.environ.get("RATE_LIMIT_WRITE", "30/minute")
+RATE_LIMIT_BULK = os.environ.get("RATE_LIMIT_BULK", "5/minute")
+RATE_LIMIT_STORAGE_URI = os.environ.get("RATE_LIMIT_STORAGE_URI", "memory://")
+RATE_LIMIT_STRATEGY = os.environ.get("RATE_LIMIT_STRATEGY", "sliding-window-counter")
+# share of a limit a worker takes from remote storage at once and then spends locally; 0 disables leasing
+RATE_LIMIT_LEASE_FRACTION = float(os.environ.get("RATE_LIMIT_LEASE_FRACTION", 0.05))
+
+# bcrypt cost; stored hashes of another cost are rehashed on the user's next login
+BCRYPT_ROUNDS = int(os.environ.get("BCRYPT_ROUNDS", 12))
+# password hashing runs on HASH_WORKERS threads; beyond HASH_QUEUE_LIMIT pending calls requests get a 503
+HASH_WORKERS = int(os.environ.get("HASH_WORKERS", 2))
+HASH_QUEUE_LIMIT = int(os.environ.get("HASH_QUEUE_LIMIT", 32))
+
+# verified JWT principals are cached per process for at most AUTH_CACHE_TTL seconds (and never past
+# token expiry); deactivations are pushed to this process at once, to other workers within the TTL
+AUTH_CACHE_TTL = int(os.environ.get("AUTH_CACHE_TTL", 60))
+AUTH_CACHE_MAX_ENTRIES = int(os.environ.get("AUTH_CACHE_MAX_ENTRIES", 10000))
+
+# author name -> id lookups cached per process (authors are never renamed or deleted by the app)
+AUTHOR_CACHE_MAX_ENTRIES = int(os.environ.get("AUTHOR_CACHE_MAX_ENTRIES", 50000))
+
+# in-process inverted index for /books/search, meant for single-process SQLite deployments
+SEARCH_INDEX_ENABLED = os.environ.get("SEARCH_INDEX_ENABLED", "false").lower() in ("1", "true", "yes")
+
+# request instrumentation exposed at /metrics: statements taking longer than SLOW_QUERY_MS are logged with
+# their parameters, and a request running the same statement N_PLUS_ONE_THRESHOLD times is flagged
+METRICS_ENABLED = os.environ.get("METRICS_ENABLED", "true").lower() in ("1", "true", "yes")
+SLOW_QUERY_MS = float(os.environ.get("SLOW_QUERY_MS", 200))
+N_PLUS_ONE_THRESHOLD = int(os.environ.get("N_PLUS_ONE_THRESHOLD", 10))
+# with several workers each one writes its metrics to METRICS_DIR every METRICS_FLUSH_SECONDS, and /metrics
+# on any worker sums the directory; src.server sets it up for WEB_CONCURRENCY > 1
+METRICS_DIR = os.environ.get("METRICS_DIR", "")
+METRICS_FLUSH_SECONDS = float(os.environ.get("METRICS_FLUSH_SECONDS", 5))
+# sampling profiler, off by default: requests slower than PROFILE_SLOW_REQUESTS_MS get their event-loop
+# stacks, sampled every PROFILE_INTERVAL_MS, written to PROFILE_DIR as collapsed stacks (flamegraph.pl input)
+PROFILE_SLOW_REQUESTS_MS = float(os.environ.get("PROFILE_SLOW_REQUESTS_MS", 0))
+PROFILE_INTERVAL_MS = float(os.environ.get("PROFILE_INTERVAL_MS", 5))
+PROFILE_DIR = os.environ.get("PROFILE_DIR", os.path.join(tempfile.gettempdir(), "bms-profiles"))
+
+# production launcher (python -m src.server). WEB_CONCURRENCY worker processes, each with its own pools;
+# more than one also needs shared rate-limit and cache storage (redis). Listens on localhost unless
+# SERVER_HOST says otherwise. SERVER_LOOP is auto|uvloop|asyncio and SERVER_HTTP auto|httptools|h11
+# ("auto" prefers the C implementations)
+SERVER_HOST = os.environ.get("SERVER_HOST", "127.0.0.1")
+SERVER_PORT = int(os.environ.get("SERVER_PORT", 8000))
+SERVER_WORKERS = int(os.environ.get("WEB_CONCURRENCY", 1))
+SERVER_LOOP = os.environ.get("SERVER_LOOP", "auto")
+SERVER_HTTP = os.environ.get("SERVER_HTTP", "auto")
+SERVER_KEEPALIVE = int(os.environ.get("SERVER_KEEPALIVE", 5))
+# a worker is replaced after SERVER_MAX_REQUESTS (+ up to SERVER_MAX_REQUESTS_JITTER, so workers don't all
+# recycle at once) requests to bound memory growth; 0 disables
+SERVER_MAX_REQUESTS = int(os.environ.get("SERVER_MAX_REQUESTS", 10000))
+SERVER_MAX_REQUESTS_JITTER = int(os.environ.get("SERVER_MAX_REQUESTS_JITTER", 1000))
+# on SIGTERM a worker stops accepting connections and gives in-flight requests this long to finish
+SERVER_GRACEFUL_TIMEOUT = int(os.environ.get("SERVER_GRACEFUL_TIMEOUT", 30))
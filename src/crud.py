@@ -1,26 +1,50 @@
-from typing import List, Optional
-from sqlalchemy import select, text
+import asyncio
+import base64
+import io
+import json
+from datetime import datetime
+from typing import TYPE_CHECKING, AsyncIterator, BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple
+from sqlalchemy import Table, and_, bindparam, delete, insert, or_, select, text, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import selectinload
 from . import models, schemas
-import pandas as pd
+from .authors import resolve_author, resolve_author_ids
+from .config import IMPORT_BATCH_SIZE
+from .facets import adjust_facets, count_keys, facet_key
+
+if TYPE_CHECKING:
+    import pandas as pd  # imported on first use: it is most of the app's import time
 
 ALLOWED_GENRES = schemas.ALLOWED_GENRES
+IMPORT_COLUMNS = ["title", "author", "genre", "published_year"]
+NDJSON_CONTENT_TYPES = ("application/x-ndjson", "application/jsonl")
 
 
-async def get_or_create_author(session: AsyncSession, name: str) -> models.Author:
-    """Returns the author by name or creates a new one"""
-    q = select(models.Author).where(models.Author.name == name)
-    res = await session.execute(q)
-    author = res.scalar_one_or_none()
-    if author:
-        return author
+async def bump_catalogue_version(session: AsyncSession) -> None:
+    """Advances the catalogue-wide change counter inside the caller's transaction"""
+    table = models.CatalogueState.__table__
+    now = datetime.utcnow()
+    conn = await session.connection()
+    if conn.dialect.name in ("postgresql", "sqlite"):
+        stmt = (pg_insert if conn.dialect.name == "postgresql" else sqlite_insert)(table)
+        await session.execute(
+            stmt.values(id=1, version=1, updated_at=now)
+            .on_conflict_do_update(index_elements=["id"], set_={"version": table.c.version + 1, "updated_at": now})
+        )
+        return
+    res = await session.execute(update(table).where(table.c.id == 1)
+                                .values(version=table.c.version + 1, updated_at=now))
+    if res.rowcount == 0:
+        await session.execute(insert(table).values(id=1, version=1, updated_at=now))
 
-    new_author = models.Author(name=name)
-    session.add(new_author)
-    await session.commit()
-    await session.refresh(new_author)
-    return new_author
+
+async def get_catalogue_state(session: AsyncSession) -> Tuple[int, datetime]:
+    """(version, updated_at) of the catalogue; (0, epoch) before the first write"""
+    q = select(models.CatalogueState.version, models.CatalogueState.updated_at).where(models.CatalogueState.id == 1)
+    row = (await session.execute(q)).first()
+    return tuple(row) if row else (0, datetime(1970, 1, 1))
 
 
 async def create_book(session: AsyncSession, book_in: schemas.BookCreate) -> models.Book:
@@ -28,7 +52,7 @@ async def create_book(session: AsyncSession, book_in: schemas.BookCreate) -> mod
     if book_in.genre not in ALLOWED_GENRES:
         raise ValueError(f"Unknown genre: {book_in.genre}")
 
-    author = await get_or_create_author(session, book_in.author)
+    author = await resolve_author(session, book_in.author)
 
     new_book = models.Book(
         title=book_in.title,
@@ -37,6 +61,7 @@ async def create_book(session: AsyncSession, book_in: schemas.BookCreate) -> mod
         author_id=author.id
     )
     session.add(new_book)
+    await bump_catalogue_version(session)
     await session.commit()
     await session.refresh(new_book)
     return new_book
@@ -51,14 +76,64 @@ async def get_book(session: AsyncSession, book_id: int) -> Optional[models.Book]
     return res.scalar_one_or_none()
 
 
+def encode_cursor(sort: str, value, book_id: int) -> str:
+    """Opaque keyset token for the row a page ended on"""
+    raw = json.dumps([sort, value, book_id], separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+# JSON types a cursor's sort value may have, per sort; None where the column is nullable
+CURSOR_VALUE_TYPES = {
+    "id": (int,),
+    "title": (str,),
+    "published_year": (int, type(None)),
+    "genre": (str, type(None)),
+}
+
+
+def _is_int(value) -> bool:
+    # bool is an int subclass, but True is no book id; beyond 64 bits the driver can't bind it
+    return isinstance(value, int) and not isinstance(value, bool) and -2 ** 63 <= value < 2 ** 63
+
+
+def decode_cursor(token: str, sort: str) -> Tuple[object, int]:
+    """Returns (sort value, id) of a cursor; ValueError if invalid or for another sort"""
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        cursor_sort, value, book_id = json.loads(raw)
+    except Exception:
+        raise ValueError("Malformed cursor")
+    if cursor_sort != sort or sort not in CURSOR_VALUE_TYPES:
+        raise ValueError("Cursor does not match the requested sort")
+    types = CURSOR_VALUE_TYPES[sort]
+    if not _is_int(book_id) or not isinstance(value, types) or (isinstance(value, int) and not _is_int(value)):
+        raise ValueError("Malformed cursor")
+    return value, book_id
+
+
+def keyset_clause(sort_col, id_col, after: Tuple[object, int]):
+    """WHERE clause for rows after (value, id) in ORDER BY sort_col NULLS LAST, id"""
+    value, last_id = after
+    if sort_col is id_col:
+        return id_col > last_id
+    if value is None:
+        return and_(sort_col.is_(None), id_col > last_id)
+    return or_(sort_col > value, and_(sort_col == value, id_col > last_id), sort_col.is_(None))
+
+
 async def list_books(
     session: AsyncSession,
     skip: int = 0,
     limit: int = 20,
     sort: Optional[str] = "b.id",
-    filters: Optional[dict] = None
+    filters: Optional[dict] = None,
+    after: Optional[Tuple[object, int]] = None
 ) -> List[dict]:
-    """List of books with filtering and sorting"""
+    """List of books with filtering and sorting
+
+    With after=(sort value, id) of the previous page's last row the page is
+    fetched by keyset instead of OFFSET, so deep pages cost the same.
+    """
     base_sql = """
         SELECT b.id, b.title, b.genre, b.published_year,
                a.id AS author_id, a.name AS author_name
@@ -85,17 +160,37 @@ async def list_books(
             where_clauses.append("b.published_year <= :year_to")
             params['year_to'] = filters['year_to']
 
+    allowed_sort = ["b.id", "b.title", "b.published_year", "b.genre"]
+    if sort not in allowed_sort:
+        sort = "b.id"
+
+    if after is not None:
+        value, params['after_id'] = after
+        if sort == "b.id":
+            where_clauses.append("b.id > :after_id")
+        elif value is None:
+            # NULLs sort last, so only the NULL tail is left
+            where_clauses.append(f"({sort} IS NULL AND b.id > :after_id)")
+        else:
+            where_clauses.append(
+                f"({sort} > :after_value OR ({sort} = :after_value AND b.id > :after_id) OR {sort} IS NULL)"
+            )
+            params['after_value'] = value
+
     if where_clauses:
         base_sql += " WHERE " + " AND ".join(where_clauses)
 
-    if sort:
-        allowed_sort = ["b.id", "b.title", "b.published_year", "b.genre"]
-        if sort not in allowed_sort:
-            sort = "b.id"
-        base_sql += f" ORDER BY {sort}"
+    if sort == "b.id":
+        base_sql += " ORDER BY b.id"
+    else:
+        base_sql += f" ORDER BY {sort} NULLS LAST, b.id"
 
-    base_sql += " LIMIT :limit OFFSET :skip"
-    params.update({'limit': limit, 'skip': skip})
+    if after is not None:
+        base_sql += " LIMIT :limit"
+        params['limit'] = limit
+    else:
+        base_sql += " LIMIT :limit OFFSET :skip"
+        params.update({'limit': limit, 'skip': skip})
 
     result = await session.execute(text(base_sql), params)
     rows = result.fetchall()
@@ -110,50 +205,296 @@ async def list_books(
     ]
 
 
-async def bulk_import(session: AsyncSession, file_path: str) -> List[models.Book]:
-    """Import from CSV or JSON"""
-    if file_path.endswith(".csv"):
-        df = pd.read_csv(file_path)
+def validate_import_frame(df: "pd.DataFrame") -> Tuple["pd.DataFrame", List[dict]]:
+    """Vectorized BookCreate validation; returns accepted rows and rejections"""
+    import pandas as pd
+
+    missing = [c for c in IMPORT_COLUMNS if c not in df.columns]
+    if missing:
+        reason = f"missing column(s): {', '.join(missing)}"
+        return df.iloc[0:0], [{"row": int(i), "reason": reason} for i in df.index]
+
+    out = pd.DataFrame(index=df.index)
+    for col in ("title", "author", "genre"):
+        out[col] = df[col].where(df[col].notna(), "").astype(str).str.strip()
+    year = pd.to_numeric(df["published_year"], errors="coerce")
+
+    reason = pd.Series(None, index=df.index, dtype=object)
+    checks = [
+        (out["title"] == "", "title is required"),
+        (out["author"] == "", "author is required"),
+        (~out["genre"].isin(ALLOWED_GENRES), "unknown genre"),
+        (year.isna() | (year % 1 != 0), "published_year must be an integer"),
+        ((year < 1800) | (year > schemas.CURRENT_YEAR), f"published_year must be between 1800 and {schemas.CURRENT_YEAR}"),
+    ]
+    # reverse order so that the first failing check wins
+    for mask, message in reversed(checks):
+        reason[mask.fillna(False).to_numpy(dtype=bool)] = message
+
+    bad = reason.notna()
+    rejected = [{"row": int(i), "reason": r} for i, r in reason[bad].items()]
+    out = out[~bad]
+    out["published_year"] = year[~bad].astype(int)
+    return out, rejected
+
+
+async def copy_rows(session: AsyncSession, table: Table, columns: List[str], records: List[tuple]) -> None:
+    """Bulk INSERT of plain tuples in the caller's transaction"""
+    conn = await session.connection()
+    if conn.dialect.driver == "asyncpg":
+        # COPY is several times faster than multi-row INSERT on PostgreSQL
+        raw = await conn.get_raw_connection()
+        await raw.driver_connection.copy_records_to_table(table.name, records=records, columns=columns)
     else:
-        df = pd.read_json(file_path)
-
-    created = []
-    for _, row in df.iterrows():
-        try:
-            book_in = schemas.BookCreate(
-                title=str(row['title']),
-                author=str(row['author']),
-                genre=str(row['genre']),
-                published_year=int(row['published_year'])
-            )
-            new_book = await create_book(session, book_in)
-            created.append(new_book)
-        except Exception:
+        await session.execute(insert(table), [dict(zip(columns, r)) for r in records])
+
+
+async def _insert_books(session: AsyncSession, rows: List[dict]) -> List[int]:
+    """Inserts books (COPY on PostgreSQL); their ids in row order"""
+    conn = await session.connection()
+    if conn.dialect.driver != "asyncpg":
+        res = await session.execute(insert(models.Book).returning(models.Book.id, sort_by_parameter_order=True), rows)
+        return list(res.scalars())
+    # COPY returns nothing, so the ids are drawn from the sequence up front
+    res = await session.execute(
+        text("SELECT nextval(pg_get_serial_sequence('books', 'id')) FROM generate_series(1, :n)"), {"n": len(rows)}
+    )
+    ids = list(res.scalars())
+    columns = ["title", "genre", "published_year", "author_id"]
+    await copy_rows(session, models.Book.__table__, ["id", *columns],
+                    [(book_id, *(r[c] for c in columns)) for book_id, r in zip(ids, rows)])
+    return ids
+
+
+async def import_frame(session: AsyncSession, df: "pd.DataFrame",
+                       commit: bool = True) -> Tuple[List[int], List[dict]]:
+    """Validates and inserts one batch of rows in a single transaction; returns the new ids and rejections
+
+    With commit=False a successful batch is left pending so the caller can
+    record its own bookkeeping in the same transaction.
+    """
+    accepted, rejected = validate_import_frame(df)
+    if accepted.empty:
+        return [], rejected
+
+    try:
+        author_ids = await resolve_author_ids(session, accepted["author"].unique())
+        rows = [
+            {"title": t, "genre": g, "published_year": int(y), "author_id": author_ids[a]}
+            for t, g, y, a in zip(accepted["title"], accepted["genre"],
+                                  accepted["published_year"], accepted["author"])
+        ]
+        ids = await _insert_books(session, rows)
+        await adjust_facets(session, count_keys(
+            facet_key(r["genre"], r["published_year"], r["author_id"]) for r in rows
+        ))
+        await bump_catalogue_version(session)
+        if commit:
+            await session.commit()
+    except Exception as exc:
+        await session.rollback()
+        reason = f"batch failed: {exc.__class__.__name__}"
+        rejected.extend({"row": int(i), "reason": reason} for i in accepted.index)
+        return [], sorted(rejected, key=lambda r: r["row"])
+
+    return ids, rejected
+
+
+BOOK_FIELDS = ("title", "genre", "published_year", "author_id")
+
+
+async def batch_create_books(session: AsyncSession, items: List[dict]) -> List[int]:
+    """Inserts validated books (title, genre, published_year, author) in one statement; ids in item order"""
+    author_ids = await resolve_author_ids(session, (i["author"] for i in items))
+    rows = [
+        {"title": i["title"], "genre": i["genre"], "published_year": i["published_year"],
+         "author_id": author_ids[i["author"]]}
+        for i in items
+    ]
+    res = await session.execute(
+        insert(models.Book).returning(models.Book.id, sort_by_parameter_order=True), rows
+    )
+    ids = list(res.scalars())
+    await adjust_facets(session, count_keys(
+        facet_key(r["genre"], r["published_year"], r["author_id"]) for r in rows
+    ))
+    await bump_catalogue_version(session)
+    return ids
+
+
+async def batch_update_books(session: AsyncSession, changes: List[dict]) -> List[Optional[int]]:
+    """Applies partial updates ({"id", field: value...}) with one executemany per set of fields
+
+    Returns each change's book id, or None where the book doesn't exist.
+    """
+    b = models.Book
+    ids = {c["id"] for c in changes}
+    res = await session.execute(select(b.id, *(b.__table__.c[f] for f in BOOK_FIELDS)).where(b.id.in_(ids)))
+    current = {row[0]: dict(zip(BOOK_FIELDS, row[1:])) for row in res}
+    author_ids = await resolve_author_ids(session, (c["author"] for c in changes if c.get("author")))
+
+    deltas: Dict[tuple, int] = {}
+    groups: Dict[Tuple[str, ...], List[dict]] = {}
+    found: List[Optional[int]] = []
+    for change in changes:
+        book = current.get(change["id"])
+        if book is None:
+            found.append(None)
             continue
+        values = {f: change[f] for f in ("title", "genre", "published_year") if change.get(f)}
+        if change.get("author"):
+            values["author_id"] = author_ids[change["author"]]
+        before = facet_key(book["genre"], book["published_year"], book["author_id"])
+        book.update(values)
+        after = facet_key(book["genre"], book["published_year"], book["author_id"])
+        if before != after:
+            deltas[before] = deltas.get(before, 0) - 1
+            deltas[after] = deltas.get(after, 0) + 1
+        if values:
+            groups.setdefault(tuple(sorted(values)), []).append(
+                {"b_id": change["id"], **{f"v_{f}": v for f, v in values.items()}}
+            )
+        found.append(change["id"])
+
+    now = datetime.utcnow()
+    for fields, rows in groups.items():
+        # core UPDATE skips the ORM's before_update hook, so the version is bumped here
+        stmt = (
+            update(b.__table__).where(b.__table__.c.id == bindparam("b_id"))
+            .values({**{f: bindparam(f"v_{f}") for f in fields},
+                     "version": b.__table__.c.version + 1, "updated_at": now})
+        )
+        await session.execute(stmt, rows)
+    await adjust_facets(session, deltas)
+    await bump_catalogue_version(session)
+    return found
+
+
+async def batch_delete_books(session: AsyncSession, ids: List[int]) -> List[int]:
+    """Deletes the existing books among ids; returns the ones deleted"""
+    b = models.Book
+    res = await session.execute(select(b.id, b.genre, b.published_year, b.author_id).where(b.id.in_(set(ids))))
+    rows = res.all()
+    if not rows:
+        return []
+    existing = [r.id for r in rows]
+    rec = models.BookRecommendation.__table__
+    await session.execute(delete(rec).where(or_(rec.c.book_id.in_(existing), rec.c.recommended_id.in_(existing))))
+    await session.execute(delete(b.__table__).where(b.__table__.c.id.in_(existing)))
+    await adjust_facets(session, count_keys((facet_key(r.genre, r.published_year, r.author_id) for r in rows), -1))
+    await bump_catalogue_version(session)
+    return existing
+
+
+def detect_import_format(filename: str, content_type: Optional[str] = None) -> str:
+    """Guess the upload format: csv, ndjson or json"""
+    name = (filename or "").lower()
+    if name.endswith((".ndjson", ".jsonl")) or content_type in NDJSON_CONTENT_TYPES:
+        return "ndjson"
+    if name.endswith(".json") or content_type == "application/json":
+        return "json"
+    return "csv"
+
+
+class BodyReader(io.RawIOBase):
+    """Blocking file object over an async byte stream, for parsers running in a worker thread
+
+    Each read waits on the event loop for the next chunk of the stream, so a
+    request body is parsed as it arrives with at most one chunk buffered.
+    Never read it on the event loop's own thread.
+    """
+
+    def __init__(self, chunks: AsyncIterator[bytes], loop: asyncio.AbstractEventLoop):
+        self._chunks = chunks.__aiter__()
+        self._loop = loop
+        self._pending = b""
+        self._done = False
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        while not self._pending and not self._done:
+            try:
+                self._pending = asyncio.run_coroutine_threadsafe(self._chunks.__anext__(), self._loop).result()
+            except StopAsyncIteration:
+                self._done = True
+        n = min(len(buffer), len(self._pending))
+        buffer[:n] = self._pending[:n]
+        self._pending = self._pending[n:]
+        return n
 
-    return created
 
+def open_import_reader(fileobj: BinaryIO, fmt: str, batch_size: int = IMPORT_BATCH_SIZE) -> Iterator["pd.DataFrame"]:
+    """Incremental reader yielding DataFrames of at most batch_size rows"""
+    import pandas as pd
 
-async def recommend_books(session: AsyncSession, book_id: int, limit: int = 10) -> List[dict]:
-    """Recommendations by genre or author"""
+    if fmt == "json":
+        # a .json upload may still be newline-delimited; only arrays need a full parse
+        if fileobj.seekable():
+            head = fileobj.read(64)
+            fileobj.seek(0)
+        else:
+            head = fileobj.peek(64)
+        if head.lstrip().startswith(b"["):
+            df = pd.read_json(fileobj, dtype=False)
+            return (df.iloc[i:i + batch_size] for i in range(0, len(df), batch_size))
+        fmt = "ndjson"
+
+    if fmt == "ndjson":
+        return iter(pd.read_json(fileobj, lines=True, chunksize=batch_size, dtype=False))
+    return iter(pd.read_csv(fileobj, chunksize=batch_size, dtype=str, keep_default_na=False))
+
+
+async def import_batches(session: AsyncSession, reader: Iterator["pd.DataFrame"],
+                         inserted: Optional[List[int]] = None) -> dict:
+    """Imports every batch of the reader, parsing off the event loop
+
+    The ids of the imported books are appended to `inserted` when given.
+    """
+    imported = 0
+    rejected = []
+    while True:
+        chunk = await asyncio.to_thread(next, reader, None)
+        if chunk is None:
+            break
+        ids, errors = await import_frame(session, chunk)
+        imported += len(ids)
+        rejected.extend(errors)
+        if inserted is not None:
+            inserted.extend(ids)
+
+    return {"imported": imported, "rejected": rejected}
+
+
+async def bulk_import(session: AsyncSession, file_path: str, batch_size: int = IMPORT_BATCH_SIZE) -> dict:
+    """Import from CSV, JSON or NDJSON in batches; returns counts and per-row rejections"""
+    with open(file_path, "rb") as f:
+        reader = open_import_reader(f, detect_import_format(file_path), batch_size)
+        return await import_batches(session, reader)
+
+
+def select_book_rows():
+    """Books joined to their author as BookRead rows: id, title, genre, published_year, author_id, author_name"""
+    b = models.Book
+    return (
+        select(b.id, b.title, b.genre, b.published_year,
+               models.Author.id.label("author_id"), models.Author.name.label("author_name"))
+        .join(b.author)
+    )
+
+
+async def recommend_books(session: AsyncSession, book_id: int, limit: int = 10, offset: int = 0) -> list:
+    """Page of a book's materialized recommendations, best first, as BookRecommendation rows"""
     query = text("""
         SELECT b.id, b.title, b.genre, b.published_year,
-               a.id AS author_id, a.name AS author_name
-        FROM books b
-        JOIN authors a ON b.author_id = a.id
-        WHERE b.id != :book_id
-          AND (b.genre = (SELECT genre FROM books WHERE id = :book_id)
-               OR b.author_id = (SELECT author_id FROM books WHERE id = :book_id))
-        LIMIT :limit
+               a.id AS author_id, a.name AS author_name, r.score
+        FROM book_recommendations r
+        JOIN books b ON b.id = r.recommended_id
+        JOIN authors a ON a.id = b.author_id
+        WHERE r.book_id = :book_id
+        ORDER BY r.rank
+        LIMIT :limit OFFSET :offset
     """)
-    result = await session.execute(query, {"book_id": book_id, "limit": limit})
-    rows = result.mappings().all()
-    return [
-        {
-            "id": r['id'],
-            "title": r['title'],
-            "genre": r['genre'],
-            "published_year": r['published_year'],
-            "author": {"id": r['author_id'], "name": r['author_name']}
-        } for r in rows
-    ]
+    result = await session.execute(query, {"book_id": book_id, "limit": limit, "offset": offset})
+    return result.all()
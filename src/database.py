@@ -1,13 +1,121 @@
-from typing import AsyncGenerator
+import asyncio
+from contextlib import AsyncExitStack
+from typing import AsyncGenerator, Dict
+from uuid import uuid4
 
-from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy import event, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import DeclarativeMeta, declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool
 
-from .config import DATABASE_URL
+from .config import (
+    DATABASE_URL, DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE, DB_POOL_PRE_PING,
+    DB_STATEMENT_TIMEOUT_MS, DB_STATEMENT_CACHE_SIZE, DB_PGBOUNCER, DB_POOL_PREWARM
+)
 
 Base: DeclarativeMeta = declarative_base()
 
-engine = create_async_engine(DATABASE_URL)
+
+class InstrumentedQueuePool(AsyncAdaptedQueuePool):
+    """Queue pool that also counts callers waiting for a connection and checkout timeouts"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.waiting = 0
+        self.timeouts = 0
+
+    def _do_get(self):
+        self.waiting += 1
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            self.waiting -= 1
+
+    def recreate(self):
+        # engine.dispose() swaps in a recreated pool; keep the counters
+        pool = super().recreate()
+        pool.timeouts = self.timeouts
+        return pool
+
+
+def engine_options(url: str = DATABASE_URL, pgbouncer: bool = DB_PGBOUNCER) -> dict:
+    """create_async_engine() keyword arguments for url from the DB_* settings"""
+    if make_url(url).get_backend_name() != "postgresql":
+        return {"pool_pre_ping": DB_POOL_PRE_PING}
+
+    options = {
+        "poolclass": InstrumentedQueuePool,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+    if pgbouncer:
+        # a transaction-mode bouncer hands each transaction to any server connection, so named
+        # prepared statements can't be reused and must not collide
+        options["connect_args"] = {
+            "statement_cache_size": 0,
+            "prepared_statement_cache_size": 0,
+            "prepared_statement_name_func": lambda: f"__asyncpg_{uuid4()}__",
+        }
+    else:
+        connect_args = {"prepared_statement_cache_size": DB_STATEMENT_CACHE_SIZE}
+        if DB_STATEMENT_TIMEOUT_MS:
+            connect_args["server_settings"] = {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}
+        options["connect_args"] = connect_args
+    return options
+
+
+def create_engine(url: str = DATABASE_URL, **overrides) -> AsyncEngine:
+    """Engine configured from the DB_* settings; keyword arguments override them"""
+    pgbouncer = overrides.pop("pgbouncer", DB_PGBOUNCER)
+    engine = create_async_engine(url, **{**engine_options(url, pgbouncer), **overrides})
+    if pgbouncer and DB_STATEMENT_TIMEOUT_MS and engine.dialect.name == "postgresql":
+        # the bouncer rejects startup parameters, so the timeout is set per transaction
+        @event.listens_for(engine.sync_engine, "begin")
+        def _statement_timeout(conn):
+            conn.exec_driver_sql(f"SET LOCAL statement_timeout = {DB_STATEMENT_TIMEOUT_MS}")
+    return engine
+
+
+def pool_stats(engine: AsyncEngine) -> Dict[str, int]:
+    """Pool gauges: connections in use, idle and overflow, callers waiting, checkout timeouts"""
+    pool = engine.pool
+    stats = {"in_use": pool.checkedout()} if hasattr(pool, "checkedout") else {}
+    if isinstance(pool, AsyncAdaptedQueuePool):
+        stats.update(size=pool.size(), idle=pool.checkedin(), overflow=max(pool.overflow(), 0))
+    if isinstance(pool, InstrumentedQueuePool):
+        stats.update(waiting=pool.waiting, timeouts=pool.timeouts)
+    return stats
+
+
+async def prewarm_pool(engine: AsyncEngine, connections: int = DB_POOL_PREWARM) -> int:
+    """Opens up to `connections` pooled connections at once and leaves them idle in the pool"""
+    pool = engine.pool
+    if isinstance(pool, NullPool):
+        return 0
+    # queue pools keep at most pool_size idle connections; other pools (SQLite's) hold one
+    connections = min(connections, pool.size() if isinstance(pool, AsyncAdaptedQueuePool) else 1)
+    # hold all of them until every one is open, or the pool would hand the same connection out again
+    async with AsyncExitStack() as stack:
+        conns = await asyncio.gather(*(stack.enter_async_context(engine.connect()) for _ in range(connections)))
+        await asyncio.gather(*(conn.execute(text("SELECT 1")) for conn in conns))
+    return connections
+
+
+async def ping(engine: AsyncEngine):
+    """Checks out a pooled connection and runs SELECT 1 on it"""
+    async with engine.connect() as conn:
+        await conn.execute(text("SELECT 1"))
+
+
+engine = create_engine()
 
 async_session_maker = async_sessionmaker(engine, expire_on_commit=False)
 
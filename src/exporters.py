@@ -0,0 +1,128 @@
+import csv
+import importlib.util
+import io
+import json
+import zlib
+from typing import AsyncIterator, List
+
+from sqlalchemy.ext.asyncio import AsyncResult
+
+from . import models
+
+# export column name -> selected expression; rows are plain tuples in this order
+EXPORT_COLUMNS = {
+    "id": models.Book.id,
+    "title": models.Book.title,
+    "genre": models.Book.genre,
+    "published_year": models.Book.published_year,
+    "author": models.Author.name.label("author"),
+}
+
+# format -> (media type, file extension)
+EXPORT_FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrow"),
+}
+ARROW_FORMATS = ("parquet", "arrow")
+
+
+def has_pyarrow() -> bool:
+    # pyarrow is optional and only imported once a parquet/arrow export runs
+    return importlib.util.find_spec("pyarrow") is not None
+
+
+class _Drain(io.RawIOBase):
+    """Write-only file that hands out what was written since the last drain"""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._pos = 0
+
+    def writable(self):
+        return True
+
+    def write(self, b) -> int:
+        self._chunks.append(bytes(b))
+        self._pos += len(b)
+        return len(b)
+
+    def tell(self) -> int:
+        return self._pos
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+async def csv_stream(result: AsyncResult) -> AsyncIterator[bytes]:
+    """Renders a streamed result as CSV, one encoded chunk per fetched partition"""
+    buf = io.StringIO()
+    writer = csv.writer(buf)
+
+    def drain() -> bytes:
+        data = buf.getvalue().encode()
+        buf.seek(0)
+        buf.truncate()
+        return data
+
+    writer.writerow(list(result.keys()))
+    yield drain()
+    async for rows in result.partitions():
+        writer.writerows(rows)
+        yield drain()
+
+
+async def ndjson_stream(result: AsyncResult) -> AsyncIterator[bytes]:
+    keys = list(result.keys())
+    async for rows in result.partitions():
+        yield "".join(json.dumps(dict(zip(keys, row)), separators=(",", ":")) + "\n" for row in rows).encode()
+
+
+def _arrow_schema(keys: List[str]):
+    import pyarrow as pa
+
+    types = {"id": pa.int64(), "published_year": pa.int32()}
+    return pa.schema([(k, types.get(k, pa.string())) for k in keys])
+
+
+async def arrow_stream(result: AsyncResult, fmt: str) -> AsyncIterator[bytes]:
+    """Writes each fetched partition as one record batch (a row group for parquet)"""
+    import pyarrow as pa
+
+    schema = _arrow_schema(list(result.keys()))
+    sink = _Drain()
+    if fmt == "parquet":
+        import pyarrow.parquet as pq
+        writer = pq.ParquetWriter(sink, schema)
+    else:
+        writer = pa.ipc.new_stream(sink, schema)
+
+    async for rows in result.partitions():
+        columns = zip(*rows)
+        batch = pa.RecordBatch.from_arrays(
+            [pa.array(col, type=field.type) for col, field in zip(columns, schema)], schema=schema
+        )
+        writer.write_batch(batch)
+        yield sink.drain()
+    writer.close()
+    yield sink.drain()
+
+
+def export_stream(result: AsyncResult, fmt: str) -> AsyncIterator[bytes]:
+    if fmt in ARROW_FORMATS:
+        return arrow_stream(result, fmt)
+    if fmt == "ndjson":
+        return ndjson_stream(result)
+    return csv_stream(result)
+
+
+async def gzip_stream(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    compressor = zlib.compressobj(wbits=31)
+    async for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
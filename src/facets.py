@@ -0,0 +1,191 @@
+"""Genre / decade / author counts kept up to date by every write
+
+book_facet_counts holds a count for every combination of the three
+dimensions, including the marginals: ALL in a column means "summed over
+it". Each book therefore contributes to eight rows, and facets for a
+request filtered on any mix of genre, author and whole decades are read
+from the grouping set of exactly those dimensions, one row per bucket.
+
+    python -m src.facets    # recount from the books table
+"""
+import asyncio
+from collections import Counter
+from itertools import product
+from typing import Dict, Iterable, Optional, Tuple
+
+from sqlalchemy import Select, delete, func, insert, literal, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models
+
+ALL_GENRES = "*"
+NO_GENRE = ""
+ALL_DECADES = -1
+NO_DECADE = -2
+ALL_AUTHORS = 0
+
+DIMENSIONS = ("genre", "decade", "author_id")
+ALL = {"genre": ALL_GENRES, "decade": ALL_DECADES, "author_id": ALL_AUTHORS}
+
+FacetKey = Tuple[str, int, int]
+
+
+def facet_key(genre: Optional[str], published_year: Optional[int], author_id: int) -> FacetKey:
+    decade = NO_DECADE if published_year is None else int(published_year) // 10 * 10
+    return (genre if genre is not None else NO_GENRE, decade, author_id)
+
+
+def book_facet_key(book: models.Book) -> FacetKey:
+    return facet_key(book.genre, book.published_year, book.author_id)
+
+
+def _rollup(deltas: Dict[FacetKey, int]) -> Counter:
+    """Spreads per-book deltas over all eight grouping sets"""
+    rolled = Counter()
+    for (genre, decade, author_id), delta in deltas.items():
+        for g, d, a in product((genre, ALL_GENRES), (decade, ALL_DECADES), (author_id, ALL_AUTHORS)):
+            rolled[(g, d, a)] += delta
+    return rolled
+
+
+async def adjust_facets(session: AsyncSession, deltas: Dict[FacetKey, int]) -> None:
+    """Applies book count deltas per facet key in the caller's transaction"""
+    rows = [
+        {"genre": g, "decade": d, "author_id": a, "count": n}
+        for (g, d, a), n in sorted(_rollup(deltas).items()) if n
+    ]
+    if not rows:
+        return
+    table = models.BookFacetCount.__table__
+    dialect = (await session.connection()).dialect.name
+    if dialect in ("postgresql", "sqlite"):
+        stmt = (pg_insert if dialect == "postgresql" else sqlite_insert)(table)
+        stmt = stmt.on_conflict_do_update(index_elements=list(DIMENSIONS),
+                                          set_={"count": table.c.count + stmt.excluded.count})
+        await session.execute(stmt, rows)
+        return
+    for row in rows:
+        res = await session.execute(
+            update(table).where(*(table.c[dim] == row[dim] for dim in DIMENSIONS))
+            .values(count=table.c.count + row["count"])
+        )
+        if res.rowcount == 0:
+            await session.execute(insert(table).values(**row))
+
+
+def count_keys(keys: Iterable[FacetKey], sign: int = 1) -> Dict[FacetKey, int]:
+    counts = Counter()
+    for key in keys:
+        counts[key] += sign
+    return counts
+
+
+async def rebuild_facets(session: AsyncSession) -> None:
+    """Recounts every grouping set from the books table"""
+    b = models.Book
+    table = models.BookFacetCount.__table__
+    exprs = {
+        "genre": func.coalesce(b.genre, NO_GENRE),
+        "decade": func.coalesce(b.published_year // 10 * 10, NO_DECADE),
+        "author_id": b.author_id,
+    }
+    await session.execute(delete(table))
+    for kept in product((True, False), repeat=3):
+        columns = [exprs[dim] if keep else literal(ALL[dim]) for dim, keep in zip(DIMENSIONS, kept)]
+        grouped = [exprs[dim] for dim, keep in zip(DIMENSIONS, kept) if keep]
+        q = select(*columns, func.count()).select_from(b)
+        if grouped:
+            q = q.group_by(*grouped)
+        await session.execute(insert(table).from_select([*DIMENSIONS, "count"], q))
+    await session.commit()
+
+
+def _buckets(rows, limit: Optional[int] = None) -> list:
+    buckets = [
+        {"value": None if value in (NO_GENRE, NO_DECADE) else value, "label": label, "count": count}
+        for value, label, count in rows if count
+    ]
+    return buckets[:limit] if limit else buckets
+
+
+def counters_cover(title: Optional[str], year_from: Optional[int], year_to: Optional[int]) -> bool:
+    """Whether the counters can answer these filters: no title filter, whole decades only"""
+    return not title and (not year_from or year_from % 10 == 0) and (not year_to or year_to % 10 == 9)
+
+
+async def read_facets(session: AsyncSession, genre: Optional[str] = None, author: Optional[str] = None,
+                      year_from: Optional[int] = None, year_to: Optional[int] = None, limit: int = 20) -> dict:
+    """Facets from the counters; filters as in GET /books/, see counters_cover()"""
+    t = models.BookFacetCount.__table__
+    filtered = {"genre": bool(genre), "decade": bool(year_from or year_to), "author_id": bool(author)}
+    conditions = []
+    if genre:
+        conditions.append(t.c.genre == genre)
+    if filtered["decade"]:
+        # books without a year never match a year filter
+        conditions.append(t.c.decade >= (year_from or 0))
+    if year_to:
+        conditions.append(t.c.decade <= year_to)
+    if author:
+        conditions.append(t.c.author_id.in_(
+            select(models.Author.id).where(models.Author.name.ilike(f"%{author}%"))
+        ))
+
+    def grouping_set(*dims):
+        # rows that keep exactly the filtered dimensions plus dims, and sum over the others
+        keep = {dim for dim in DIMENSIONS if filtered[dim] or dim in dims}
+        return [t.c[dim] != ALL[dim] if dim in keep else t.c[dim] == ALL[dim] for dim in DIMENSIONS]
+
+    total = await session.scalar(select(func.coalesce(func.sum(t.c.count), 0)).where(*grouping_set(), *conditions))
+    facets = {"total": total}
+    for dim in ("genre", "decade"):
+        res = await session.execute(
+            select(t.c[dim], literal(None), func.sum(t.c.count).label("n"))
+            .where(*grouping_set(dim), *conditions)
+            .group_by(t.c[dim]).order_by(t.c[dim])
+        )
+        facets[dim] = _buckets(res.all())
+    res = await session.execute(
+        select(t.c.author_id, models.Author.name, func.sum(t.c.count).label("n"))
+        .join(models.Author, models.Author.id == t.c.author_id)
+        .where(*grouping_set("author_id"), *conditions)
+        .group_by(t.c.author_id, models.Author.name)
+        .having(func.sum(t.c.count) > 0)
+        .order_by(func.sum(t.c.count).desc(), t.c.author_id).limit(limit)
+    )
+    facets["author"] = _buckets(res.all())
+    return facets
+
+
+async def scan_facets(session: AsyncSession, books: Select, limit: int = 20) -> dict:
+    """Facets counted over filtered (genre, published_year, author_id) rows, for filters the counters can't answer"""
+    b = books.subquery()
+    decade = b.c.published_year // 10 * 10
+    total = await session.scalar(select(func.count()).select_from(b))
+    genres = await session.execute(
+        select(b.c.genre, literal(None), func.count()).group_by(b.c.genre).order_by(b.c.genre)
+    )
+    decades = await session.execute(
+        select(decade, literal(None), func.count()).group_by(decade).order_by(decade)
+    )
+    authors = await session.execute(
+        select(b.c.author_id, models.Author.name, func.count())
+        .join(models.Author, models.Author.id == b.c.author_id)
+        .group_by(b.c.author_id, models.Author.name)
+        .order_by(func.count().desc(), b.c.author_id).limit(limit)
+    )
+    return {"total": total, "genre": _buckets(genres.all()), "decade": _buckets(decades.all()),
+            "author": _buckets(authors.all())}
+
+
+async def _main():
+    from .database import async_session_maker
+
+    async with async_session_maker() as session:
+        await rebuild_facets(session)
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
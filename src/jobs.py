@@ -0,0 +1,284 @@
+import asyncio
+import logging
+import os
+import uuid
+from datetime import datetime, timedelta
+from typing import AsyncIterator, Optional
+
+from fastapi import UploadFile
+from sqlalchemy import or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from . import models
+from .config import (
+    IMPORT_BATCH_SIZE, IMPORT_WORKERS, IMPORT_JOB_DIR, IMPORT_JOB_STALE_SECONDS, IMPORT_JOB_MAX_REJECTIONS,
+    SEARCH_INDEX_ENABLED
+)
+from .crud import import_frame, open_import_reader
+from .cache import cache
+from .database import async_session_maker
+from .search_index import search_index
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+ACTIVE_STATUSES = ("queued", "running")
+
+
+async def upload_chunks(file: UploadFile) -> AsyncIterator[bytes]:
+    while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+        yield chunk
+
+
+def _remove_upload(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def job_progress(job: models.ImportJob) -> dict:
+    """Job row plus throughput (rows/s) and ETA of the current run"""
+    throughput = eta = None
+    if job.started_at and job.status == "running":
+        elapsed = (job.updated_at - job.started_at).total_seconds()
+        done = job.rows_processed - job.start_rows
+        if elapsed > 0 and done > 0:
+            throughput = done / elapsed
+            if job.rows_total is not None:
+                eta = max(job.rows_total - job.rows_processed, 0) / throughput
+    return {
+        "id": job.id,
+        "filename": job.filename,
+        "status": job.status,
+        "rows_total": job.rows_total,
+        "rows_processed": job.rows_processed,
+        "rows_imported": job.rows_imported,
+        "rows_rejected": job.rows_rejected,
+        "throughput": throughput,
+        "eta_seconds": eta,
+        "rejected": job.rejected or [],
+        "error": job.error,
+        "created_at": job.created_at,
+        "finished_at": job.finished_at,
+    }
+
+
+class ImportJobManager:
+    """Queue of import jobs drained by a pool of worker tasks
+
+    Uploads are spooled to IMPORT_JOB_DIR and progress is committed together
+    with every batch, so an interrupted job resumes from its last committed
+    batch. stop() hands the jobs it interrupts back to the queue. A running
+    job's updated_at is its heartbeat; jobs of a process that died without
+    stopping go stale and are requeued by the next sweep of any process.
+    """
+
+    def __init__(self, session_factory: async_sessionmaker = async_session_maker,
+                 workers: int = IMPORT_WORKERS, batch_size: int = IMPORT_BATCH_SIZE):
+        self.session_factory = session_factory
+        self.workers = workers
+        self.batch_size = batch_size
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks = []
+        # ids of the jobs this process is running right now
+        self._running = set()
+
+    def _ensure_workers(self):
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._sweeper()))
+
+    async def start(self):
+        """Starts the workers and requeues jobs left over by a previous process"""
+        self._ensure_workers()
+        async with self.session_factory() as session:
+            res = await session.execute(
+                select(models.ImportJob.id)
+                .where(models.ImportJob.status.in_(ACTIVE_STATUSES))
+                .order_by(models.ImportJob.created_at)
+            )
+            job_ids = res.scalars().all()
+        # enqueued after the session closes: workers start claiming as soon as a job is queued
+        for job_id in job_ids:
+            self._queue.put_nowait(job_id)
+
+    async def stop(self):
+        """Cancels the workers and puts the jobs they were running back in the queue"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._running:
+            # the cancelled batch rolled back; the next start resumes after the last committed one
+            async with self.session_factory() as session:
+                await session.execute(
+                    update(models.ImportJob)
+                    .where(models.ImportJob.id.in_(self._running), models.ImportJob.status == "running")
+                    .values(status="queued", updated_at=datetime.utcnow())
+                )
+                await session.commit()
+            self._running.clear()
+
+    async def requeue_stale(self) -> int:
+        """Queues jobs whose heartbeat is older than IMPORT_JOB_STALE_SECONDS; _claim settles races"""
+        stale = datetime.utcnow() - timedelta(seconds=IMPORT_JOB_STALE_SECONDS)
+        async with self.session_factory() as session:
+            res = await session.execute(
+                select(models.ImportJob.id)
+                .where(models.ImportJob.status.in_(ACTIVE_STATUSES), models.ImportJob.updated_at < stale)
+                .order_by(models.ImportJob.created_at)
+            )
+            job_ids = [job_id for job_id in res.scalars() if job_id not in self._running]
+        for job_id in job_ids:
+            self._queue.put_nowait(job_id)
+        return len(job_ids)
+
+    async def _sweeper(self):
+        while True:
+            await asyncio.sleep(IMPORT_JOB_STALE_SECONDS / 2)
+            try:
+                await self.requeue_stale()
+            except Exception:
+                logger.exception("stale import job sweep failed")
+
+    async def _heartbeat(self, job_id: str):
+        # keeps a slow batch from looking stale; own session, the job's is mid-transaction
+        while True:
+            await asyncio.sleep(IMPORT_JOB_STALE_SECONDS / 3)
+            async with self.session_factory() as session:
+                await session.execute(
+                    update(models.ImportJob)
+                    .where(models.ImportJob.id == job_id, models.ImportJob.status == "running")
+                    .values(updated_at=datetime.utcnow())
+                )
+                await session.commit()
+
+    async def submit(self, chunks: AsyncIterator[bytes], fmt: str, filename: Optional[str] = None) -> models.ImportJob:
+        """Spools the upload body to disk, records the job and queues it"""
+        job_id = uuid.uuid4().hex
+        os.makedirs(IMPORT_JOB_DIR, exist_ok=True)
+        path = os.path.join(IMPORT_JOB_DIR, f"{job_id}.{fmt}")
+
+        lines = 0
+        last = b"\n"
+        with open(path, "wb") as f:
+            async for chunk in chunks:
+                if not chunk:
+                    continue
+                await asyncio.to_thread(f.write, chunk)
+                lines += chunk.count(b"\n")
+                last = chunk[-1:]
+        if last != b"\n":
+            lines += 1
+        # estimate only: quoted CSV fields may span lines, arrays can't be counted
+        rows_total = {"csv": max(lines - 1, 0), "ndjson": lines}.get(fmt)
+
+        job = models.ImportJob(id=job_id, filename=filename or path, path=path,
+                               format=fmt, rows_total=rows_total)
+        async with self.session_factory() as session:
+            session.add(job)
+            await session.commit()
+
+        self._ensure_workers()
+        self._queue.put_nowait(job_id)
+        return job
+
+    async def _worker(self):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run(job_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("import job %s crashed", job_id)
+            finally:
+                self._queue.task_done()
+
+    async def _claim(self, session: AsyncSession, job_id: str) -> Optional[models.ImportJob]:
+        """Marks the job running unless another live worker already owns it"""
+        now = datetime.utcnow()
+        stale = now - timedelta(seconds=IMPORT_JOB_STALE_SECONDS)
+        res = await session.execute(
+            update(models.ImportJob)
+            .where(models.ImportJob.id == job_id)
+            .where(or_(models.ImportJob.status == "queued",
+                       (models.ImportJob.status == "running") & (models.ImportJob.updated_at < stale)))
+            .values(status="running", started_at=now, updated_at=now,
+                    start_rows=models.ImportJob.rows_processed)
+        )
+        await session.commit()
+        if res.rowcount != 1:
+            return None
+        return await session.get(models.ImportJob, job_id, populate_existing=True)
+
+    async def _run(self, job_id: str):
+        async with self.session_factory() as session:
+            job = await self._claim(session, job_id)
+            if job is None:
+                return
+            path = job.path
+            self._running.add(job_id)
+            heartbeat = asyncio.create_task(self._heartbeat(job_id))
+            try:
+                await self._process(session, job)
+            except Exception as exc:
+                self._running.discard(job_id)
+                await session.rollback()
+                await self._save(session, job_id, status="failed", error=f"{exc.__class__.__name__}: {exc}",
+                                 finished_at=datetime.utcnow())
+                # a failed job is never retried, so its upload is of no further use
+                _remove_upload(path)
+                raise
+            finally:
+                heartbeat.cancel()
+            # a cancelled job stays in _running for stop() to requeue
+            self._running.discard(job_id)
+
+    async def _save(self, session: AsyncSession, job_id: str, **values):
+        # plain UPDATEs: a rejected batch rolls back and expires ORM state
+        values.setdefault("updated_at", values.get("finished_at") or datetime.utcnow())
+        await session.execute(update(models.ImportJob).where(models.ImportJob.id == job_id).values(**values))
+        await session.commit()
+
+    async def _process(self, session: AsyncSession, job: models.ImportJob):
+        job_id, path = job.id, job.path
+        processed, imported, rejected_count = job.rows_processed, job.rows_imported, job.rows_rejected
+        saved_rejections = list(job.rejected or [])
+
+        with open(path, "rb") as f:
+            reader = await asyncio.to_thread(open_import_reader, f, job.format, self.batch_size)
+            skip = processed
+            while True:
+                chunk = await asyncio.to_thread(next, reader, None)
+                if chunk is None:
+                    break
+                # batches committed before a crash are skipped, not re-imported
+                if skip >= len(chunk):
+                    skip -= len(chunk)
+                    continue
+                chunk, skip = chunk.iloc[skip:], 0
+
+                ids, rejected = await import_frame(session, chunk, commit=False)
+                processed += len(chunk)
+                imported += len(ids)
+                rejected_count += len(rejected)
+                room = IMPORT_JOB_MAX_REJECTIONS - len(saved_rejections)
+                if rejected and room > 0:
+                    saved_rejections.extend(rejected[:room])
+                # progress commits in the same transaction as the batch itself
+                await self._save(session, job_id, rows_processed=processed, rows_imported=imported,
+                                 rows_rejected=rejected_count, rejected=saved_rejections)
+                if ids:
+                    await cache.invalidate_catalogue()
+                    if SEARCH_INDEX_ENABLED:
+                        await search_index.index_books(session, ids)
+
+        await self._save(session, job_id, status="completed", finished_at=datetime.utcnow())
+        _remove_upload(path)
+
+
+job_manager = ImportJobManager()
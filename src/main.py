@@ -1,10 +1,21 @@
-import uvicorn
-from fastapi import FastAPI
+import asyncio
+
+from fastapi import FastAPI, Response
+from fastapi.responses import JSONResponse
 from slowapi import _rate_limit_exceeded_handler
 from slowapi.errors import RateLimitExceeded
 
 from .utils.limiter import limiter
-from .database import engine
+from .config import (
+    DB_CREATE_SCHEMA, DB_POOL_PREWARM, METRICS_DIR, METRICS_ENABLED, READY_TIMEOUT, SEARCH_INDEX_ENABLED
+)
+from .database import engine, async_session_maker, ping, pool_stats, prewarm_pool
+from .metrics import (
+    CONTENT_TYPE, MetricsMiddleware, flush_periodically, render as render_metrics, retire as retire_metrics
+)
+from .replicas import ReadYourWritesMiddleware, replica_router
+from .search_index import search_index
+from .jobs import job_manager
 from .models import Base
 from .routes.auth import router as operations_auth
 from .routes.books import router as operations_books
@@ -15,17 +26,74 @@ app = FastAPI(
 )
 
 app.state.limiter = limiter
+app.add_middleware(ReadYourWritesMiddleware)
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
 app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
 
 app.include_router(operations_auth)
 app.include_router(operations_books)
 
+
+@app.get('/db/stats')
+async def db_pool_stats():
+    return {**pool_stats(engine), "replication": replica_router.stats()}
+
+
+@app.get('/health', include_in_schema=False)
+async def health():
+    # liveness: the worker's event loop is answering
+    return {"status": "ok"}
+
+
+@app.get('/ready', include_in_schema=False)
+async def ready():
+    # readiness: a primary pool connection can be checked out and queried within READY_TIMEOUT
+    try:
+        await asyncio.wait_for(ping(engine), READY_TIMEOUT)
+    except Exception as exc:
+        reason = "pool checkout timed out" if isinstance(exc, asyncio.TimeoutError) else repr(exc)
+        return JSONResponse({"status": "unavailable", "reason": reason, "pool": pool_stats(engine)},
+                            status_code=503)
+    return {"status": "ready", "pool": pool_stats(engine)}
+
+
+@app.get('/metrics', include_in_schema=False)
+async def metrics():
+    return Response(await render_metrics(), media_type=CONTENT_TYPE)
+
+
 @app.on_event('startup')
 async def on_startup():
-    # optionally create tables in dev (use alembic in prod)
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+    if DB_CREATE_SCHEMA:
+        # dev only; deployments run `alembic upgrade head`
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+    if DB_POOL_PREWARM:
+        await asyncio.gather(*(prewarm_pool(e, DB_POOL_PREWARM) for e in [engine, *replica_router.engines()]))
+    if SEARCH_INDEX_ENABLED:
+        async with async_session_maker() as session:
+            await search_index.build(session)
+    await job_manager.start()
+    replica_router.start()
+    if METRICS_ENABLED and METRICS_DIR:
+        app.state.metrics_flusher = asyncio.create_task(flush_periodically())
+
+
+@app.on_event('shutdown')
+async def on_shutdown():
+    flusher = getattr(app.state, "metrics_flusher", None)
+    if flusher is not None:
+        flusher.cancel()
+        # keeps this worker's counts in the shared totals after it exits
+        retire_metrics()
+    # interrupted import jobs go back to queued and resume from their last committed batch on next start
+    await job_manager.stop()
+    await replica_router.stop()
+    # close pooled connections now rather than leaving the server to time them out
+    await asyncio.gather(*(e.dispose() for e in [engine, *replica_router.engines()]))
 
 
 if __name__ == '__main__':
-    uvicorn.run(app, host="127.0.0.1", port=8000)
+    from .server import main
+    main()
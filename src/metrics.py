@@ -0,0 +1,390 @@
+"""Per-request instrumentation, served in the Prometheus text format at /metrics
+
+MetricsMiddleware opens a RequestStats for every HTTP request. SQLAlchemy
+cursor events charge statements and DB time to it, and timed() blocks charge
+serialization, bcrypt and rate-limit time. When the request ends its totals
+go into per-route histograms. Statements slower than SLOW_QUERY_MS are
+logged with their parameters, and a request that runs the same statement
+N_PLUS_ONE_THRESHOLD times or more is logged as a likely N+1.
+
+Metrics live in the worker process. With METRICS_DIR set, every worker
+writes a snapshot there every METRICS_FLUSH_SECONDS, and /metrics sums all
+snapshots, so a scrape that lands on any worker sees the whole server (the
+other workers' share up to one flush interval old). A worker that shuts
+down folds its snapshot into the directory's archive, so counters never go
+backwards when workers are recycled.
+"""
+import asyncio
+import fcntl
+import glob
+import json
+import logging
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from collections import Counter, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from .config import (
+    METRICS_DIR, METRICS_ENABLED, METRICS_FLUSH_SECONDS, N_PLUS_ONE_THRESHOLD, PROFILE_DIR, PROFILE_INTERVAL_MS, PROFILE_SLOW_REQUESTS_MS,
+    SLOW_QUERY_MS,
+)
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+MAX_LOGGED_PARAMS = 1000
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Tuple[str, ...], values: tuple, extra: str = "") -> str:
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class CounterMetric:
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, *labels, amount: float = 1):
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels) -> float:
+        return self._values.get(labels, 0)
+
+    def empty(self) -> "CounterMetric":
+        return CounterMetric(self.name, self.documentation, self.labels)
+
+    def dump(self) -> list:
+        return [[list(k), v] for k, v in self._values.items()]
+
+    def load(self, items: list):
+        """Adds dumped values to this counter's"""
+        for labels, amount in items:
+            self.inc(*labels, amount=amount)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        lines += [f"{self.name}{_labels(self.labels, k)} {v}" for k, v in sorted(self._values.items())]
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = (), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        # per label set: [count per bucket (+Inf last), sum]
+        self._series: Dict[tuple, list] = {}
+
+    def observe(self, value: float, *labels):
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def count(self, *labels) -> int:
+        series = self._series.get(labels)
+        return sum(series[0]) if series else 0
+
+    def empty(self) -> "Histogram":
+        return Histogram(self.name, self.documentation, self.labels, self.buckets)
+
+    def dump(self) -> list:
+        return [[list(k), counts, total] for k, (counts, total) in self._series.items()]
+
+    def load(self, items: list):
+        """Adds dumped series to this histogram's; series with other buckets are skipped"""
+        for labels, counts, total in items:
+            if len(counts) != len(self.buckets) + 1:
+                continue
+            series = self._series.setdefault(tuple(labels), [[0] * (len(self.buckets) + 1), 0.0])
+            series[0] = [a + b for a, b in zip(series[0], counts)]
+            series[1] += total
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for key, (counts, total) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, n in zip((*self.buckets, "+Inf"), counts):
+                cumulative += n
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labels, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, key)} {total}")
+            lines.append(f"{self.name}_count{_labels(self.labels, key)} {cumulative}")
+        return lines
+
+
+REQUEST_SECONDS = Histogram("http_request_duration_seconds", "Request latency", ("method", "route"))
+REQUESTS = CounterMetric("http_requests_total", "Requests by response status", ("method", "route", "status"))
+REQUEST_STATEMENTS = Histogram("http_request_db_statements", "SQL statements per request", ("route",),
+                               COUNT_BUCKETS)
+REQUEST_DB_SECONDS = Histogram("http_request_db_seconds", "Time in SQL statements per request", ("route",))
+REQUEST_PHASE_SECONDS = Histogram("http_request_phase_seconds",
+                                  "Time per request in serialization, bcrypt and rate limiting",
+                                  ("route", "phase"))
+STATEMENT_SECONDS = Histogram("db_statement_duration_seconds", "SQL statement latency", ("operation",))
+SLOW_QUERIES = CounterMetric("db_slow_queries_total", f"Statements over SLOW_QUERY_MS ({SLOW_QUERY_MS:g}ms)")
+N_PLUS_ONE = CounterMetric("http_request_n_plus_one_total",
+                             "Requests repeating one statement N_PLUS_ONE_THRESHOLD times or more", ("route",))
+
+REGISTRY = [REQUEST_SECONDS, REQUESTS, REQUEST_STATEMENTS, REQUEST_DB_SECONDS, REQUEST_PHASE_SECONDS,
+            STATEMENT_SECONDS, SLOW_QUERIES, N_PLUS_ONE]
+
+
+ARCHIVE_FILE = "archive.json"
+_worker_file = f"worker-{os.getpid()}-{uuid.uuid4().hex[:8]}.json"
+
+
+def snapshot(registry=None) -> dict:
+    return {metric.name: metric.dump() for metric in registry or REGISTRY}
+
+
+def merge(snapshots: List[dict]) -> list:
+    """A copy of REGISTRY holding the sum of the snapshots"""
+    merged = [metric.empty() for metric in REGISTRY]
+    by_name = {metric.name: metric for metric in merged}
+    for snap in snapshots:
+        for name, items in snap.items():
+            if name in by_name:
+                by_name[name].load(items)
+    return merged
+
+
+@contextmanager
+def _locked(exclusive: bool):
+    # readers share the lock; retire() takes it alone so nobody sees a snapshot in both places
+    with open(os.path.join(METRICS_DIR, ".lock"), "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        yield
+
+
+def _write(name: str, data: dict):
+    path = os.path.join(METRICS_DIR, name)
+    with open(f"{path}.tmp", "w") as f:
+        json.dump(data, f)
+    os.replace(f"{path}.tmp", path)
+
+
+def _read(path: str) -> dict:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def retire():
+    """Folds this worker's snapshot into the archive and removes its own file"""
+    with _locked(exclusive=True):
+        archive = merge([_read(os.path.join(METRICS_DIR, ARCHIVE_FILE)), snapshot()])
+        _write(ARCHIVE_FILE, snapshot(archive))
+        try:
+            os.remove(os.path.join(METRICS_DIR, _worker_file))
+        except FileNotFoundError:
+            pass
+
+
+async def flush_periodically():
+    """Writes this worker's snapshot to METRICS_DIR every METRICS_FLUSH_SECONDS"""
+    while True:
+        await asyncio.sleep(METRICS_FLUSH_SECONDS)
+        # taken on the loop, which is the only thread updating the metrics
+        await asyncio.to_thread(_write, _worker_file, snapshot())
+
+
+def _render(registry) -> str:
+    return "\n".join(line for metric in registry for line in metric.render()) + "\n"
+
+
+def _render_shared(own: dict) -> str:
+    _write(_worker_file, own)
+    with _locked(exclusive=False):
+        snapshots = [_read(path) for path in glob.glob(os.path.join(METRICS_DIR, "*.json"))]
+    return _render(merge(snapshots))
+
+
+async def render() -> str:
+    """This worker's metrics, or with METRICS_DIR the sum over every worker"""
+    if not METRICS_DIR:
+        return _render(REGISTRY)
+    return await asyncio.to_thread(_render_shared, snapshot())
+
+
+class RequestStats:
+    __slots__ = ("statements", "db_time", "phases", "repeats")
+
+    def __init__(self):
+        self.statements = 0
+        self.db_time = 0.0
+        self.phases: Dict[str, float] = {}
+        self.repeats: Counter = Counter()
+
+
+_current: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+@contextmanager
+def timed(phase: str):
+    """Charges the block's wall time to the current request's phase"""
+    stats = _current.get()
+    if stats is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.phases[phase] = stats.phases.get(phase, 0.0) + time.perf_counter() - start
+
+
+def _operation(statement: str) -> str:
+    return statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "?"
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start"].pop()
+    STATEMENT_SECONDS.observe(elapsed, _operation(statement))
+    if SLOW_QUERY_MS and elapsed * 1000 >= SLOW_QUERY_MS:
+        SLOW_QUERIES.inc()
+        logger.warning("slow query (%.1fms): %s | parameters: %.*s", elapsed * 1000, statement,
+                       MAX_LOGGED_PARAMS, repr(parameters))
+    stats = _current.get()
+    if stats is not None:
+        stats.statements += 1
+        stats.db_time += elapsed
+        stats.repeats[statement] += 1
+
+
+def _handle_error(context):
+    starts = context.connection.info.get("query_start") if context.connection is not None else None
+    if starts:
+        starts.pop()
+
+
+if METRICS_ENABLED:
+    event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+    event.listen(Engine, "handle_error", _handle_error)
+
+
+class StackSampler:
+    """Samples one thread's stack every `interval` seconds into a ring buffer"""
+
+    def __init__(self, thread_id: int, interval: float, keep_seconds: float = 60.0):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples: deque = deque(maxlen=max(int(keep_seconds / interval), 1))
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                return
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            self.samples.append((time.perf_counter(), ";".join(reversed(stack))))
+
+    def collapsed(self, start: float, end: float) -> str:
+        """Samples taken between start and end in collapsed-stack format ("frame;frame count")"""
+        counts = Counter(stack for t, stack in list(self.samples) if start <= t <= end)
+        return "".join(f"{stack} {n}\n" for stack, n in counts.most_common())
+
+
+_sampler: Optional[StackSampler] = None
+
+
+def _write_profile(route: str, elapsed: float, stacks: str):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    name = f"{time.strftime('%Y%m%d-%H%M%S')}-{re.sub(r'[^A-Za-z0-9]+', '_', route).strip('_') or 'root'}" \
+           f"-{elapsed * 1000:.0f}ms.folded"
+    with open(os.path.join(PROFILE_DIR, name), "w") as f:
+        f.write(stacks)
+
+
+class MetricsMiddleware:
+    """Times each HTTP request and records its SQL and phase totals per route
+
+    With PROFILE_SLOW_REQUESTS_MS set, the event loop's stack is sampled and
+    requests slower than that get the samples taken while they ran written to
+    PROFILE_DIR. Concurrent requests share the loop, so a profile can include
+    their frames too.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        global _sampler
+        if PROFILE_SLOW_REQUESTS_MS and _sampler is None:
+            _sampler = StackSampler(threading.get_ident(), PROFILE_INTERVAL_MS / 1000)
+
+        stats = RequestStats()
+        token = _current.set(stats)
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            _current.reset(token)
+            route = getattr(scope.get("route"), "path", "unmatched")
+            self._record(scope["method"], route, status, elapsed, stats)
+            if PROFILE_SLOW_REQUESTS_MS and elapsed * 1000 >= PROFILE_SLOW_REQUESTS_MS:
+                await asyncio.to_thread(_write_profile, route, elapsed,
+                                        _sampler.collapsed(start, start + elapsed))
+
+    @staticmethod
+    def _record(method: str, route: str, status: int, elapsed: float, stats: RequestStats):
+        REQUEST_SECONDS.observe(elapsed, method, route)
+        REQUESTS.inc(method, route, status)
+        REQUEST_STATEMENTS.observe(stats.statements, route)
+        REQUEST_DB_SECONDS.observe(stats.db_time, route)
+        for phase, seconds in stats.phases.items():
+            REQUEST_PHASE_SECONDS.observe(seconds, route, phase)
+        repeated = [(s, n) for s, n in stats.repeats.items() if n >= N_PLUS_ONE_THRESHOLD]
+        if repeated:
+            N_PLUS_ONE.inc(route)
+            for statement, n in repeated:
+                logger.warning("possible N+1 in %s %s: %d x %s", method, route, n, statement)
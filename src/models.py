@@ -1,8 +1,15 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Table
-from sqlalchemy.orm import relationship
+from datetime import datetime
+
+from sqlalchemy import (
+    Column, Integer, String, Float, ForeignKey, Table, DateTime, JSON, DDL, Index, event, func, literal_column, text
+)
+from sqlalchemy.orm import object_session, relationship
 
 from .database import Base
 
+# text search config of the tsvector indexes; queries must use the same one
+SIMPLE = literal_column("'simple'")
+
 
 class Author(Base):
     __tablename__ = "authors"
@@ -11,17 +18,102 @@ class Author(Base):
 
     books = relationship("Book", back_populates="author")
 
+    __table_args__ = (
+        Index("ix_authors_name_fts", func.to_tsvector(SIMPLE, name), postgresql_using="gin").ddl_if(dialect="postgresql"),
+        Index("ix_authors_name_trgm", name, postgresql_using="gin",
+              postgresql_ops={"name": "gin_trgm_ops"}).ddl_if(dialect="postgresql"),
+    )
+
 
 class Book(Base):
     __tablename__ = "books"
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, nullable=False, index=True)
-    genre = Column(String, index=True)
+    genre = Column(String)
     published_year = Column(Integer, index=True)
     author_id = Column(Integer, ForeignKey("authors.id"), nullable=False)
+    # bumped on every update (see _bump_version; core UPDATEs bump it themselves); together with
+    # updated_at it is the row's HTTP validator
+    version = Column(Integer, nullable=False, server_default=text("1"))
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow, onupdate=datetime.utcnow,
+                        server_default=func.now())
 
     author = relationship("Author", back_populates="books")
 
+    __table_args__ = (
+        Index("ix_books_title_fts", func.to_tsvector(SIMPLE, title), postgresql_using="gin").ddl_if(dialect="postgresql"),
+        Index("ix_books_title_trgm", title, postgresql_using="gin",
+              postgresql_ops={"title": "gin_trgm_ops"}).ddl_if(dialect="postgresql"),
+        # shaped after the GET /books/ filters and sorts, see migration f5a9e1c3b7d2
+        Index("ix_books_genre_year_id", genre, published_year, id),
+        Index("ix_books_author_id_id", author_id, id),
+    )
+
+
+@event.listens_for(Book, "before_update")
+def _bump_version(mapper, connection, target):
+    # incremented in SQL rather than used as an optimistic lock: concurrent writes stay last-write-wins
+    if object_session(target).is_modified(target, include_collections=False):
+        target.version = Book.version + 1
+
+
+# ---------------------------
+# FULL-TEXT SEARCH
+# ---------------------------
+# PostgreSQL: the GIN indexes declared on Author/Book serve tsvector matches and,
+# through pg_trgm, fuzzy matches and the ILIKE '%term%' filters
+event.listen(Base.metadata, "before_create",
+             DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql"))
+
+# SQLite: an FTS5 table keyed by book id, kept current by triggers
+SQLITE_FTS_DDL = [
+    "CREATE VIRTUAL TABLE books_fts USING fts5(title, author, tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+    """CREATE TRIGGER books_fts_ai AFTER INSERT ON books BEGIN
+        INSERT INTO books_fts(rowid, title, author)
+        VALUES (new.id, new.title, (SELECT name FROM authors WHERE id = new.author_id));
+    END""",
+    """CREATE TRIGGER books_fts_ad AFTER DELETE ON books BEGIN
+        DELETE FROM books_fts WHERE rowid = old.id;
+    END""",
+    """CREATE TRIGGER books_fts_au AFTER UPDATE OF title, author_id ON books BEGIN
+        UPDATE books_fts SET title = new.title, author = (SELECT name FROM authors WHERE id = new.author_id)
+        WHERE rowid = new.id;
+    END""",
+    """CREATE TRIGGER authors_fts_au AFTER UPDATE OF name ON authors BEGIN
+        UPDATE books_fts SET author = new.name WHERE rowid IN (SELECT id FROM books WHERE author_id = new.id);
+    END""",
+]
+for _stmt in SQLITE_FTS_DDL:
+    event.listen(Book.__table__, "after_create", DDL(_stmt).execute_if(dialect="sqlite"))
+for _stmt in ("DROP TRIGGER IF EXISTS authors_fts_au", "DROP TABLE IF EXISTS books_fts"):
+    event.listen(Book.__table__, "before_drop", DDL(_stmt).execute_if(dialect="sqlite"))
+
+
+class CatalogueState(Base):
+    """Single-row change counter bumped by every write to books"""
+    __tablename__ = "catalogue_state"
+    id = Column(Integer, primary_key=True)
+    version = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+
+class BookRecommendation(Base):
+    """Materialized neighbour list of a book, rank 0 first"""
+    __tablename__ = "book_recommendations"
+    book_id = Column(Integer, ForeignKey("books.id", ondelete="CASCADE"), primary_key=True)
+    rank = Column(Integer, primary_key=True)
+    recommended_id = Column(Integer, ForeignKey("books.id", ondelete="CASCADE"), nullable=False, index=True)
+    score = Column(Float, nullable=False)
+
+
+class BookFacetCount(Base):
+    """Book counts per (genre, decade, author) grouping set, maintained by writes; see facets.py"""
+    __tablename__ = "book_facet_counts"
+    genre = Column(String, primary_key=True)
+    decade = Column(Integer, primary_key=True)
+    author_id = Column(Integer, primary_key=True)
+    count = Column(Integer, nullable=False, default=0)
+
 
 class User(Base):
     __tablename__ = "users"
@@ -31,4 +123,22 @@ class User(Base):
     is_active = Column(Integer, default=1)
 
 
-
+class ImportJob(Base):
+    __tablename__ = "import_jobs"
+    id = Column(String, primary_key=True)
+    filename = Column(String, nullable=False)
+    path = Column(String, nullable=False)
+    format = Column(String, nullable=False)
+    status = Column(String, nullable=False, default="queued", index=True)
+    rows_total = Column(Integer)
+    rows_processed = Column(Integer, nullable=False, default=0)
+    rows_imported = Column(Integer, nullable=False, default=0)
+    rows_rejected = Column(Integer, nullable=False, default=0)
+    rejected = Column(JSON, nullable=False, default=list)
+    error = Column(String)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    # start of the current run and how many rows were already done by then
+    started_at = Column(DateTime)
+    start_rows = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    finished_at = Column(DateTime)
@@ -0,0 +1,220 @@
+"""Precomputed book recommendations
+
+Books are scored against each other on shared author, shared genre,
+publication-year proximity and title-token overlap. Candidates come from
+year-sorted windows within the same author and the same genre, so a rebuild
+is O(books * window) rather than all pairs. Each book's best
+RECOMMEND_NEIGHBOURS are stored in book_recommendations.
+
+    python -m src.recommendations    # full rebuild
+"""
+import asyncio
+import zlib
+from typing import List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from sqlalchemy import delete, func, or_, select, union
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models
+from .config import RECOMMEND_NEIGHBOURS
+from .crud import bump_catalogue_version, copy_rows, select_book_rows
+from .search import tokenize
+
+AUTHOR_WEIGHT = 3.0
+GENRE_WEIGHT = 2.0
+YEAR_WEIGHT = 1.0
+YEAR_SCALE = 10.0  # years for the year score to fall to 1/e
+TITLE_WEIGHT = 1.0
+BLOCK_SIZE = 50000
+INSERT_CHUNK_SIZE = 50000
+
+COLUMNS = ["id", "author_id", "genre", "published_year", "title"]
+
+
+class Catalogue:
+    """Column arrays of the books to score, one position per book"""
+
+    def __init__(self, df: pd.DataFrame):
+        self.ids = df["id"].to_numpy(np.int64)
+        self.author = df["author_id"].to_numpy(np.int64)
+        self.genre = pd.factorize(df["genre"])[0]  # missing genre -> -1, never a match
+        self.year = df["published_year"].to_numpy(np.float64)
+        # 64-bit token signature per title; Jaccard on the bits approximates token overlap
+        self.signature = np.fromiter(
+            (_signature(t) for t in df["title"]), dtype=np.uint64, count=len(df)
+        )
+
+    def __len__(self):
+        return len(self.ids)
+
+
+def _signature(title: Optional[str]) -> int:
+    bits = 0
+    for token in tokenize(title or ""):
+        bits |= 1 << (zlib.crc32(token.encode()) & 63)
+    return bits
+
+
+def score_pairs(cat: Catalogue, i: np.ndarray, j: np.ndarray) -> np.ndarray:
+    """Similarity of books i[k] and j[k] (positions in cat)"""
+    score = AUTHOR_WEIGHT * (cat.author[i] == cat.author[j])
+    score += GENRE_WEIGHT * ((cat.genre[i] == cat.genre[j]) & (cat.genre[i] >= 0))
+    score += YEAR_WEIGHT * np.nan_to_num(np.exp(-np.abs(cat.year[i] - cat.year[j]) / YEAR_SCALE))
+    shared = np.bitwise_count(cat.signature[i] & cat.signature[j])
+    total = np.bitwise_count(cat.signature[i] | cat.signature[j])
+    score += TITLE_WEIGHT * np.divide(shared, total, out=np.zeros(len(i)), where=total > 0)
+    return score
+
+
+def _top_k(cand: np.ndarray, scores: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Per row, the k best distinct candidates (-1 = none) sorted by score"""
+    # a pair found through both the author and the genre window counts once
+    order = np.argsort(cand, axis=1)
+    cand = np.take_along_axis(cand, order, axis=1)
+    scores = np.take_along_axis(scores, order, axis=1)
+    scores[:, 1:][cand[:, 1:] == cand[:, :-1]] = -np.inf
+    scores[cand < 0] = -np.inf
+
+    if cand.shape[1] > k:
+        best = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        cand = np.take_along_axis(cand, best, axis=1)
+        scores = np.take_along_axis(scores, best, axis=1)
+    order = np.argsort(-scores, axis=1, kind="stable")
+    cand = np.take_along_axis(cand, order, axis=1)
+    scores = np.take_along_axis(scores, order, axis=1)
+    cand[np.isneginf(scores)] = -1
+    return cand, scores
+
+
+def neighbours(cat: Catalogue, k: int = RECOMMEND_NEIGHBOURS, window: Optional[int] = None):
+    """(n, k) arrays of neighbour positions (-1 padded) and scores, best first"""
+    n = len(cat)
+    window = window or k
+    groupings = []
+    for group in (cat.author, cat.genre):
+        order = np.lexsort((cat.year, group))
+        position = np.empty(n, dtype=np.int64)
+        position[order] = np.arange(n)
+        groupings.append((group, order, position))
+
+    offsets = np.concatenate([np.arange(1, window + 1), -np.arange(1, window + 1)])
+    best_idx = np.full((n, k), -1, dtype=np.int64)
+    best_scores = np.full((n, k), -np.inf)
+    for start in range(0, n, BLOCK_SIZE):
+        rows = np.arange(start, min(start + BLOCK_SIZE, n))
+        columns = []
+        for group, order, position in groupings:
+            p = position[rows, None] + offsets
+            valid = (p >= 0) & (p < n)
+            cand = np.where(valid, order[np.clip(p, 0, n - 1)], -1)
+            same = (group[np.maximum(cand, 0)] == group[rows, None]) & (group[rows, None] >= 0)
+            columns.append(np.where(valid & same, cand, -1))
+        cand = np.concatenate(columns, axis=1)
+        i = np.broadcast_to(rows[:, None], cand.shape).ravel()
+        scores = score_pairs(cat, i, np.maximum(cand, 0).ravel()).reshape(cand.shape)
+        idx, sc = _top_k(cand, scores, k)
+        best_idx[rows, :idx.shape[1]] = idx
+        best_scores[rows, :sc.shape[1]] = sc
+    return best_idx, best_scores
+
+
+async def _load(session: AsyncSession, q) -> Catalogue:
+    res = await session.execute(q)
+    return Catalogue(pd.DataFrame(res.all(), columns=COLUMNS))
+
+
+def _records(cat: Catalogue, rows: np.ndarray, idx: np.ndarray, scores: np.ndarray) -> List[tuple]:
+    book, rank = np.nonzero(idx >= 0)
+    return list(zip(
+        cat.ids[rows[book]].tolist(), rank.tolist(), cat.ids[idx[book, rank]].tolist(),
+        scores[book, rank].round(6).tolist(),
+    ))
+
+
+async def rebuild_recommendations(session: AsyncSession, k: int = RECOMMEND_NEIGHBOURS) -> int:
+    """Recomputes every book's neighbour list; returns the number of rows stored"""
+    b = models.Book
+    cat = await _load(session, select(b.id, b.author_id, b.genre, b.published_year, b.title))
+    idx, scores = await asyncio.to_thread(neighbours, cat, k)
+    records = _records(cat, np.arange(len(cat)), idx, scores)
+
+    table = models.BookRecommendation.__table__
+    await session.execute(delete(table))
+    for start in range(0, len(records), INSERT_CHUNK_SIZE):
+        await copy_rows(session, table, ["book_id", "rank", "recommended_id", "score"],
+                        records[start:start + INSERT_CHUNK_SIZE])
+    # retires recommendation ETags and cached pages
+    await bump_catalogue_version(session)
+    await session.commit()
+    return len(records)
+
+
+async def compute_book_recommendations(session: AsyncSession, book_id: int,
+                                       k: int = RECOMMEND_NEIGHBOURS) -> Optional[List[Tuple[int, float]]]:
+    """One book's neighbours from its author and genre candidates; None if the book doesn't exist"""
+    b = models.Book
+    book = await session.get(b, book_id)
+    if book is None:
+        return None
+
+    # candidates: the k year-nearest books by the same author and in the same genre
+    distance = func.abs(func.coalesce(b.published_year, 0) - (book.published_year or 0))
+    windows = [
+        select(b.id).where(column == value, b.id != book_id).order_by(distance).limit(k).subquery()
+        for column, value in ((b.author_id, book.author_id), (b.genre, book.genre)) if value is not None
+    ]
+    candidates = union(*(select(w.c.id) for w in windows)).subquery()
+    cat = await _load(session, select(b.id, b.author_id, b.genre, b.published_year, b.title).where(
+        or_(b.id == book_id, b.id.in_(select(candidates.c.id)))
+    ).order_by(b.id != book_id))
+    if len(cat) < 2:
+        return []
+
+    others = np.arange(1, len(cat))
+    scores = score_pairs(cat, np.zeros(len(others), dtype=np.int64), others)
+    order = np.argsort(-scores, kind="stable")[:k]
+    return list(zip(cat.ids[others[order]].tolist(), scores[order].round(6).tolist()))
+
+
+async def recommend_unmaterialized(session: AsyncSession, book_id: int, limit: int = 10,
+                                   offset: int = 0) -> Optional[list]:
+    """recommend_books() for a book without a stored list yet, computed on the spot"""
+    recs = await compute_book_recommendations(session, book_id)
+    if recs is None:
+        return None
+    page = recs[offset:offset + limit]
+    res = await session.execute(select_book_rows().where(models.Book.id.in_([rec_id for rec_id, _ in page])))
+    rows = {row.id: tuple(row) for row in res}
+    return [rows[rec_id] + (score,) for rec_id, score in page if rec_id in rows]
+
+
+async def refresh_book_recommendations(session: AsyncSession, book_id: int, k: int = RECOMMEND_NEIGHBOURS):
+    """Replaces one book's stored list inside the caller's transaction
+
+    Other books' lists pick the book up at the next full rebuild.
+    """
+    recs = await compute_book_recommendations(session, book_id, k) or []
+    table = models.BookRecommendation.__table__
+    await session.execute(delete(table).where(table.c.book_id == book_id))
+    if recs:
+        await copy_rows(session, table, ["book_id", "rank", "recommended_id", "score"],
+                        [(book_id, rank, rec_id, score) for rank, (rec_id, score) in enumerate(recs)])
+
+
+async def forget_book(session: AsyncSession, book_id: int):
+    """Drops a deleted book's list and its appearances in others' (SQLite doesn't cascade)"""
+    table = models.BookRecommendation.__table__
+    await session.execute(delete(table).where(or_(table.c.book_id == book_id, table.c.recommended_id == book_id)))
+
+
+async def _main():
+    from .database import async_session_maker
+
+    async with async_session_maker() as session:
+        print(f"stored {await rebuild_recommendations(session)} recommendations")
+
+
+if __name__ == "__main__":
+    asyncio.run(_main())
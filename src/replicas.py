@@ -0,0 +1,218 @@
+import asyncio
+import logging
+import time
+from datetime import datetime
+from http.cookies import SimpleCookie
+from typing import AsyncGenerator, List, Optional
+
+from fastapi import Depends, Request
+from slowapi.util import get_remote_address
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker
+
+from .cache import cache
+from .config import (
+    DATABASE_REPLICA_URLS, REPLICA_MAX_LAG_SECONDS, REPLICA_CHECK_INTERVAL, REPLICA_CHECK_TIMEOUT,
+    READ_YOUR_WRITES_SECONDS,
+)
+from .crud import get_catalogue_state
+from .database import async_session_maker, create_engine, get_async_session
+from .utils.limiter import user_or_ip
+
+logger = logging.getLogger(__name__)
+
+PRIMARY_COOKIE = "bms_primary_until"
+SAFE_METHODS = (b"GET", b"HEAD", b"OPTIONS")
+
+
+class Replica:
+    __slots__ = ("name", "session_maker", "lag")
+
+    def __init__(self, name: str, session_maker: async_sessionmaker):
+        self.name = name
+        self.session_maker = session_maker
+        self.lag: Optional[float] = None  # seconds; None until checked or while unreachable
+
+
+class ReplicaRouter:
+    """Picks a replica for a read, round-robin over the ones that are caught up
+
+    Lag is measured through catalogue_state, which every write bumps: a
+    replica that hasn't seen the primary's latest version is behind by the
+    age of that version. This works the same for streaming replication and
+    for any other copy of the database. Lag is checked by a background task
+    (start() from the startup hook); requests only read the last result, so
+    a replica that hangs delays nobody but the check, and only for
+    REPLICA_CHECK_TIMEOUT.
+    """
+
+    def __init__(self, replicas: List[Replica], max_lag: float = REPLICA_MAX_LAG_SECONDS,
+                 check_interval: float = REPLICA_CHECK_INTERVAL, check_timeout: float = REPLICA_CHECK_TIMEOUT,
+                 session_factory: async_sessionmaker = async_session_maker):
+        self.replicas = replicas
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.check_timeout = check_timeout
+        self.session_factory = session_factory
+        self.primary_reads = 0
+        self.replica_reads = 0
+        # catalogue version of the primary at the last check; None once this process has written since
+        self.primary_version: Optional[int] = None
+        self._next = 0
+        self._writes = 0
+        self._monitor: Optional[asyncio.Task] = None
+
+    async def _replica_version(self, replica: Replica) -> int:
+        async with replica.session_maker() as session:
+            return (await get_catalogue_state(session))[0]
+
+    async def check(self):
+        """Measures every replica's lag against the primary, all at once"""
+        writes = self._writes
+        async with self.session_factory() as primary:
+            version, updated_at = await get_catalogue_state(primary)
+        results = await asyncio.gather(
+            *(asyncio.wait_for(self._replica_version(r), self.check_timeout) for r in self.replicas),
+            return_exceptions=True,
+        )
+        for replica, replica_version in zip(self.replicas, results):
+            if isinstance(replica_version, BaseException):
+                logger.warning("replica %s unreachable: %r", replica.name, replica_version)
+                replica.lag = None
+                continue
+            replica.lag = 0.0 if replica_version >= version else (datetime.utcnow() - updated_at).total_seconds()
+        # a write during the check may be newer than the version just read
+        if writes == self._writes:
+            self.primary_version = version
+
+    async def _run(self):
+        while True:
+            try:
+                await self.check()
+            except Exception as exc:
+                logger.warning("replica lag check failed: %r", exc)
+            await asyncio.sleep(self.check_interval)
+
+    def start(self):
+        if self.replicas and self._monitor is None:
+            self._monitor = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._monitor is not None:
+            self._monitor.cancel()
+            await asyncio.gather(self._monitor, return_exceptions=True)
+            self._monitor = None
+
+    def pick(self) -> Optional[Replica]:
+        """A replica that was caught up at the last check, round-robin; None for the primary"""
+        healthy = [r for r in self.replicas if r.lag is not None and r.lag <= self.max_lag]
+        if not healthy:
+            return None
+        self._next += 1
+        return healthy[self._next % len(healthy)]
+
+    def wrote(self):
+        """Called after a write: until the next check no replica is known to have it"""
+        self._writes += 1
+        self.primary_version = None
+
+    def caught_up(self, version: int) -> bool:
+        """Whether a replica read at catalogue `version` has everything the primary had when last seen"""
+        return self.primary_version is not None and version >= self.primary_version
+
+    def engines(self) -> List[AsyncEngine]:
+        return [r.session_maker.kw["bind"] for r in self.replicas]
+
+    def stats(self) -> dict:
+        return {
+            "primary_reads": self.primary_reads,
+            "replica_reads": self.replica_reads,
+            "replicas": {r.name: r.lag for r in self.replicas},
+        }
+
+
+def _replica(url: str) -> Replica:
+    return Replica(url.split("@")[-1], async_sessionmaker(create_engine(url), expire_on_commit=False))
+
+
+replica_router = ReplicaRouter([_replica(url) for url in DATABASE_REPLICA_URLS])
+
+
+def _writer_key(principal: str) -> str:
+    return f"bms:writer:{principal}"
+
+
+async def _wrote_recently(request: Request) -> bool:
+    try:
+        if float(request.cookies.get(PRIMARY_COOKIE, 0)) > time.time():
+            return True
+    except ValueError:
+        pass
+    # clients that don't keep cookies are recognised by their token's subject, else their address
+    until = await cache.backend.get(_writer_key(user_or_ip(request)))
+    return until is not None and float(until) > time.time()
+
+
+async def _record_write(request: Request, until: float):
+    # the cache backend is shared by all workers when it is redis
+    for principal in {user_or_ip(request), get_remote_address(request)}:
+        await cache.backend.set(_writer_key(principal), f"{until:.3f}".encode(), ex=READ_YOUR_WRITES_SECONDS)
+
+
+async def get_read_session(
+    request: Request,
+    primary: AsyncSession = Depends(get_async_session),
+) -> AsyncGenerator[AsyncSession, None]:
+    """Session for read-only handlers: a caught-up replica, else the primary"""
+    replica = None
+    if replica_router.replicas and not await _wrote_recently(request):
+        replica = replica_router.pick()
+    if replica is None:
+        replica_router.primary_reads += 1
+        yield primary
+        return
+    replica_router.replica_reads += 1
+    async with replica.session_maker() as session:
+        session.info["replica"] = replica.name
+        yield session
+
+
+def cacheable(session: AsyncSession, version: int) -> bool:
+    """Whether a read at catalogue `version` may fill the shared cache
+
+    Always on the primary; on a replica only when it isn't behind the
+    primary's last seen version, or it would store a stale answer under
+    the current generation.
+    """
+    return "replica" not in session.info or replica_router.caught_up(version)
+
+
+class ReadYourWritesMiddleware:
+    """Pins a client to the primary for READ_YOUR_WRITES_SECONDS after each successful write
+
+    The window is sent back as a cookie and also recorded in the cache backend
+    under the writer's token subject and address, so clients that drop the
+    cookie still read their own writes.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"].encode() in SAFE_METHODS or not replica_router.replicas:
+            return await self.app(scope, receive, send)
+
+        async def send_with_cookie(message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                replica_router.wrote()
+                until = time.time() + READ_YOUR_WRITES_SECONDS
+                await _record_write(Request(scope), until)
+                cookie = SimpleCookie()
+                cookie[PRIMARY_COOKIE] = f"{until:.3f}"
+                cookie[PRIMARY_COOKIE]["max-age"] = READ_YOUR_WRITES_SECONDS
+                cookie[PRIMARY_COOKIE]["path"] = "/"
+                cookie[PRIMARY_COOKIE]["httponly"] = True
+                header = cookie.output(header="").strip().encode()
+                message = {**message, "headers": [*message.get("headers", []), (b"set-cookie", header)]}
+            await send(message)
+
+        await self.app(scope, receive, send_with_cookie)
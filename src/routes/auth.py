@@ -6,6 +6,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi.security import OAuth2PasswordRequestForm
 
 from ..utils.limiter import limiter
+from ..config import RATE_LIMIT_AUTH
 from ..database import get_async_session
 from .. import schemas, models, auth
 from sqlalchemy import select
@@ -14,13 +15,13 @@ router = APIRouter(prefix="/auth", tags=["auth"])
 
 
 @router.post('/register', response_model=schemas.Token)
-@limiter.limit("5/minute")
+@limiter.limit(RATE_LIMIT_AUTH)
 async def register(request: Request, user_in: schemas.UserCreate, db: AsyncSession = Depends(get_async_session)):
     q = select(models.User).where(models.User.username == user_in.username)
     res = await db.execute(q)
     if res.scalar_one_or_none():
         raise HTTPException(status_code=400, detail="Username already registered")
-    user = models.User(username=user_in.username, hashed_password=auth.get_password_hash(user_in.password))
+    user = models.User(username=user_in.username, hashed_password=await auth.get_password_hash(user_in.password))
     db.add(user)
     await db.commit()
     await db.refresh(user)
@@ -31,10 +32,15 @@ async def register(request: Request, user_in: schemas.UserCreate, db: AsyncSessi
 
 
 @router.post('/token', response_model=schemas.Token)
-@limiter.limit("5/minute")
+@limiter.limit(RATE_LIMIT_AUTH)
 async def login(request: Request, form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(get_async_session)):
     user = await auth.authenticate_user(db, form_data.username, form_data.password)
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Incorrect username or password")
     token = auth.create_access_token(data={"sub": user.username})
     return {"access_token": token, "token_type": "bearer"}
+
+
+@router.get('/cache/stats')
+async def principal_cache_stats(current_user=Depends(auth.get_current_user)):
+    return auth.principal_cache.stats()
@@ -1,14 +1,47 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Query, Response, Request
+import asyncio
+import io
+import logging
+
+from fastapi import APIRouter, Body, Depends, HTTPException, UploadFile, File, Query, Response, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.exc import StaleDataError
 from sqlalchemy.future import select
 from sqlalchemy.orm import selectinload
-from typing import List, Optional
-import tempfile, io, csv
+from pydantic import ValidationError
+from typing import Any, Dict, List, Optional, Tuple
 
+from ..utils.conditional import conditional, is_not_modified, not_modified, validators
 from ..utils.limiter import limiter
 from .. import schemas, auth, models
+from ..authors import author_cache, resolve_author
+from ..cache import cache
 from ..database import get_async_session
-from ..crud import ALLOWED_GENRES, get_or_create_author, bulk_import
+from ..replicas import cacheable, get_read_session
+from ..facets import adjust_facets, book_facet_key, counters_cover, read_facets, scan_facets
+from ..jobs import UPLOAD_CHUNK_SIZE, job_manager, job_progress, upload_chunks
+from ..search import search_books
+from ..search_index import search_index, search_indexed
+from ..exporters import ARROW_FORMATS, EXPORT_COLUMNS, EXPORT_FORMATS, export_stream, gzip_stream, has_pyarrow
+from ..config import (
+    IMPORT_BATCH_SIZE, EXPORT_CHUNK_SIZE, SEARCH_INDEX_ENABLED, BATCH_MAX_ITEMS,
+    RATE_LIMIT_BULK, RATE_LIMIT_READ, RATE_LIMIT_SEARCH, RATE_LIMIT_WRITE, RECOMMEND_NEIGHBOURS
+)
+from ..crud import (
+    ALLOWED_GENRES, BodyReader, detect_import_format, open_import_reader, import_batches,
+    encode_cursor, decode_cursor, keyset_clause, bump_catalogue_version, get_catalogue_state, recommend_books,
+    select_book_rows, batch_create_books, batch_update_books, batch_delete_books
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _recommendations():
+    # numpy and pandas load on the first write or recommend call instead of at boot
+    from .. import recommendations
+    return recommendations
+
 
 router = APIRouter(prefix="/books", tags=["books"])
 
@@ -16,14 +49,14 @@ router = APIRouter(prefix="/books", tags=["books"])
 # CREATE BOOK
 # ---------------------------
 @router.post('/', response_model=schemas.BookRead)
-@limiter.limit("5/minute")
+@limiter.limit(RATE_LIMIT_WRITE)
 async def create_book(
         request: Request,
         book_in: schemas.BookCreate,
         db: AsyncSession = Depends(get_async_session),
         current_user=Depends(auth.get_current_user)
 ):
-    author = await get_or_create_author(db, book_in.author)
+    author = await resolve_author(db, book_in.author)
     book = models.Book(
         title=book_in.title,
         genre=book_in.genre,
@@ -31,127 +64,473 @@ async def create_book(
         author=author
     )
     db.add(book)
+    await db.flush()
+    await adjust_facets(db, {book_facet_key(book): 1})
+    await _recommendations().refresh_book_recommendations(db, book.id)
+    await bump_catalogue_version(db)
     await db.commit()
     await db.refresh(book)
+    await cache.invalidate_catalogue()
+    if SEARCH_INDEX_ENABLED:
+        search_index.add_book(book.id, book.title, author.id, author.name)
     return schemas.BookRead.from_orm(book)
 
 
 # ---------------------------
 # LIST BOOKS WITH FILTERS
 # ---------------------------
+class BookFilters:
+    """Query-string filters shared by the list and export endpoints"""
+
+    def __init__(
+            self,
+            title: Optional[str] = None,
+            author: Optional[str] = None,
+            genre: Optional[str] = None,
+            year_from: Optional[int] = None,
+            year_to: Optional[int] = None,
+    ):
+        self.title = title
+        self.author = author
+        self.genre = genre
+        self.year_from = year_from
+        self.year_to = year_to
+
+    def apply(self, q, author_joined: bool = False):
+        if self.title:
+            q = q.where(models.Book.title.ilike(f"%{self.title}%"))
+        if self.author:
+            if not author_joined:
+                q = q.join(models.Book.author)
+            q = q.where(models.Author.name.ilike(f"%{self.author}%"))
+        if self.genre:
+            q = q.where(models.Book.genre == self.genre)
+        if self.year_from:
+            q = q.where(models.Book.published_year >= self.year_from)
+        if self.year_to:
+            q = q.where(models.Book.published_year <= self.year_to)
+        return q
+
+
+SORT_COLUMNS = {
+    "id": models.Book.id,
+    "title": models.Book.title,
+    "published_year": models.Book.published_year,
+    "genre": models.Book.genre,
+}
+
+
 @router.get('/', response_model=List[schemas.BookRead])
-@limiter.limit("5/minute")
+@limiter.limit(RATE_LIMIT_READ)
 async def read_books(
         request: Request,
         skip: int = 0,
         limit: int = 20,
         sort: Optional[str] = Query(None, description="Sort field e.g. title or published_year"),
-        title: Optional[str] = None,
-        author: Optional[str] = None,
-        genre: Optional[str] = None,
-        year_from: Optional[int] = None,
-        year_to: Optional[int] = None,
-        db: AsyncSession = Depends(get_async_session)
+        cursor: Optional[str] = Query(None, description="X-Next-Cursor of the previous page; replaces skip"),
+        filters: BookFilters = Depends(),
+        db: AsyncSession = Depends(get_read_session)
 ):
-    q = select(models.Book).options(selectinload(models.Book.author))
-    if title:
-        q = q.where(models.Book.title.ilike(f"%{title}%"))
-    if author:
-        q = q.join(models.Book.author).where(models.Author.name.ilike(f"%{author}%"))
-    if genre:
-        q = q.where(models.Book.genre == genre)
-    if year_from:
-        q = q.where(models.Book.published_year >= year_from)
-    if year_to:
-        q = q.where(models.Book.published_year <= year_to)
-    if sort:
-        sort_col = getattr(models.Book, sort, models.Book.id)
-        q = q.order_by(sort_col)
+    sort = sort if sort in SORT_COLUMNS else "id"
+    params = dict(skip=skip, limit=limit, sort=sort, cursor=cursor, **vars(filters))
+    key = await cache.query_key("list", **params)
+    cached = await cache.get(key)
+    if cached is not None:
+        return conditional(request, cached)
+
+    # list validators come from the catalogue counter, so a 304 costs no row reads
+    version, updated_at = await get_catalogue_state(db)
+    headers = validators(f'W/"books-{version}-{cache.digest(**params)}"', updated_at)
+    if is_not_modified(request, headers):
+        return not_modified(headers)
+
+    sort_col = SORT_COLUMNS[sort]
+    # plain rows from one JOIN, encoded without ORM objects or model validation
+    q = filters.apply(select_book_rows(), author_joined=True)
+    if cursor:
+        try:
+            after = decode_cursor(cursor, sort)
+        except ValueError as exc:
+            raise HTTPException(status_code=400, detail=str(exc))
+        q = q.where(keyset_clause(sort_col, models.Book.id, after))
     else:
+        q = q.offset(skip)
+    if sort_col is models.Book.id:
         q = q.order_by(models.Book.id)
-    q = q.offset(skip).limit(limit)
-    result = await db.execute(q)
-    books = result.scalars().all()
-    return [schemas.BookRead.from_orm(b) for b in books]
+    else:
+        q = q.order_by(sort_col.asc().nulls_last(), models.Book.id)
+    q = q.limit(limit)
+    rows = (await db.execute(q)).all()
+    if rows and len(rows) == limit:
+        last = rows[-1]
+        headers["X-Next-Cursor"] = encode_cursor(sort, getattr(last, sort), last.id)
+    return await cache.respond_encoded(key, schemas.BOOK_READ_ROW.encode_many(rows), headers,
+                                      store=cacheable(db, version))
+
+
+# ---------------------------
+# FULL-TEXT SEARCH
+# ---------------------------
+@router.get('/search', response_model=List[schemas.BookSearchResult])
+@limiter.limit(RATE_LIMIT_SEARCH)
+async def search(
+        request: Request,
+        q: str = Query(..., min_length=1, description="Terms matched as prefixes against title and author"),
+        limit: int = Query(20, ge=1, le=100),
+        offset: int = Query(0, ge=0),
+        mode: str = Query("prefix", pattern="^(term|prefix|fuzzy)$",
+                          description="Match mode of the in-process index (SEARCH_INDEX_ENABLED)"),
+        db: AsyncSession = Depends(get_read_session)
+):
+    if SEARCH_INDEX_ENABLED:
+        return await search_indexed(db, q, limit=limit, offset=offset, mode=mode)
+    return await search_books(db, q, limit=limit, offset=offset)
+
+
+# ---------------------------
+# FACET COUNTS
+# ---------------------------
+@router.get('/facets', response_model=schemas.BookFacets)
+@limiter.limit(RATE_LIMIT_READ)
+async def facets(
+        request: Request,
+        limit: int = Query(20, ge=1, le=100, description="Number of author buckets"),
+        filters: BookFilters = Depends(),
+        db: AsyncSession = Depends(get_read_session)
+):
+    params = dict(limit=limit, **vars(filters))
+    key = await cache.query_key("facets", **params)
+    cached = await cache.get(key)
+    if cached is not None:
+        return conditional(request, cached)
+
+    version, updated_at = await get_catalogue_state(db)
+    headers = validators(f'W/"facets-{version}-{cache.digest(**params)}"', updated_at)
+    if is_not_modified(request, headers):
+        return not_modified(headers)
+
+    if counters_cover(filters.title, filters.year_from, filters.year_to):
+        result = await read_facets(db, filters.genre, filters.author, filters.year_from, filters.year_to, limit)
+    else:
+        books = filters.apply(select(models.Book.genre, models.Book.published_year, models.Book.author_id))
+        result = await scan_facets(db, books, limit)
+    return await cache.respond(key, result, headers, store=cacheable(db, version))
+
+
+# ---------------------------
+# BATCH CREATE / UPDATE / DELETE
+# ---------------------------
+def _validation_error(exc: ValidationError) -> str:
+    return "; ".join(f"{'.'.join(map(str, e['loc'])) or 'item'}: {e['msg']}" for e in exc.errors())
+
+
+def _check_batch_size(items: list):
+    if len(items) > BATCH_MAX_ITEMS:
+        raise HTTPException(status_code=413, detail=f"At most {BATCH_MAX_ITEMS} items per batch")
+
+
+def _batch_result(results: List[dict]) -> dict:
+    results.sort(key=lambda r: r["index"])
+    succeeded = sum(r["status"] < 400 for r in results)
+    return {"succeeded": succeeded, "failed": len(results) - succeeded, "results": results}
+
+
+async def _apply_batch(db: AsyncSession, apply, valid: List[Tuple[int, object]], results: List[dict]):
+    """Runs apply() over the valid items in one transaction; a failure fails all of them"""
+    try:
+        outcome = await apply()
+        await db.commit()
+    except Exception as exc:
+        await db.rollback()
+        logger.exception("batch of %d items failed", len(valid))
+        results.extend({"index": i, "status": 500, "error": f"batch failed: {exc.__class__.__name__}"}
+                       for i, _ in valid)
+        return None
+    return outcome
+
+
+@router.post('/batch', response_model=schemas.BatchResult)
+@limiter.limit(RATE_LIMIT_WRITE)
+async def batch_create(
+        request: Request,
+        items: List[Dict[str, Any]] = Body(...),
+        db: AsyncSession = Depends(get_async_session),
+        current_user=Depends(auth.get_current_user)
+):
+    _check_batch_size(items)
+    results, valid = [], []
+    for i, item in enumerate(items):
+        try:
+            book = schemas.BookCreate.model_validate(item)
+        except ValidationError as exc:
+            results.append({"index": i, "status": 422, "error": _validation_error(exc)})
+            continue
+        if book.genre not in ALLOWED_GENRES:
+            results.append({"index": i, "status": 422, "error": "unknown genre"})
+            continue
+        valid.append((i, book))
+
+    if valid:
+        ids = await _apply_batch(db, lambda: batch_create_books(db, [b.model_dump() for _, b in valid]),
+                                 valid, results)
+        if ids is not None:
+            results.extend({"index": i, "status": 201, "id": book_id} for (i, _), book_id in zip(valid, ids))
+            await cache.invalidate_catalogue()
+            if SEARCH_INDEX_ENABLED:
+                await search_index.index_books(db, ids)
+    return _batch_result(results)
+
+
+@router.patch('/batch', response_model=schemas.BatchResult)
+@limiter.limit(RATE_LIMIT_WRITE)
+async def batch_update(
+        request: Request,
+        items: List[Dict[str, Any]] = Body(...),
+        db: AsyncSession = Depends(get_async_session),
+        current_user=Depends(auth.get_current_user)
+):
+    _check_batch_size(items)
+    results, valid, seen = [], [], set()
+    for i, item in enumerate(items):
+        try:
+            change = schemas.BookBatchUpdate.model_validate(item)
+        except ValidationError as exc:
+            results.append({"index": i, "status": 422, "error": _validation_error(exc)})
+            continue
+        if change.genre and change.genre not in ALLOWED_GENRES:
+            results.append({"index": i, "status": 422, "error": "unknown genre"})
+            continue
+        if change.id in seen:
+            results.append({"index": i, "status": 422, "id": change.id, "error": "duplicate id in batch"})
+            continue
+        seen.add(change.id)
+        valid.append((i, change))
+
+    async def apply():
+        found = await batch_update_books(db, [c.model_dump() for _, c in valid])
+        for book_id in found:
+            if book_id is not None:
+                await _recommendations().refresh_book_recommendations(db, book_id)
+        return found
+
+    if valid:
+        found = await _apply_batch(db, apply, valid, results)
+        if found is not None:
+            results.extend(
+                {"index": i, "status": 200, "id": book_id} if book_id is not None
+                else {"index": i, "status": 404, "id": change.id, "error": "Book not found"}
+                for (i, change), book_id in zip(valid, found)
+            )
+            updated = {book_id for book_id in found if book_id is not None}
+            await cache.invalidate_catalogue()
+            if SEARCH_INDEX_ENABLED and updated:
+                res = await db.execute(select(models.Book).options(selectinload(models.Book.author))
+                                       .where(models.Book.id.in_(updated)))
+                for book in res.scalars():
+                    search_index.add_book(book.id, book.title, book.author.id, book.author.name)
+    return _batch_result(results)
+
+
+@router.delete('/batch', response_model=schemas.BatchResult)
+@limiter.limit(RATE_LIMIT_WRITE)
+async def batch_delete(
+        request: Request,
+        body: schemas.BookBatchDelete,
+        db: AsyncSession = Depends(get_async_session),
+        current_user=Depends(auth.get_current_user)
+):
+    _check_batch_size(body.ids)
+    results, valid, seen = [], [], set()
+    for i, book_id in enumerate(body.ids):
+        if book_id in seen:
+            results.append({"index": i, "status": 422, "id": book_id, "error": "duplicate id in batch"})
+            continue
+        seen.add(book_id)
+        valid.append((i, book_id))
+    deleted = await _apply_batch(db, lambda: batch_delete_books(db, [book_id for _, book_id in valid]),
+                                 valid, results)
+    if deleted is not None:
+        gone = set(deleted)
+        results.extend(
+            {"index": i, "status": 204, "id": book_id} if book_id in gone
+            else {"index": i, "status": 404, "id": book_id, "error": "Book not found"}
+            for i, book_id in valid
+        )
+        await cache.invalidate_catalogue()
+        if SEARCH_INDEX_ENABLED:
+            for book_id in gone:
+                search_index.remove_book(book_id)
+    return _batch_result(results)
+
+
+# ---------------------------
+# RESPONSE CACHE COUNTERS
+# ---------------------------
+@router.get('/cache/stats')
+async def cache_stats(current_user=Depends(auth.get_current_user)):
+    return {**cache.stats(), "authors": author_cache.stats()}
 
 
 # ---------------------------
 # BULK IMPORT BOOKS
 # ---------------------------
 @router.post('/import')
-@limiter.limit("5/minute")
+@limiter.limit(RATE_LIMIT_BULK)
 async def import_books(request: Request,
-                       file: UploadFile = File(...),
+                       response: Response,
+                       file: Optional[UploadFile] = File(None),
+                       background: bool = Query(False, description="Run as an import job and return its id"),
                        db: AsyncSession = Depends(get_async_session),
                        current_user=Depends(auth.get_current_user)
 ):
-    suffix = '.csv' if file.filename.endswith('.csv') else '.json'
-    tmp = tempfile.NamedTemporaryFile(delete=False, suffix=suffix)
-    with tmp as f:
-        content = await file.read()
-        f.write(content)
-    created = await bulk_import(db, tmp.name)
-    return {"imported": len(created)}
+    if file is not None:
+        # a multipart upload has already been spooled whole by starlette
+        fmt = detect_import_format(file.filename, file.content_type)
+        chunks, fileobj = upload_chunks(file), file.file
+    else:
+        # any other body (text/csv, application/x-ndjson, ...) is parsed as it arrives
+        content_type = request.headers.get("content-type", "").partition(";")[0].strip().lower()
+        if content_type == "multipart/form-data":
+            raise HTTPException(status_code=422, detail="Missing file field")
+        fmt = detect_import_format("", content_type)
+        chunks = request.stream()
+        fileobj = io.BufferedReader(BodyReader(chunks, asyncio.get_running_loop()), UPLOAD_CHUNK_SIZE)
+
+    if background:
+        job = await job_manager.submit(chunks, fmt, file.filename if file is not None else None)
+        response.status_code = 202
+        return job_progress(job)
+
+    # bounded batches either way: only the current batch is held in memory
+    inserted: List[int] = []
+    try:
+        reader = await run_in_threadpool(open_import_reader, fileobj, fmt, IMPORT_BATCH_SIZE)
+        result = await import_batches(db, reader, inserted)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=f"Malformed {fmt} upload: {exc}")
+    finally:
+        await cache.invalidate_catalogue()
+        if SEARCH_INDEX_ENABLED:
+            # batches committed before a malformed one are in the catalogue too
+            await search_index.index_books(db, inserted)
+    return result
+
+
+@router.get('/import/{job_id}', response_model=schemas.ImportJobRead)
+async def import_status(
+        job_id: str,
+        db: AsyncSession = Depends(get_async_session),
+        current_user=Depends(auth.get_current_user)
+):
+    job = await db.get(models.ImportJob, job_id, populate_existing=True)
+    if not job:
+        raise HTTPException(status_code=404, detail="Import job not found")
+    return job_progress(job)
 
 
 # ---------------------------
-# EXPORT BOOKS CSV
+# EXPORT BOOKS (STREAMED CSV/NDJSON/PARQUET/ARROW)
 # ---------------------------
 @router.get('/export')
-@limiter.limit("5/minute")
-async def export_books(request: Request, db: AsyncSession = Depends(get_async_session)):
-    q = select(models.Book).options(selectinload(models.Book.author)).limit(10000)
-    result = await db.execute(q)
-    books = result.scalars().all()
+@limiter.limit(RATE_LIMIT_BULK)
+async def export_books(
+        request: Request,
+        format: str = Query("csv", pattern="^(csv|ndjson|parquet|arrow)$"),
+        fields: Optional[str] = Query(None, description="Comma-separated columns, e.g. id,title,author"),
+        gzip: bool = Query(False, description="Compress the stream with Content-Encoding: gzip"),
+        filters: BookFilters = Depends(),
+        db: AsyncSession = Depends(get_read_session)
+):
+    names = [f.strip() for f in fields.split(",") if f.strip()] if fields else list(EXPORT_COLUMNS)
+    unknown = [f for f in names if f not in EXPORT_COLUMNS]
+    if unknown or not names:
+        raise HTTPException(status_code=400, detail=f"Unknown export fields: {', '.join(unknown)}")
+    if format in ARROW_FORMATS and not has_pyarrow():
+        raise HTTPException(status_code=501, detail=f"{format} export requires pyarrow")
+
+    q = select(*(EXPORT_COLUMNS[f] for f in names)).select_from(models.Book)
+    author_joined = "author" in names
+    if author_joined:
+        q = q.join(models.Book.author)
+    q = filters.apply(q, author_joined=author_joined).order_by(models.Book.id)
+    # server-side cursor on PostgreSQL, fetched EXPORT_CHUNK_SIZE rows at a time
+    result = await db.stream(q.execution_options(yield_per=EXPORT_CHUNK_SIZE))
 
-    stream = io.StringIO()
-    writer = csv.writer(stream)
-    writer.writerow(['id', 'title', 'genre', 'published_year', 'author'])
-    for book in books:
-        writer.writerow([book.id, book.title, book.genre, book.published_year, book.author.name])
-    stream.seek(0)
-    return Response(stream.getvalue(), media_type='text/csv',
-                    headers={"Content-Disposition": "attachment; filename=books.csv"})
+    media_type, ext = EXPORT_FORMATS[format]
+    headers = {"Content-Disposition": f"attachment; filename=books.{ext}"}
+    body = export_stream(result, format)
+    if gzip:
+        headers["Content-Encoding"] = "gzip"
+        body = gzip_stream(body)
+    return StreamingResponse(body, media_type=media_type, headers=headers)
 
 
 # ---------------------------
-# RECOMMENDATION ENDPOINT (по автору/жанру)
+# RECOMMENDATION ENDPOINT (precomputed, see recommendations.py)
 # ---------------------------
-@router.get('/{book_id}/recommend', response_model=List[schemas.BookRead])
-async def recommend(request: Request, book_id: int, db: AsyncSession = Depends(get_async_session)):
-    q = select(models.Book).options(selectinload(models.Book.author))
-    # простая рекомендация: книги того же автора
-    book_res = await db.execute(select(models.Book).options(selectinload(models.Book.author))
-                                .where(models.Book.id == book_id))
-    book = book_res.scalar_one_or_none()
-    if not book:
-        raise HTTPException(status_code=404, detail="Book not found")
+@router.get('/{book_id}/recommend', response_model=List[schemas.BookRecommendation])
+async def recommend(
+        request: Request,
+        book_id: int,
+        skip: int = Query(0, ge=0),
+        limit: int = Query(10, ge=1, le=RECOMMEND_NEIGHBOURS),
+        db: AsyncSession = Depends(get_read_session)
+):
+    params = dict(book_id=book_id, skip=skip, limit=limit)
+    key = await cache.query_key("recommend", **params)
+    cached = await cache.get(key)
+    if cached is not None:
+        return conditional(request, cached)
 
-    q = q.where((models.Book.author_id == book.author_id) & (models.Book.id != book.id)).limit(5)
-    result = await db.execute(q)
-    recs = result.scalars().all()
-    return [schemas.BookRead.from_orm(b) for b in recs]
+    version, updated_at = await get_catalogue_state(db)
+    headers = validators(f'W/"recommend-{version}-{cache.digest(**params)}"', updated_at)
+    if is_not_modified(request, headers):
+        return not_modified(headers)
+
+    # one indexed range read of the precomputed list
+    recs = await recommend_books(db, book_id, limit=limit, offset=skip)
+    if not recs:
+        # bulk-imported books have no list until the next rebuild
+        recs = await _recommendations().recommend_unmaterialized(db, book_id, limit=limit, offset=skip)
+        if recs is None:
+            raise HTTPException(status_code=404, detail="Book not found")
+    return await cache.respond_encoded(key, schemas.BOOK_RECOMMENDATION_ROW.encode_many(recs), headers,
+                                      store=cacheable(db, version))
 
 
 # ---------------------------
 # GET BOOK BY ID
 # ---------------------------
 @router.get('/{book_id}', response_model=schemas.BookRead)
-@limiter.limit("5/minute")
-async def get_book(request: Request, book_id: int, db: AsyncSession = Depends(get_async_session)):
-    q = select(models.Book).options(selectinload(models.Book.author)).where(models.Book.id == book_id)
-    result = await db.execute(q)
-    book = result.scalar_one_or_none()
-    if not book:
+@limiter.limit(RATE_LIMIT_READ)
+async def get_book(request: Request, book_id: int, db: AsyncSession = Depends(get_read_session)):
+    # the entry is keyed on the row's version, so writes to other books leave it cached
+    probe = select(models.Book.version, models.Book.updated_at).where(models.Book.id == book_id)
+    state = (await db.execute(probe)).first()
+    if not state:
         raise HTTPException(status_code=404, detail="Book not found")
-    return schemas.BookRead.from_orm(book)
+    headers = validators(f'"book-{book_id}-{state.version}"', state.updated_at)
+    if is_not_modified(request, headers):
+        return not_modified(headers)
+    cached = await cache.get(cache.book_key(book_id, state.version, state.updated_at))
+    if cached is not None:
+        return conditional(request, cached)
+
+    q = select_book_rows().add_columns(models.Book.version, models.Book.updated_at).where(models.Book.id == book_id)
+    row = (await db.execute(q)).first()
+    if not row:
+        raise HTTPException(status_code=404, detail="Book not found")
+    # keyed on what was read, not the probe: a write in between must not land under the old version
+    headers = validators(f'"book-{row.id}-{row.version}"', row.updated_at)
+    key = cache.book_key(row.id, row.version, row.updated_at)
+    return await cache.respond_encoded(key, schemas.BOOK_READ_ROW.encode(row), headers)
 
 
 # ---------------------------
 # UPDATE BOOK
 # ---------------------------
 @router.put('/{book_id}', response_model=schemas.BookRead)
-@limiter.limit("5/minute")
+@limiter.limit(RATE_LIMIT_WRITE)
 async def update_book(
         request: Request,
         book_id: int,
@@ -164,6 +543,7 @@ async def update_book(
     book = result.scalar_one_or_none()
     if not book:
         raise HTTPException(status_code=404, detail="Book not found")
+    old_facets = book_facet_key(book)
 
     if book_in.title:
         book.title = book_in.title
@@ -174,12 +554,26 @@ async def update_book(
     if book_in.published_year:
         book.published_year = book_in.published_year
     if book_in.author:
-        author = await get_or_create_author(db, book_in.author)
+        author = await resolve_author(db, book_in.author)
         book.author = author
 
     db.add(book)
+    try:
+        await db.flush()
+    except StaleDataError:
+        # deleted by a concurrent request since we loaded it
+        await db.rollback()
+        raise HTTPException(status_code=404, detail="Book not found")
+    new_facets = book_facet_key(book)
+    if new_facets != old_facets:
+        await adjust_facets(db, {old_facets: -1, new_facets: 1})
+    await _recommendations().refresh_book_recommendations(db, book.id)
+    await bump_catalogue_version(db)
     await db.commit()
     await db.refresh(book)
+    await cache.invalidate_catalogue()
+    if SEARCH_INDEX_ENABLED:
+        search_index.add_book(book.id, book.title, book.author.id, book.author.name)
     return schemas.BookRead.from_orm(book)
 
 
@@ -198,6 +592,12 @@ async def delete_book(
     book = result.scalar_one_or_none()
     if not book:
         raise HTTPException(status_code=404, detail="Book not found")
+    await _recommendations().forget_book(db, book_id)
+    await adjust_facets(db, {book_facet_key(book): -1})
     await db.delete(book)
+    await bump_catalogue_version(db)
     await db.commit()
+    await cache.invalidate_catalogue()
+    if SEARCH_INDEX_ENABLED:
+        search_index.remove_book(book_id)
     return Response(status_code=204)
@@ -1,7 +1,9 @@
 from pydantic import BaseModel, constr, conint
-from typing import Optional
+from typing import List, Optional, Union
 import datetime
 
+from .utils.encoding import RowSchema
+
 CURRENT_YEAR = datetime.date.today().year
 ALLOWED_GENRES = ["Fiction", "Non-Fiction", "Science", "History", "Fantasy", "Mystery"]
 
@@ -44,11 +46,92 @@ class BookRead(BaseModel):
     model_config = {"from_attributes": True}
 
 
+class BookSearchResult(BookRead):
+    score: float
+
+
+class BookBatchUpdate(BaseModel):
+    id: int
+    title: Optional[constr(strip_whitespace=True, min_length=1)] = None
+    genre: Optional[constr(strip_whitespace=True)] = None
+    published_year: Optional[conint(ge=1800, le=CURRENT_YEAR)] = None
+    author: Optional[constr(strip_whitespace=True, min_length=1)] = None
+
+
+class BookBatchDelete(BaseModel):
+    ids: List[int]
+
+
+class BatchItemResult(BaseModel):
+    index: int
+    status: int
+    id: Optional[int] = None
+    error: Optional[str] = None
+
+
+class BatchResult(BaseModel):
+    succeeded: int
+    failed: int
+    results: List[BatchItemResult]
+
+
+class BookRecommendation(BookRead):
+    score: float
+
+
+class FacetBucket(BaseModel):
+    value: Optional[Union[int, str]] = None
+    label: Optional[str] = None
+    count: int
+
+
+class BookFacets(BaseModel):
+    total: int
+    genre: List[FacetBucket]
+    decade: List[FacetBucket]
+    author: List[FacetBucket]
+
+
 class UserCreate(BaseModel):
     username: constr(strip_whitespace=True, min_length=3)
     password: constr(min_length=6)
 
 
+class Principal(BaseModel):
+    """The authenticated user as cached between requests"""
+    id: int
+    username: str
+    is_active: bool
+
+    model_config = {"from_attributes": True, "frozen": True}
+
+
 class Token(BaseModel):
     access_token: str
     token_type: str = "bearer"
+
+
+class ImportRejection(BaseModel):
+    row: int
+    reason: str
+
+
+class ImportJobRead(BaseModel):
+    id: str
+    filename: str
+    status: str
+    rows_total: Optional[int] = None
+    rows_processed: int
+    rows_imported: int
+    rows_rejected: int
+    throughput: Optional[float] = None
+    eta_seconds: Optional[float] = None
+    rejected: List[ImportRejection] = []
+    error: Optional[str] = None
+    created_at: datetime.datetime
+    finished_at: Optional[datetime.datetime] = None
+
+
+# compiled once for the lean read paths: rows carry the fields in declaration order
+BOOK_READ_ROW = RowSchema(BookRead)
+BOOK_RECOMMENDATION_ROW = RowSchema(BookRecommendation)
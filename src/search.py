@@ -0,0 +1,90 @@
+import re
+from typing import List
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# candidates come from index-backed probes on each table (any term), then rows
+# matching every term across title + author, or fuzzily, get ranked; title hits
+# weigh twice as much as author hits
+PG_SEARCH_SQL = text("""
+    WITH hits AS (
+        SELECT id FROM books
+        WHERE to_tsvector('simple', title) @@ to_tsquery('simple', :any_terms) OR title % :q
+        UNION
+        SELECT b.id FROM books b JOIN authors a ON a.id = b.author_id
+        WHERE to_tsvector('simple', a.name) @@ to_tsquery('simple', :any_terms) OR a.name % :q
+    )
+    SELECT b.id, b.title, b.genre, b.published_year,
+           a.id AS author_id, a.name AS author_name,
+           2 * ts_rank(to_tsvector('simple', b.title), to_tsquery('simple', :any_terms))
+             + ts_rank(to_tsvector('simple', a.name), to_tsquery('simple', :any_terms))
+             + greatest(similarity(b.title, :q), similarity(a.name, :q)) AS score
+    FROM hits
+    JOIN books b ON b.id = hits.id
+    JOIN authors a ON a.id = b.author_id
+    WHERE (to_tsvector('simple', b.title) || to_tsvector('simple', a.name)) @@ to_tsquery('simple', :all_terms)
+       OR b.title % :q OR a.name % :q
+    ORDER BY score DESC, b.id
+    LIMIT :limit OFFSET :offset
+""")
+
+SQLITE_SEARCH_SQL = text("""
+    SELECT b.id, b.title, b.genre, b.published_year,
+           a.id AS author_id, a.name AS author_name,
+           -bm25(books_fts, 2.0, 1.0) AS score
+    FROM books_fts
+    JOIN books b ON b.id = books_fts.rowid
+    JOIN authors a ON a.id = b.author_id
+    WHERE books_fts MATCH :match
+    ORDER BY bm25(books_fts, 2.0, 1.0), b.id
+    LIMIT :limit OFFSET :offset
+""")
+
+FALLBACK_SEARCH_SQL = text("""
+    SELECT b.id, b.title, b.genre, b.published_year,
+           a.id AS author_id, a.name AS author_name, 0.0 AS score
+    FROM books b
+    JOIN authors a ON a.id = b.author_id
+    WHERE lower(b.title) LIKE :like OR lower(a.name) LIKE :like
+    ORDER BY b.id
+    LIMIT :limit OFFSET :offset
+""")
+
+
+def tokenize(q: str) -> List[str]:
+    return [t.lower() for t in TOKEN_RE.findall(q)]
+
+
+async def search_books(session: AsyncSession, q: str, limit: int = 20, offset: int = 0) -> List[dict]:
+    """Ranked title/author search; every term matches as a prefix"""
+    tokens = tokenize(q)
+    if not tokens:
+        return []
+
+    params = {"limit": limit, "offset": offset}
+    dialect = (await session.connection()).dialect.name
+    if dialect == "postgresql":
+        stmt = PG_SEARCH_SQL
+        terms = [f"{t}:*" for t in tokens]
+        params.update(q=" ".join(tokens), any_terms=" | ".join(terms), all_terms=" & ".join(terms))
+    elif dialect == "sqlite":
+        stmt = SQLITE_SEARCH_SQL
+        params["match"] = " ".join(f'"{t}"*' for t in tokens)
+    else:
+        stmt = FALLBACK_SEARCH_SQL
+        params["like"] = f"%{' '.join(tokens)}%"
+
+    result = await session.execute(stmt, params)
+    return [
+        {
+            "id": r.id,
+            "title": r.title,
+            "genre": r.genre,
+            "published_year": r.published_year,
+            "author": {"id": r.author_id, "name": r.author_name},
+            "score": float(r.score),
+        } for r in result
+    ]
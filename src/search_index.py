@@ -0,0 +1,278 @@
+import heapq
+from array import array
+from bisect import bisect_left, insort
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import models
+from .search import tokenize
+
+# title matches weigh twice as much as author matches, as in the SQL search
+TITLE_WEIGHT = 2
+AUTHOR_WEIGHT = 1
+BUILD_CHUNK_SIZE = 10000
+
+
+def _book_rows():
+    return (
+        select(models.Book.id, models.Book.title, models.Book.author_id, models.Author.name)
+        .join(models.Book.author)
+    )
+
+
+class _Book:
+    __slots__ = ("author_id", "terms")
+
+    def __init__(self, author_id: int, terms: Tuple[str, ...]):
+        self.author_id = author_id
+        self.terms = terms
+
+
+class _Author:
+    __slots__ = ("terms", "books")
+
+    def __init__(self, terms: Tuple[str, ...]):
+        self.terms = terms
+        self.books = array("I")
+
+
+def _trigrams(term: str) -> Set[str]:
+    padded = f"${term}$"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _within_distance(a: str, b: str, max_dist: int) -> bool:
+    """Levenshtein distance <= max_dist, abandoning rows that already exceed it"""
+    if abs(len(a) - len(b)) > max_dist:
+        return False
+    prev = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        cur = [i]
+        for j, cb in enumerate(b, 1):
+            cur.append(min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + (ca != cb)))
+        if min(cur) > max_dist:
+            return False
+        prev = cur
+    return prev[-1] <= max_dist
+
+
+class InvertedIndex:
+    """In-process term/prefix/fuzzy index over book titles and author names
+
+    Title postings are sorted arrays of book ids; author postings map terms to
+    author ids whose books are kept per author. Deleted and updated books leave
+    stale title postings behind, which are skipped at query time and dropped
+    once they make up a fifth of the index.
+    """
+
+    def __init__(self):
+        self._books: Dict[int, _Book] = {}
+        self._authors: Dict[int, _Author] = {}
+        self._title_postings: Dict[str, array] = {}
+        self._author_postings: Dict[str, array] = {}
+        self._sorted_terms: List[str] = []
+        # terms first seen during a bulk load, sorted into _sorted_terms once it ends
+        self._new_terms: Optional[List[str]] = None
+        self._vocab: Dict[str, int] = {}
+        self._vocab_terms: List[str] = []
+        self._trigrams: Dict[str, array] = {}
+        self._stale = 0
+        self.max_book_id = 0
+
+    def __len__(self):
+        return len(self._books)
+
+    def _add_term(self, term: str):
+        if term in self._vocab:
+            return
+        term_id = len(self._vocab_terms)
+        self._vocab[term] = term_id
+        self._vocab_terms.append(term)
+        if self._new_terms is not None:
+            self._new_terms.append(term)
+        else:
+            insort(self._sorted_terms, term)
+        for gram in _trigrams(term):
+            self._trigrams.setdefault(gram, array("I")).append(term_id)
+
+    def add_book(self, book_id: int, title: str, author_id: int, author_name: str):
+        """Indexes a new book or re-indexes an updated one"""
+        if book_id in self._books:
+            self.remove_book(book_id)
+
+        author = self._authors.get(author_id)
+        if author is None:
+            author = self._authors[author_id] = _Author(tuple(set(tokenize(author_name))))
+            for term in author.terms:
+                self._add_term(term)
+                self._author_postings.setdefault(term, array("I")).append(author_id)
+        author.books.append(book_id)
+
+        terms = tuple(set(tokenize(title)))
+        for term in terms:
+            self._add_term(term)
+            postings = self._title_postings.setdefault(term, array("I"))
+            if not postings or postings[-1] < book_id:
+                postings.append(book_id)
+            else:
+                pos = bisect_left(postings, book_id)
+                # an updated book may still have its stale entry here
+                if pos == len(postings) or postings[pos] != book_id:
+                    postings.insert(pos, book_id)
+        self._books[book_id] = _Book(author_id, terms)
+        self.max_book_id = max(self.max_book_id, book_id)
+
+    def remove_book(self, book_id: int):
+        book = self._books.pop(book_id, None)
+        if book is None:
+            return
+        author = self._authors.get(book.author_id)
+        if author is not None and book_id in author.books:
+            author.books.remove(book_id)
+        self._stale += len(book.terms)
+        if self._stale > max(1000, len(self._books) // 5):
+            self.compact()
+
+    def _has_title_term(self, book_id: int, term: str) -> bool:
+        # postings entries of deleted books, or of terms an update removed, are stale
+        book = self._books.get(book_id)
+        return book is not None and term in book.terms
+
+    def compact(self):
+        """Drops stale ids from the title postings"""
+        for term, postings in list(self._title_postings.items()):
+            kept = array("I", (i for i in postings if self._has_title_term(i, term)))
+            if kept:
+                self._title_postings[term] = kept
+            else:
+                del self._title_postings[term]
+        self._stale = 0
+
+    def _prefix_terms(self, prefix: str) -> List[str]:
+        start = bisect_left(self._sorted_terms, prefix)
+        end = start
+        while end < len(self._sorted_terms) and self._sorted_terms[end].startswith(prefix):
+            end += 1
+        return self._sorted_terms[start:end]
+
+    def _fuzzy_terms(self, token: str) -> List[str]:
+        max_dist = 1 if len(token) <= 5 else 2
+        grams = _trigrams(token)
+        # every edit destroys at most three trigrams
+        needed = max(len(grams) - 3 * max_dist, 1)
+        counts = Counter()
+        for gram in grams:
+            counts.update(self._trigrams.get(gram, ()))
+        return [
+            self._vocab_terms[term_id] for term_id, shared in counts.items()
+            if shared >= needed and _within_distance(token, self._vocab_terms[term_id], max_dist)
+        ]
+
+    def _expand(self, token: str, mode: str) -> Iterable[str]:
+        if mode == "prefix":
+            return self._prefix_terms(token)
+        if mode == "fuzzy":
+            return self._fuzzy_terms(token)
+        return [token] if token in self._vocab else []
+
+    def search(self, q: str, limit: int = 20, offset: int = 0, mode: str = "prefix") -> List[Tuple[int, float]]:
+        """Book ids matching every term in title or author, best score first
+
+        mode is "term" (exact), "prefix" or "fuzzy" (edit distance 1-2).
+        """
+        tokens = tokenize(q)
+        if not tokens:
+            return []
+
+        scores: Optional[Dict[int, int]] = None
+        for token in tokens:
+            token_scores: Dict[int, int] = {}
+            for term in self._expand(token, mode):
+                for book_id in self._title_postings.get(term, ()):
+                    if self._has_title_term(book_id, term):
+                        token_scores[book_id] = TITLE_WEIGHT
+                for author_id in self._author_postings.get(term, ()):
+                    for book_id in self._authors[author_id].books:
+                        token_scores.setdefault(book_id, AUTHOR_WEIGHT)
+            if scores is None:
+                scores = token_scores
+            else:
+                scores = {i: s + token_scores[i] for i, s in scores.items() if i in token_scores}
+            if not scores:
+                return []
+
+        ranked = heapq.nsmallest(offset + limit, ((-s, i) for i, s in scores.items()))
+        return [(i, float(-s)) for s, i in ranked[offset:]]
+
+    @contextmanager
+    def _bulk(self):
+        # insort per new term would make a full build quadratic in the vocabulary; until the
+        # single sort at the end, prefix queries don't see the terms this load introduced
+        owner = self._new_terms is None
+        if owner:
+            self._new_terms = []
+        try:
+            yield
+        finally:
+            if owner:
+                self._sorted_terms.extend(self._new_terms)
+                self._sorted_terms.sort()
+                self._new_terms = None
+
+    async def _load(self, session: AsyncSession, q):
+        result = await session.stream(q.execution_options(yield_per=BUILD_CHUNK_SIZE))
+        async for rows in result.partitions():
+            for row in rows:
+                self.add_book(*row)
+
+    async def catch_up(self, session: AsyncSession):
+        """Indexes every book with an id above the highest indexed one"""
+        with self._bulk():
+            await self._load(session, _book_rows().where(models.Book.id > self.max_book_id).order_by(models.Book.id))
+
+    async def index_books(self, session: AsyncSession, book_ids: List[int]):
+        """Indexes books inserted behind the index's back (bulk imports, batch creates)
+
+        Takes their ids explicitly: SQLite hands the id of a deleted last row
+        to the next insert, so new books can sit below max_book_id.
+        """
+        with self._bulk():
+            for i in range(0, len(book_ids), BUILD_CHUNK_SIZE):
+                await self._load(session, _book_rows().where(models.Book.id.in_(book_ids[i:i + BUILD_CHUNK_SIZE])))
+
+    async def build(self, session: AsyncSession):
+        """Indexes the whole catalogue from scratch"""
+        self.__init__()
+        await self.catch_up(session)
+
+
+search_index = InvertedIndex()
+
+
+async def search_indexed(session: AsyncSession, q: str, limit: int = 20, offset: int = 0,
+                         mode: str = "prefix") -> List[dict]:
+    """search_books() answered from the in-process index; only the hits are loaded"""
+    hits = search_index.search(q, limit=limit, offset=offset, mode=mode)
+    if not hits:
+        return []
+    res = await session.execute(
+        select(models.Book.id, models.Book.title, models.Book.genre, models.Book.published_year,
+               models.Author.id.label("author_id"), models.Author.name.label("author_name"))
+        .join(models.Book.author)
+        .where(models.Book.id.in_([book_id for book_id, _ in hits]))
+    )
+    rows = {r.id: r for r in res}
+    return [
+        {
+            "id": r.id,
+            "title": r.title,
+            "genre": r.genre,
+            "published_year": r.published_year,
+            "author": {"id": r.author_id, "name": r.author_name},
+            "score": score,
+        } for r, score in ((rows.get(book_id), score) for book_id, score in hits) if r is not None
+    ]
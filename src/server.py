@@ -0,0 +1,122 @@
+"""Production launcher: python -m src.server
+
+Runs SERVER_WORKERS uvicorn worker processes behind one listening socket.
+Every worker builds its own engines, so the DB pools are per process; with
+DB_MAX_CONNECTIONS set, each worker's pool size and overflow are shrunk so
+that all workers together stay within it. The supervisor replaces workers
+that exit, which is how SERVER_MAX_REQUESTS recycling works, and on SIGTERM
+each worker stops accepting connections, lets in-flight requests finish for
+up to SERVER_GRACEFUL_TIMEOUT seconds, then runs the shutdown handlers.
+SIGHUP restarts the workers one at a time. Workers share METRICS_DIR (a
+fresh temporary directory unless it is set), so /metrics on any of them
+reports the whole server.
+"""
+import glob
+import importlib.util
+import logging
+import os
+import shutil
+import sys
+import tempfile
+from typing import List
+
+import uvicorn
+
+from .config import (
+    CACHE_BACKEND, DB_MAX_CONNECTIONS, DB_MAX_OVERFLOW, DB_POOL_SIZE, METRICS_DIR, RATE_LIMIT_STORAGE_URI,
+    SEARCH_INDEX_ENABLED, SERVER_GRACEFUL_TIMEOUT, SERVER_HOST, SERVER_HTTP, SERVER_KEEPALIVE, SERVER_LOOP,
+    SERVER_MAX_REQUESTS, SERVER_MAX_REQUESTS_JITTER, SERVER_PORT, SERVER_WORKERS,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def worker_pool_settings(workers: int, max_connections: int = DB_MAX_CONNECTIONS,
+                         pool_size: int = DB_POOL_SIZE, max_overflow: int = DB_MAX_OVERFLOW) -> dict:
+    """DB_POOL_SIZE / DB_MAX_OVERFLOW for each of `workers` processes sharing max_connections"""
+    if not max_connections:
+        return {"DB_POOL_SIZE": pool_size, "DB_MAX_OVERFLOW": max_overflow}
+    share = max(max_connections // workers, 1)
+    size = min(pool_size, share)
+    return {"DB_POOL_SIZE": size, "DB_MAX_OVERFLOW": min(max_overflow, share - size)}
+
+
+def _implementation(choice: str, preferred: str, fallback: str) -> str:
+    """`choice` unless it is "auto": then `preferred` when it is installed, else `fallback`"""
+    if choice != "auto":
+        if choice == preferred and importlib.util.find_spec(preferred) is None:
+            sys.exit(f"{preferred} was requested but is not installed")
+        return choice
+    return preferred if importlib.util.find_spec(preferred) is not None else fallback
+
+
+def per_process_state() -> List[str]:
+    """Settings whose state each worker keeps to itself, so several workers don't share it"""
+    unshared = []
+    if RATE_LIMIT_STORAGE_URI.startswith("memory://"):
+        unshared.append("RATE_LIMIT_STORAGE_URI=memory://: every worker enforces the full limit on its own")
+    if CACHE_BACKEND == "memory":
+        unshared.append("CACHE_BACKEND=memory: a write only retires the writing worker's cache entries, "
+                        "and read-your-writes after dropping the cookie only holds on that worker")
+    if SEARCH_INDEX_ENABLED:
+        unshared.append("SEARCH_INDEX_ENABLED: each worker's index only sees its own writes")
+    return unshared
+
+
+def metrics_dir() -> str:
+    """METRICS_DIR emptied of a previous run's snapshots, or a new temporary directory"""
+    if not METRICS_DIR:
+        return tempfile.mkdtemp(prefix="bms-metrics-")
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    # a restarted server starts its counters from zero, like a restarted process
+    for path in glob.glob(os.path.join(METRICS_DIR, "*.json")):
+        os.remove(path)
+    return METRICS_DIR
+
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s:     %(message)s")
+    workers = max(SERVER_WORKERS, 1)
+
+    # workers are spawned, not forked: they read these settings afresh when importing src.config
+    pools = worker_pool_settings(workers)
+    os.environ.update({k: str(v) for k, v in pools.items()})
+    if DB_MAX_CONNECTIONS and workers > DB_MAX_CONNECTIONS:
+        logger.warning("%d workers but DB_MAX_CONNECTIONS=%d: each worker still needs a connection",
+                       workers, DB_MAX_CONNECTIONS)
+    if workers > 1:
+        for unshared in per_process_state():
+            logger.warning("%d workers with %s", workers, unshared)
+    if SERVER_MAX_REQUESTS and workers == 1:
+        logger.info("a single worker is not supervised; SERVER_MAX_REQUESTS recycling needs WEB_CONCURRENCY > 1")
+
+    shared_metrics = metrics_dir() if workers > 1 else ""
+    if shared_metrics:
+        os.environ["METRICS_DIR"] = shared_metrics
+
+    loop = _implementation(SERVER_LOOP, "uvloop", "asyncio")
+    http = _implementation(SERVER_HTTP, "httptools", "h11")
+    logger.info("%d worker(s), loop=%s http=%s, per-worker pool %d + %d overflow", workers, loop, http,
+                pools["DB_POOL_SIZE"], pools["DB_MAX_OVERFLOW"])
+
+    try:
+        uvicorn.run(
+            "src.main:app",
+            host=SERVER_HOST,
+            port=SERVER_PORT,
+            workers=workers,
+            loop=loop,
+            http=http,
+            lifespan="on",
+            timeout_keep_alive=SERVER_KEEPALIVE,
+            timeout_graceful_shutdown=SERVER_GRACEFUL_TIMEOUT,
+            limit_max_requests=(SERVER_MAX_REQUESTS or None) if workers > 1 else None,
+            limit_max_requests_jitter=SERVER_MAX_REQUESTS_JITTER,
+        )
+    finally:
+        if shared_metrics and not METRICS_DIR:
+            shutil.rmtree(shared_metrics, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Dict, Optional
+
+from fastapi import Request, Response
+
+
+def validators(etag: str, last_modified: Optional[datetime] = None) -> Dict[str, str]:
+    """ETag / Last-Modified headers; naive datetimes are UTC"""
+    headers = {"ETag": etag}
+    if last_modified is not None:
+        headers["Last-Modified"] = format_datetime(last_modified.replace(tzinfo=timezone.utc), usegmt=True)
+    return headers
+
+
+def _weak(tag: str) -> str:
+    return tag[2:] if tag.startswith("W/") else tag
+
+
+def is_not_modified(request: Request, headers: Dict[str, str]) -> bool:
+    """RFC 9110 evaluation: If-None-Match wins over If-Modified-Since"""
+    if_none_match = request.headers.get("if-none-match")
+    etag = headers.get("ETag") or headers.get("etag")
+    if if_none_match is not None:
+        if if_none_match.strip() == "*":
+            return True
+        return etag is not None and _weak(etag) in {_weak(t.strip()) for t in if_none_match.split(",")}
+
+    if_modified_since = request.headers.get("if-modified-since")
+    last_modified = headers.get("Last-Modified") or headers.get("last-modified")
+    if if_modified_since and last_modified:
+        try:
+            return parsedate_to_datetime(last_modified) <= parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def not_modified(headers: Dict[str, str]) -> Response:
+    return Response(status_code=304, headers={k: v for k, v in headers.items()
+                                              if k.lower() in ("etag", "last-modified")})
+
+
+def conditional(request: Request, response: Response) -> Response:
+    """304 in place of a cached response whose validators the client already has"""
+    if is_not_modified(request, dict(response.headers)):
+        return not_modified(dict(response.headers))
+    return response
@@ -0,0 +1,71 @@
+"""JSON encoding of result rows for the hot read paths
+
+A RowSchema is compiled once from a response model into a function that
+maps a flat result row (columns in the model's field order, nested models
+flattened in place) onto the response dict, so reads skip ORM objects,
+Pydantic validation and jsonable_encoder. orjson is used when installed.
+"""
+import json
+from typing import Any, Callable, Iterable, List, Sequence, Tuple, Type
+
+from pydantic import BaseModel
+
+from ..metrics import timed
+
+try:
+    import orjson
+except ImportError:  # optional, the stdlib encoder produces the same JSON more slowly
+    orjson = None
+
+
+def dumps(content: Any) -> bytes:
+    """Compact JSON bytes of plain dicts/lists/str/int/float/None"""
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+def _layout(model: Type[BaseModel]) -> List[Tuple[str, Any]]:
+    """[(key, None) | (key, nested layout)] in field order"""
+    layout = []
+    for name, field in model.model_fields.items():
+        annotation = field.annotation
+        if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+            layout.append((name, _layout(annotation)))
+        else:
+            layout.append((name, None))
+    return layout
+
+
+def _source(layout, position: List[int]) -> str:
+    items = []
+    for key, nested in layout:
+        if nested is None:
+            items.append(f"{key!r}: r[{position[0]}]")
+            position[0] += 1
+        else:
+            items.append(f"{key!r}: {_source(nested, position)}")
+    return "{" + ", ".join(items) + "}"
+
+
+class RowSchema:
+    """Row -> dict converter compiled from a response model
+
+    Rows may carry extra trailing columns (e.g. version for validators);
+    they are ignored.
+    """
+
+    def __init__(self, model: Type[BaseModel]):
+        position = [0]
+        source = _source(_layout(model), position)
+        self.width = position[0]
+        self.to_dict: Callable[[Sequence], dict] = eval(f"lambda r: {source}", {})
+
+    def encode(self, row: Sequence) -> bytes:
+        with timed("serialization"):
+            return dumps(self.to_dict(row))
+
+    def encode_many(self, rows: Iterable[Sequence]) -> bytes:
+        to_dict = self.to_dict
+        with timed("serialization"):
+            return dumps([to_dict(r) for r in rows])
@@ -1,4 +1,146 @@
+import time
+from typing import Dict
+
+from jose import JWTError, jwt
+from limits import RateLimitItem
+from limits.strategies import RateLimiter
 from slowapi import Limiter
 from slowapi.util import get_remote_address
+from starlette.requests import Request
+
+from ..metrics import timed
+from ..config import (
+    SECRET_KEY, ALGORITHM, RATE_LIMIT_STORAGE_URI, RATE_LIMIT_STRATEGY, RATE_LIMIT_LEASE_FRACTION
+)
+
+
+def user_or_ip(request: Request) -> str:
+    """Rate-limit key: the verified JWT subject, else the client address"""
+    authorization = request.headers.get("authorization", "")
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() == "bearer" and token:
+        try:
+            sub = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]).get("sub")
+        except JWTError:
+            sub = None
+        if sub:
+            return f"user:{sub}"
+    return get_remote_address(request)
+
+# lease table size below which expired leases are left alone
+LEASE_SWEEP_MIN = 1024
+
+
+class _Lease:
+    __slots__ = ("expires", "tokens", "period_end", "hits", "last_hits")
+
+    def __init__(self):
+        self.expires = 0.0
+        self.tokens = 0
+        self.period_end = 0.0
+        self.hits = 0
+        self.last_hits = 0
+
+
+class LeasedRateLimiter(RateLimiter):
+    """Spends tokens leased in bulk from the shared storage before going back to it
+
+    A lease is valid for `fraction` of the window and is sized by the key's
+    own traffic in this process: at most what it used in the last such
+    period, capped at `fraction` of the limit. A key whose requests are
+    spread over many workers is seen rarely by each, so it goes to the
+    storage on every request instead of each worker stranding a lease.
+    Tokens left in an expired lease are lost, which can only make the
+    effective limit stricter, and by no more than the last period's hits.
+    Idle keys are swept out whenever the table has doubled since the last
+    sweep.
+    """
+
+    def __init__(self, inner: RateLimiter, fraction: float):
+        super().__init__(inner.storage)
+        self.inner = inner
+        self.fraction = fraction
+        self.remote_hits = 0
+        self._leases: Dict[str, _Lease] = {}
+        self._sweep_at = LEASE_SWEEP_MIN
+
+    def hit(self, item: RateLimitItem, *identifiers: str, cost: int = 1) -> bool:
+        key = item.key_for(*identifiers)
+        now = time.monotonic()
+        period = item.get_expiry() * self.fraction
+        lease = self._leases.get(key)
+        if lease is None:
+            if len(self._leases) >= self._sweep_at:
+                self._sweep(now)
+            lease = self._leases[key] = _Lease()
+        if now >= lease.period_end:
+            # only the period just ended predicts the next one
+            lease.last_hits = lease.hits if now < lease.period_end + period else 0
+            lease.hits = 0
+            lease.period_end = now + period
+        expected = max(lease.hits, lease.last_hits)
+        lease.hits += cost
+
+        if lease.expires > now and lease.tokens >= cost:
+            lease.tokens -= cost
+            return True
+
+        self.remote_hits += 1
+        size = min(int(item.amount * self.fraction), expected)
+        if size > cost and self.inner.hit(item, *identifiers, cost=size):
+            lease.expires, lease.tokens = now + period, size - cost
+            return True
+        # no traffic to justify a lease, or too close to the limit for one: spend exactly what is asked
+        lease.tokens = 0
+        return self.inner.hit(item, *identifiers, cost=cost)
+
+    def _sweep(self, now: float):
+        # amortised O(1) per key: the table has to double again before the next sweep
+        self._leases = {k: lease for k, lease in self._leases.items() if max(lease.expires, lease.period_end) > now}
+        self._sweep_at = max(2 * len(self._leases), LEASE_SWEEP_MIN)
+
+    def test(self, item: RateLimitItem, *identifiers: str, cost: int = 1) -> bool:
+        lease = self._leases.get(item.key_for(*identifiers))
+        if lease is not None and lease.expires > time.monotonic() and lease.tokens >= cost:
+            return True
+        return self.inner.test(item, *identifiers, cost=cost)
+
+    def get_window_stats(self, item: RateLimitItem, *identifiers: str):
+        return self.inner.get_window_stats(item, *identifiers)
+
+    def clear(self, item: RateLimitItem, *identifiers: str) -> None:
+        self._leases.pop(item.key_for(*identifiers), None)
+        self.inner.clear(item, *identifiers)
+
+    def reset(self):
+        self._leases.clear()
+        self._sweep_at = LEASE_SWEEP_MIN
+
+
+class AppLimiter(Limiter):
+    """slowapi Limiter that leases tokens locally when its storage is remote"""
+
+    def __init__(self, *args, lease_fraction: float = 0.0, **kwargs):
+        super().__init__(*args, **kwargs)
+        # an in-process storage is as cheap as a lease
+        if lease_fraction > 0 and not self._storage_uri.startswith("memory://"):
+            self._limiter = LeasedRateLimiter(self._limiter, lease_fraction)
+
+    def _check_request_limit(self, request, endpoint_func, in_middleware: bool = True) -> None:
+        with timed("rate_limit"):
+            super()._check_request_limit(request, endpoint_func, in_middleware)
+
+    def reset(self) -> None:
+        super().reset()
+        if isinstance(self._limiter, LeasedRateLimiter):
+            self._limiter.reset()
+
 
-limiter = Limiter(key_func=get_remote_address)
+# "endpoint" keys each route separately instead of every distinct URL path
+limiter = AppLimiter(
+    key_func=user_or_ip,
+    storage_uri=RATE_LIMIT_STORAGE_URI,
+    strategy=RATE_LIMIT_STRATEGY,
+    key_style="endpoint",
+    lease_fraction=RATE_LIMIT_LEASE_FRACTION,
+)
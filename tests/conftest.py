@@ -1,3 +1,5 @@
+import uuid
+
 import pytest_asyncio
 import pytest
 from httpx import AsyncClient
@@ -7,12 +9,16 @@ from sqlalchemy.orm import sessionmaker
 
 from src.main import app
 from src.database import Base, get_async_session
+from src.cache import cache
+from src.jobs import job_manager
+from src.utils.limiter import limiter
 
 # in-memory sqlite for tests
 TEST_DATABASE_URL = "sqlite+aiosqlite:///:memory:"
 
 engine_test = create_async_engine(TEST_DATABASE_URL, echo=False, future=True)
 AsyncSessionLocal = sessionmaker(engine_test, expire_on_commit=False, class_=AsyncSession)
+job_manager.session_factory = AsyncSessionLocal
 
 
 # Используем pytest_asyncio.fixture для async fixtures
@@ -31,6 +37,13 @@ async def db_session():
         yield session
 
 
+@pytest_asyncio.fixture(autouse=True)
+async def reset_limiter_and_cache():
+    # every test starts with fresh rate-limit windows and an empty response cache
+    limiter.reset()
+    await cache.backend.clear()
+
+
 @pytest_asyncio.fixture(scope="function")
 async def client(db_session):
     async def override_get_session():
@@ -47,7 +60,7 @@ async def client(db_session):
 
 @pytest_asyncio.fixture
 async def auth_headers(client):
-    user = {"username": "testuser", "password": "password123"}
+    user = {"username": f"testuser-{uuid.uuid4().hex[:8]}", "password": "password123"}
     r = await client.post("/auth/register", json=user)
     assert r.status_code in (200, 201)
     r2 = await client.post("/auth/token", data={"username": user["username"], "password": user["password"]})
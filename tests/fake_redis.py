@@ -0,0 +1,40 @@
+# tests/fake_redis.py
+import time
+
+
+class FakeRedis:
+    """Local stand-in for the subset of redis.asyncio.Redis the app uses"""
+
+    def __init__(self):
+        self.data = {}
+        self.expires = {}
+
+    def _alive(self, key):
+        exp = self.expires.get(key)
+        if exp is not None and exp < time.monotonic():
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        return key in self.data
+
+    async def get(self, key):
+        return self.data[key] if self._alive(key) else None
+
+    async def set(self, key, value, ex=None):
+        self.data[key] = value if isinstance(value, bytes) else str(value).encode()
+        self.expires.pop(key, None)
+        if ex:
+            self.expires[key] = time.monotonic() + ex
+
+    async def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+
+    async def incr(self, key, amount=1):
+        value = int(await self.get(key) or 0) + amount
+        self.data[key] = str(value).encode()
+        return value
+
+    async def flushdb(self):
+        self.data.clear()
+        self.expires.clear()
@@ -11,3 +11,60 @@ async def test_register_and_login(client):
     r2 = await client.post("/auth/token", data={"username": data["username"], "password": data["password"]})
     assert r2.status_code == 200
     assert "access_token" in r2.json()
+
+
+@pytest.mark.asyncio
+async def test_principal_cache_skips_lookups_until_deactivation(client, auth_headers, db_session):
+    from src import auth
+
+    payload = {"title": "Auth Cached", "author": "Auth Author", "genre": "Mystery", "published_year": 2005}
+    book_id = (await client.post("/books/", json=payload, headers=auth_headers)).json()["id"]
+
+    before = auth.principal_cache.stats()
+    update = {"title": "Auth Cached v2", "genre": None, "published_year": None, "author": None}
+    r = await client.put(f"/books/{book_id}", json=update, headers=auth_headers)
+    assert r.status_code == 200
+    assert auth.principal_cache.stats()["hits"] == before["hits"] + 1
+
+    token = auth_headers["Authorization"].split()[1]
+    await auth.deactivate_user(db_session, auth.principal_cache.get(token).username)
+    assert auth.principal_cache.get(token) is None
+
+    r = await client.put(f"/books/{book_id}", json=update, headers=auth_headers)
+    assert r.status_code == 403
+
+
+@pytest.mark.asyncio
+async def test_login_rehashes_outdated_cost(client, db_session, monkeypatch):
+    from passlib.context import CryptContext
+    from sqlalchemy import select
+    from src import auth, models
+
+    data = {"username": "rehashuser", "password": "verysecure"}
+    monkeypatch.setattr(auth, "pwd_context", CryptContext(schemes=["bcrypt"], bcrypt__rounds=4))
+    assert (await client.post("/auth/register", json=data)).status_code == 200
+
+    monkeypatch.setattr(auth, "pwd_context", CryptContext(schemes=["bcrypt"], bcrypt__rounds=5))
+    r = await client.post("/auth/token", data=data)
+    assert r.status_code == 200
+    user = (await db_session.execute(select(models.User).where(models.User.username == "rehashuser"))).scalar_one()
+    assert user.hashed_password.startswith("$2b$05$")
+
+
+@pytest.mark.asyncio
+async def test_saturated_hash_pool_returns_503(client, monkeypatch):
+    from src import auth
+
+    data = {"username": "busyuser", "password": "verysecure"}
+    assert (await client.post("/auth/register", json=data)).status_code == 200
+    monkeypatch.setattr(auth.hash_pool, "pending", auth.hash_pool.queue_limit)
+    r = await client.post("/auth/token", data=data)
+    assert r.status_code == 503
+    assert r.headers["retry-after"] == "1"
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("path", ["/auth/cache/stats", "/books/cache/stats"])
+async def test_cache_stats_require_auth(client, auth_headers, path):
+    assert (await client.get(path)).status_code == 401
+    assert (await client.get(path, headers=auth_headers)).status_code == 200
@@ -0,0 +1,45 @@
+# tests/test_authors.py
+import pytest
+from sqlalchemy import func, select
+
+from src import models
+from src.authors import author_cache, resolve_author_ids
+
+
+@pytest.mark.asyncio
+async def test_resolve_author_ids_caches_after_commit(db_session):
+    names = ["Resolver Ann", "Resolver Bob"]
+    ids = await resolve_author_ids(db_session, names)
+    assert set(ids) == set(names)
+    # not cached before the insert commits; a rollback forgets them
+    assert author_cache.get("Resolver Ann") is None
+    await db_session.rollback()
+    assert author_cache.get("Resolver Ann") is None
+
+    ids = await resolve_author_ids(db_session, names)
+    await db_session.commit()
+    assert author_cache.get("Resolver Ann") == ids["Resolver Ann"]
+
+    # existing and cached names resolve to the same rows, and no duplicates appear
+    again = await resolve_author_ids(db_session, names + ["Resolver Cid"])
+    await db_session.commit()
+    assert {n: again[n] for n in names} == ids
+    count = await db_session.scalar(select(func.count()).select_from(models.Author)
+                                    .where(models.Author.name.like("Resolver %")))
+    assert count == 3
+
+
+@pytest.mark.asyncio
+async def test_author_cache_shared_by_write_paths(client, auth_headers):
+    author_cache.clear()
+    payload = {"title": "Cached One", "author": "Cached Author", "genre": "History", "published_year": 1990}
+    first = (await client.post("/books/", json=payload, headers=auth_headers)).json()
+    hits = author_cache.stats()["hits"]
+    second = (await client.post("/books/", json={**payload, "title": "Cached Two"}, headers=auth_headers)).json()
+    assert second["author"] == first["author"]
+    assert author_cache.stats()["hits"] == hits + 1
+
+    r = await client.put(f"/books/{first['id']}", json={"title": None, "genre": None, "published_year": None,
+                                                         "author": "Cached Author"}, headers=auth_headers)
+    assert r.json()["author"] == first["author"]
+    assert author_cache.stats()["hits"] == hits + 2
@@ -0,0 +1,105 @@
+# tests/test_batch.py
+import logging
+
+import pytest
+
+from src.facets import rebuild_facets
+from src.routes import books as books_routes
+
+
+@pytest.mark.asyncio
+async def test_batch_create_update_delete(client, auth_headers, db_session):
+    items = [
+        {"title": "Batch One", "author": "Batch Ann", "genre": "History", "published_year": 1991},
+        {"title": "Batch Two", "author": "Batch Ann", "genre": "Nonsense", "published_year": 1992},
+        {"title": "", "author": "Batch Bob", "genre": "Science"},
+        {"title": "Batch Three", "author": "Batch Bob", "genre": "Science", "published_year": 2004},
+    ]
+    r = await client.post("/books/batch", json=items, headers=auth_headers)
+    assert r.status_code == 200
+    body = r.json()
+    assert (body["succeeded"], body["failed"]) == (2, 2)
+    assert [res["status"] for res in body["results"]] == [201, 422, 422, 201]
+    one, three = body["results"][0]["id"], body["results"][3]["id"]
+    assert (await client.get(f"/books/{three}")).json()["author"]["name"] == "Batch Bob"
+
+    changes = [
+        {"id": one, "genre": "Science", "author": "Batch Bob"},
+        {"id": 999999, "title": "Missing"},
+        {"id": three, "published_year": 1800},
+    ]
+    r = await client.patch("/books/batch", json=changes, headers=auth_headers)
+    assert [res["status"] for res in r.json()["results"]] == [200, 404, 200]
+    book = (await client.get(f"/books/{one}")).json()
+    assert (book["genre"], book["author"]["name"], book["title"]) == ("Science", "Batch Bob", "Batch One")
+
+    facets = (await client.get("/books/facets", params={"author": "Batch"})).json()
+    assert facets["total"] == 2
+    assert {b["value"]: b["count"] for b in facets["decade"]} == {1800: 1, 1990: 1}
+
+    r = await client.request("DELETE", "/books/batch", json={"ids": [three, 999999]}, headers=auth_headers)
+    assert [res["status"] for res in r.json()["results"]] == [204, 404]
+    assert (await client.get(f"/books/{three}")).status_code == 404
+
+    before = (await client.get("/books/facets", params={"author": "Batch"})).json()
+    assert before["total"] == 1
+    await rebuild_facets(db_session)
+    assert (await client.get("/books/facets", params={"author": "Batch", "limit": 21})).json() == before
+
+
+@pytest.mark.asyncio
+async def test_batch_limits(client, auth_headers):
+    r = await client.post("/books/batch", json=[{"title": "x"}], headers={})
+    assert r.status_code == 401
+    r = await client.post("/books/batch", json=[{}] * 1001, headers=auth_headers)
+    assert r.status_code == 413
+
+
+@pytest.mark.asyncio
+async def test_batch_update_refreshes_recommendations(client, auth_headers):
+    books = [
+        {"title": "Rec Source", "author": "Rec Ann", "genre": "Fantasy", "published_year": 1950},
+        {"title": "Rec Fantasy", "author": "Rec Bob", "genre": "Fantasy", "published_year": 1951},
+        {"title": "Rec Mystery", "author": "Rec Cid", "genre": "Mystery", "published_year": 1952},
+    ]
+    source, fantasy, mystery = [(await client.post("/books/", json=b, headers=auth_headers)).json()["id"]
+                                for b in books]
+
+    async def recommended():
+        r = await client.get(f"/books/{source}/recommend", params={"limit": 20})
+        return {b["id"] for b in r.json()}
+
+    assert fantasy in await recommended() and mystery not in await recommended()
+    r = await client.patch("/books/batch", json=[{"id": source, "genre": "Mystery"}], headers=auth_headers)
+    assert r.json()["succeeded"] == 1
+    assert mystery in await recommended() and fantasy not in await recommended()
+
+
+@pytest.mark.asyncio
+async def test_batch_rejects_duplicate_ids(client, auth_headers):
+    payload = {"title": "Dup", "author": "Dup Author", "genre": "History", "published_year": 1990}
+    book_id = (await client.post("/books/", json=payload, headers=auth_headers)).json()["id"]
+
+    r = await client.patch("/books/batch", json=[{"id": book_id, "title": "Dup 1"}, {"id": book_id, "title": "Dup 2"}],
+                           headers=auth_headers)
+    assert [(res["status"], res.get("error")) for res in r.json()["results"]] == [
+        (200, None), (422, "duplicate id in batch")]
+    assert (await client.get(f"/books/{book_id}")).json()["title"] == "Dup 1"
+
+    r = await client.request("DELETE", "/books/batch", json={"ids": [book_id, book_id]}, headers=auth_headers)
+    body = r.json()
+    assert [res["status"] for res in body["results"]] == [204, 422]
+    assert (body["succeeded"], body["failed"]) == (1, 1)
+
+
+@pytest.mark.asyncio
+async def test_failed_batch_is_logged(client, auth_headers, monkeypatch, caplog):
+    async def broken(db, items):
+        raise RuntimeError("bug in the write path")
+
+    monkeypatch.setattr(books_routes, "batch_create_books", broken)
+    items = [{"title": "Lost", "author": "Batch Ann", "genre": "History", "published_year": 1991}]
+    with caplog.at_level(logging.ERROR, logger="src.routes.books"):
+        r = await client.post("/books/batch", json=items, headers=auth_headers)
+    assert [(e["status"], e["error"]) for e in r.json()["results"]] == [(500, "batch failed: RuntimeError")]
+    assert "batch of 1 items failed" in caplog.text and "bug in the write path" in caplog.text
@@ -1,6 +1,9 @@
 # tests/test_books.py
 import pytest
 
+from src.routes import books as books_routes
+from src.schemas import CURRENT_YEAR
+
 
 @pytest.mark.asyncio
 async def test_create_book(client, auth_headers):
@@ -31,3 +34,178 @@ async def test_recommend_books(client, auth_headers):
     r = await client.get(f"/books/{book_id}/recommend")
     assert r.status_code == 200
     assert isinstance(r.json(), list)
+
+
+@pytest.mark.asyncio
+async def test_import_books_reports_rejected_rows(client, auth_headers):
+    csv_data = (
+        "title,author,genre,published_year\n"
+        "Imported One,Import Author,Fiction,2001\n"
+        "Imported Two,Import Author,History,1999\n"
+        ",Nobody,Fiction,2001\n"
+        "Bad Genre,Import Author,Cooking,2001\n"
+        "Bad Year,Import Author,Fiction,1700\n"
+    )
+    files = {"file": ("books.csv", csv_data, "text/csv")}
+    r = await client.post("/books/import", files=files, headers=auth_headers)
+    assert r.status_code == 200
+    body = r.json()
+    assert body["imported"] == 2
+    assert [(e["row"], e["reason"]) for e in body["rejected"]] == [
+        (2, "title is required"),
+        (3, "unknown genre"),
+        (4, f"published_year must be between 1800 and {CURRENT_YEAR}"),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_import_books_ndjson(client, auth_headers):
+    ndjson = (
+        '{"title": "Stream One", "author": "Stream Author", "genre": "Science", "published_year": 2010}\n'
+        '{"title": "Stream Two", "author": "Stream Author", "genre": "Mystery", "published_year": 2011}\n'
+    )
+    files = {"file": ("books.ndjson", ndjson, "application/x-ndjson")}
+    r = await client.post("/books/import", files=files, headers=auth_headers)
+    assert r.status_code == 200
+    assert r.json() == {"imported": 2, "rejected": []}
+
+
+@pytest.mark.asyncio
+async def test_import_books_raw_body_is_streamed(client, auth_headers, monkeypatch):
+    monkeypatch.setattr(books_routes, "IMPORT_BATCH_SIZE", 3)
+    rows = [f"Raw Book {i},Raw Author,Fiction,{1990 + i}\n" for i in range(10)] + ["Raw Bad,Raw Author,Cooking,2000\n"]
+
+    async def body():
+        # one ASGI message per row, as a slow client would send them
+        yield b"title,author,genre,published_year\n"
+        for row in rows:
+            yield row.encode()
+
+    headers = {**auth_headers, "Content-Type": "text/csv; charset=utf-8"}
+    r = await client.post("/books/import", content=body(), headers=headers)
+    assert r.status_code == 200
+    assert r.json()["imported"] == 10
+    assert [(e["row"], e["reason"]) for e in r.json()["rejected"]] == [(10, "unknown genre")]
+
+    ndjson = '{"title": "Raw Json", "author": "Raw Author", "genre": "Science", "published_year": 2010}\n'
+    headers = {**auth_headers, "Content-Type": "application/x-ndjson"}
+    r = await client.post("/books/import", content=ndjson, headers=headers)
+    assert r.json() == {"imported": 1, "rejected": []}
+
+    r = await client.post("/books/import", headers=auth_headers, files={"other": ("x.csv", "", "text/csv")})
+    assert r.status_code == 422
+
+
+@pytest.mark.asyncio
+async def test_export_books_streams_filtered_csv(client, auth_headers):
+    for year in (1990, 2015):
+        payload = {"title": f"Export {year}", "author": "Export Author", "genre": "History", "published_year": year}
+        assert (await client.post("/books/", json=payload, headers=auth_headers)).status_code == 200
+
+    params = {"author": "Export Author", "year_from": 2000}
+    for gzip in (False, True):
+        r = await client.get("/books/export", params={**params, "gzip": gzip})
+        assert r.status_code == 200
+        assert r.headers.get("content-encoding") == ("gzip" if gzip else None)
+        lines = r.text.strip().splitlines()
+        assert lines[0] == "id,title,genre,published_year,author"
+        assert [line.split(",")[1] for line in lines[1:]] == ["Export 2015"]
+
+
+@pytest.mark.asyncio
+async def test_export_formats_with_field_projection(client, auth_headers):
+    payload = {"title": "Columnar", "author": "Arrow Author", "genre": "Science", "published_year": 2019}
+    assert (await client.post("/books/", json=payload, headers=auth_headers)).status_code == 200
+    params = {"author": "Arrow Author", "fields": "title,published_year"}
+
+    r = await client.get("/books/export", params={**params, "format": "ndjson"})
+    assert r.status_code == 200
+    assert r.text == '{"title":"Columnar","published_year":2019}\n'
+
+    pa = pytest.importorskip("pyarrow")
+    import pyarrow.parquet as pq
+    r = await client.get("/books/export", params={**params, "format": "parquet"})
+    assert pq.read_table(pa.BufferReader(r.content)).to_pylist() == [{"title": "Columnar", "published_year": 2019}]
+    r = await client.get("/books/export", params={**params, "format": "arrow"})
+    assert pa.ipc.open_stream(r.content).read_all().to_pylist() == [{"title": "Columnar", "published_year": 2019}]
+
+    r = await client.get("/books/export", params={"fields": "title,isbn"})
+    assert r.status_code == 400
+
+
+@pytest.mark.asyncio
+async def test_keyset_pagination_matches_offset(client, auth_headers):
+    for title in ("Kappa", "Alpha", "Alpha"):
+        payload = {"title": title, "author": "Cursor Author", "genre": "Fantasy", "published_year": 2000}
+        assert (await client.post("/books/", json=payload, headers=auth_headers)).status_code == 200
+
+    params = {"author": "Cursor Author", "sort": "title", "limit": 2}
+    expected = (await client.get("/books/", params={**params, "limit": 10})).json()
+
+    pages, cursor = [], None
+    while True:
+        r = await client.get("/books/", params={**params, **({"cursor": cursor} if cursor else {})})
+        assert r.status_code == 200
+        pages.extend(r.json())
+        cursor = r.headers.get("x-next-cursor")
+        if not cursor:
+            break
+    assert [b["id"] for b in pages] == [b["id"] for b in expected]
+    assert [b["title"] for b in pages] == ["Alpha", "Alpha", "Kappa"]
+
+    r = await client.get("/books/", params={"sort": "genre", "cursor": cursor or "bogus"})
+    assert r.status_code == 400
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("sort, value, book_id", [
+    ("id", True, 1),
+    ("id", 1, True),
+    ("title", True, 1),
+    ("title", {"$gt": ""}, 1),
+    ("title", None, 1),
+    ("published_year", "2000", 1),
+    ("published_year", [2000], 1),
+    ("published_year", 2 ** 70, 1),
+    ("genre", 3.5, 1),
+    ("genre", "Fantasy", "1"),
+])
+async def test_tampered_cursor_is_rejected(client, sort, value, book_id):
+    from src.crud import encode_cursor
+    r = await client.get("/books/", params={"sort": sort, "cursor": encode_cursor(sort, value, book_id)})
+    assert r.status_code == 400 and r.json()["detail"] == "Malformed cursor"
+
+
+@pytest.mark.asyncio
+async def test_crud_list_books_keyset(db_session):
+    from src import crud
+
+    everything = await crud.list_books(db_session, limit=1000, sort="b.published_year")
+    page = await crud.list_books(db_session, limit=3, sort="b.published_year")
+    rest = await crud.list_books(db_session, limit=1000, sort="b.published_year",
+                                 after=(page[-1]["published_year"], page[-1]["id"]))
+    assert [b["id"] for b in page + rest] == [b["id"] for b in everything]
+
+
+@pytest.mark.asyncio
+async def test_search_ranks_title_matches(client, auth_headers):
+    books = [
+        ("The Silmarillion", "Searchable Tolkien"),
+        ("Unfinished Tales", "Searchable Tolkien"),
+        ("Silmarils of the North", "Someone Else"),
+    ]
+    for title, author in books:
+        payload = {"title": title, "author": author, "genre": "Fantasy", "published_year": 1977}
+        assert (await client.post("/books/", json=payload, headers=auth_headers)).status_code == 200
+
+    r = await client.get("/books/search", params={"q": "silmar"})
+    assert r.status_code == 200
+    assert {b["title"] for b in r.json()} == {"The Silmarillion", "Silmarils of the North"}
+
+    # terms may match across title and author
+    r = await client.get("/books/search", params={"q": "searchable unfinished"})
+    assert [b["title"] for b in r.json()] == ["Unfinished Tales"]
+
+    r = await client.get("/books/search", params={"q": "tolkien"})
+    assert {b["title"] for b in r.json()} == {"The Silmarillion", "Unfinished Tales"}
+    assert all(b["score"] > 0 for b in r.json())
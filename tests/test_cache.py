@@ -0,0 +1,171 @@
+# tests/test_cache.py
+import pytest
+
+from src import cache as cache_module, models
+from src.cache import MemoryBackend, RedisBackend, ResponseCache
+from src.facets import adjust_facets, book_facet_key
+from src.recommendations import forget_book
+from src.routes import books as books_routes
+from tests.conftest import AsyncSessionLocal
+from tests.fake_redis import FakeRedis
+
+
+@pytest.mark.asyncio
+async def test_memory_backend_lru_and_ttl(monkeypatch):
+    backend = MemoryBackend(max_entries=2)
+    await backend.set("a", b"1")
+    await backend.set("b", b"2")
+    await backend.get("a")
+    await backend.set("c", b"3")
+    assert await backend.get("b") is None and backend.evictions == 1
+    assert await backend.get("a") == b"1"
+
+    now = cache_module.time.monotonic()
+    await backend.set("ttl", b"x", ex=10)
+    monkeypatch.setattr(cache_module.time, "monotonic", lambda: now + 11)
+    assert await backend.get("ttl") is None
+
+
+@pytest.mark.asyncio
+async def test_reads_are_cached_and_invalidated_by_writes(client, auth_headers, monkeypatch):
+    monkeypatch.setattr(cache_module.cache, "backend", RedisBackend(FakeRedis()))
+    cache = cache_module.cache
+    payload = {"title": "Cached", "author": "Cache Author", "genre": "Mystery", "published_year": 2005}
+    book_id = (await client.post("/books/", json=payload, headers=auth_headers)).json()["id"]
+
+    before = cache.stats()
+    first = await client.get(f"/books/{book_id}")
+    second = await client.get(f"/books/{book_id}")
+    assert first.json() == second.json()
+    listed = await client.get("/books/", params={"author": "Cache Author"})
+    assert (await client.get("/books/", params={"author": "Cache Author"})).json() == listed.json()
+    stats = (await client.get("/books/cache/stats", headers=auth_headers)).json()
+    assert stats["hits"] - before["hits"] == 2
+    assert stats["misses"] - before["misses"] == 2
+
+    r = await client.put(f"/books/{book_id}", json={"title": "Cached v2", "genre": None, "published_year": None,
+                                                     "author": None}, headers=auth_headers)
+    assert r.status_code == 200
+    assert (await client.get(f"/books/{book_id}")).json()["title"] == "Cached v2"
+    assert [b["title"] for b in (await client.get("/books/", params={"author": "Cache Author"})).json()] == ["Cached v2"]
+
+
+@pytest.mark.asyncio
+async def test_disabled_cache_stores_nothing():
+    backend = MemoryBackend()
+    disabled = ResponseCache(backend, enabled=False)
+    await disabled.respond("k", {"a": 1})
+    assert await disabled.get("k") is None and await backend.get("k") is None
+
+
+@pytest.mark.asyncio
+async def test_conditional_get_returns_304_until_the_book_changes(client, auth_headers):
+    payload = {"title": "Tagged", "author": "ETag Author", "genre": "Mystery", "published_year": 2005}
+    book_id = (await client.post("/books/", json=payload, headers=auth_headers)).json()["id"]
+
+    # once from the database, once from the cache
+    for _ in range(2):
+        r = await client.get(f"/books/{book_id}")
+        etag, last_modified = r.headers["etag"], r.headers["last-modified"]
+        assert (await client.get(f"/books/{book_id}", headers={"If-None-Match": etag})).status_code == 304
+    r = await client.get(f"/books/{book_id}", headers={"If-Modified-Since": last_modified})
+    assert r.status_code == 304
+    assert r.headers["etag"] == etag and not r.content
+
+    listed = await client.get("/books/", params={"author": "ETag Author"})
+    list_etag = listed.headers["etag"]
+    assert (await client.get("/books/", params={"author": "ETag Author"},
+                             headers={"If-None-Match": list_etag})).status_code == 304
+    assert (await client.get("/books/", params={"author": "Other"},
+                             headers={"If-None-Match": list_etag})).status_code == 200
+
+    await client.put(f"/books/{book_id}", json={"title": "Tagged v2", "genre": None, "published_year": None,
+                                                 "author": None}, headers=auth_headers)
+    r = await client.get(f"/books/{book_id}", headers={"If-None-Match": etag})
+    assert r.status_code == 200 and r.json()["title"] == "Tagged v2"
+    assert r.headers["etag"] != etag
+    r = await client.get("/books/", params={"author": "ETag Author"}, headers={"If-None-Match": list_etag})
+    assert r.status_code == 200 and r.headers["etag"] != list_etag
+
+
+@pytest.mark.asyncio
+async def test_concurrent_writes_are_last_write_wins(client, auth_headers, monkeypatch):
+    payload = {"title": "Raced", "author": "Race Author", "genre": "Mystery", "published_year": 2005}
+    book_id = (await client.post("/books/", json=payload, headers=auth_headers)).json()["id"]
+    etag = (await client.get(f"/books/{book_id}")).headers["etag"]
+
+    # a writer that loaded the book before a PUT committed still wins, and bumps the version again
+    async with AsyncSessionLocal() as session:
+        book = await session.get(models.Book, book_id)
+        r = await client.put(f"/books/{book_id}", json={"title": "Raced v2", "genre": None, "published_year": None,
+                                                        "author": None}, headers=auth_headers)
+        assert r.status_code == 200
+        book.title = "Raced v3"
+        await session.commit()
+        await session.refresh(book)
+        assert book.version == 3
+
+    r = await client.get(f"/books/{book_id}")
+    assert r.json()["title"] == "Raced v3" and r.headers["etag"] != etag
+
+    # a DELETE committing between the PUT's read and its write makes the PUT a 404, not a 500
+    resolve_author = books_routes.resolve_author
+
+    async def delete_meanwhile(db, name):
+        # what DELETE /books/{id} does, from another session
+        async with AsyncSessionLocal() as other:
+            book = await other.get(models.Book, book_id)
+            await forget_book(other, book_id)
+            await adjust_facets(other, {book_facet_key(book): -1})
+            await other.delete(book)
+            await other.commit()
+        return await resolve_author(db, name)
+
+    monkeypatch.setattr(books_routes, "resolve_author", delete_meanwhile)
+    r = await client.put(f"/books/{book_id}", json={"title": None, "genre": None, "published_year": None,
+                                                    "author": "Late Author"}, headers=auth_headers)
+    assert r.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_fill_racing_a_write_is_never_served(monkeypatch):
+    cache = ResponseCache(MemoryBackend())
+    # a GET computes its key, then a write commits before the GET stores its (old) rows
+    key = await cache.query_key("list", skip=0)
+    await cache.invalidate_catalogue()
+    await cache.respond_encoded(key, b'[{"title":"old"}]')
+    assert await cache.get(await cache.query_key("list", skip=0)) is None
+
+
+@pytest.mark.asyncio
+async def test_memory_generation_survives_lru_eviction():
+    backend = MemoryBackend(max_entries=2)
+    cache = ResponseCache(backend)
+    await cache.invalidate_catalogue()
+    stale_key = await cache.query_key("list", skip=0)
+    await cache.invalidate_catalogue()
+    for i in range(5):
+        await backend.set(f"filler-{i}", b"x")
+    assert await cache.generation() == 2
+    assert stale_key != await cache.query_key("list", skip=0)
+
+
+@pytest.mark.asyncio
+async def test_writes_to_other_books_keep_a_book_cached(client, auth_headers):
+    cache = cache_module.cache
+    payload = {"title": "Kept", "author": "Keep Author", "genre": "Mystery", "published_year": 2005}
+    book_id = (await client.post("/books/", json=payload, headers=auth_headers)).json()["id"]
+    await client.get(f"/books/{book_id}")
+
+    other = {**payload, "title": "Other Book"}
+    other_id = (await client.post("/books/", json=other, headers=auth_headers)).json()["id"]
+    await client.delete(f"/books/{other_id}", headers=auth_headers)
+    hits = cache.hits
+    assert (await client.get(f"/books/{book_id}")).json()["title"] == "Kept"
+    assert cache.hits == hits + 1
+
+    # ... while a write to the book itself retires its entry
+    await client.put(f"/books/{book_id}", json={"title": "Kept v2", "genre": None, "published_year": None,
+                                                 "author": None}, headers=auth_headers)
+    assert (await client.get(f"/books/{book_id}")).json()["title"] == "Kept v2"
+    assert cache.hits == hits + 1
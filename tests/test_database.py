@@ -0,0 +1,45 @@
+# tests/test_database.py
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+
+from src.database import InstrumentedQueuePool, create_engine, engine_options, pool_stats, prewarm_pool
+
+PG_URL = "postgresql+asyncpg://u:p@localhost:5432/d"
+
+
+def test_engine_options_for_pgbouncer():
+    direct = engine_options(PG_URL, pgbouncer=False)
+    assert direct["poolclass"] is InstrumentedQueuePool
+    assert "statement_timeout" in direct["connect_args"]["server_settings"]
+
+    bounced = engine_options(PG_URL, pgbouncer=True)["connect_args"]
+    assert bounced["statement_cache_size"] == 0 and bounced["prepared_statement_cache_size"] == 0
+    assert "server_settings" not in bounced
+    assert bounced["prepared_statement_name_func"]() != bounced["prepared_statement_name_func"]()
+
+
+@pytest.mark.asyncio
+async def test_pool_stats_count_in_use_and_timeouts(tmp_path):
+    engine = create_engine(f"sqlite+aiosqlite:///{tmp_path}/pool.db", poolclass=InstrumentedQueuePool,
+                           pool_size=1, max_overflow=0, pool_timeout=0.05)
+    async with engine.connect() as conn:
+        await conn.execute(text("SELECT 1"))
+        assert pool_stats(engine)["in_use"] == 1
+        with pytest.raises(PoolTimeoutError):
+            async with engine.connect():
+                pass
+    stats = pool_stats(engine)
+    assert stats["in_use"] == 0 and stats["idle"] == 1
+    assert stats["timeouts"] == 1 and stats["waiting"] == 0
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_prewarm_pool_leaves_connections_idle(tmp_path):
+    engine = create_engine(f"sqlite+aiosqlite:///{tmp_path}/prewarm.db", poolclass=InstrumentedQueuePool,
+                           pool_size=3, max_overflow=5)
+    assert await prewarm_pool(engine, 10) == 3
+    stats = pool_stats(engine)
+    assert stats["idle"] == 3 and stats["in_use"] == 0 and stats["overflow"] == 0
+    await engine.dispose()
@@ -0,0 +1,15 @@
+# tests/test_encoding.py
+import json
+
+from src import schemas
+from src.utils.encoding import RowSchema
+
+
+def test_row_schema_matches_response_model():
+    row = (7, "Ünïcode \"Title\"\n", "History", 1999, 3, "Ann", 0.5, "ignored extra column")
+    assert schemas.BOOK_READ_ROW.width == 6
+    expected = schemas.BookRead.model_validate(
+        {"id": 7, "title": row[1], "genre": "History", "published_year": 1999, "author": {"id": 3, "name": "Ann"}}
+    ).model_dump()
+    assert json.loads(schemas.BOOK_READ_ROW.encode(row)) == expected
+    assert json.loads(RowSchema(schemas.BookRecommendation).encode_many([row])) == [{**expected, "score": 0.5}]
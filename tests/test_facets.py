@@ -0,0 +1,56 @@
+# tests/test_facets.py
+import pytest
+from sqlalchemy import select
+
+from src import models
+from src.facets import rebuild_facets, scan_facets
+
+
+async def _scanned(db_session, genre=None, author=None, year_from=None, year_to=None):
+    q = select(models.Book.genre, models.Book.published_year, models.Book.author_id)
+    if author:
+        q = q.join(models.Book.author).where(models.Author.name.ilike(f"%{author}%"))
+    if genre:
+        q = q.where(models.Book.genre == genre)
+    if year_from:
+        q = q.where(models.Book.published_year >= year_from)
+    if year_to:
+        q = q.where(models.Book.published_year <= year_to)
+    return await scan_facets(db_session, q)
+
+
+@pytest.mark.asyncio
+async def test_facet_counters_follow_writes(client, auth_headers, db_session):
+    created = []
+    for title, author, genre, year in [("Facet One", "Facet Ann", "History", 1991),
+                                       ("Facet Two", "Facet Ann", "History", 1999),
+                                       ("Facet Three", "Facet Bob", "Science", 2004)]:
+        payload = {"title": title, "author": author, "genre": genre, "published_year": year}
+        created.append((await client.post("/books/", json=payload, headers=auth_headers)).json()["id"])
+    csv_data = "title,author,genre,published_year\nFacet Four,Facet Bob,History,1995\n"
+    await client.post("/books/import", files={"file": ("b.csv", csv_data, "text/csv")}, headers=auth_headers)
+    await client.put(f"/books/{created[1]}", json={"title": None, "genre": "Science", "published_year": 2001,
+                                                    "author": "Facet Bob"}, headers=auth_headers)
+    await client.delete(f"/books/{created[0]}", headers=auth_headers)
+
+    r = await client.get("/books/facets", params={"author": "Facet"})
+    assert r.status_code == 200
+    body = r.json()
+    assert body["total"] == 3
+    assert {b["value"]: b["count"] for b in body["genre"]} == {"History": 1, "Science": 2}
+    assert {b["value"]: b["count"] for b in body["decade"]} == {1990: 1, 2000: 2}
+    assert [(b["label"], b["count"]) for b in body["author"]] == [("Facet Bob", 3)]
+
+    # every filter mix the counters answer agrees with counting the books
+    for filters in [{}, {"genre": "Science"}, {"author": "Facet", "year_from": 2000},
+                    {"genre": "History", "year_to": 1999}, {"author": "Bob", "genre": "Science", "year_to": 2009}]:
+        counted = (await client.get("/books/facets", params=filters)).json()
+        assert counted == await _scanned(db_session, **filters)
+
+    # a title filter or a partial decade is counted over the books instead
+    r = await client.get("/books/facets", params={"title": "Three", "year_from": 2003})
+    assert r.json()["total"] == 1
+
+    before = (await client.get("/books/facets", params={"limit": 50})).json()
+    await rebuild_facets(db_session)
+    assert (await client.get("/books/facets", params={"limit": 51})).json() == before
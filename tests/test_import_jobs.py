@@ -0,0 +1,152 @@
+# tests/test_import_jobs.py
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import select
+
+from src import jobs, models
+from src.jobs import job_manager
+
+CSV_DATA = (
+    "title,author,genre,published_year\n"
+    "Job Book 1,Job Author,Fiction,2001\n"
+    "Job Book 2,Job Author,Fiction,2002\n"
+    "Job Book 3,Job Author,History,2003\n"
+    "Job Book 4,Job Author,Fantasy,1500\n"
+)
+
+
+@pytest_asyncio.fixture(autouse=True)
+async def job_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(jobs, "IMPORT_JOB_DIR", str(tmp_path))
+    yield tmp_path
+    await job_manager.stop()
+
+
+@pytest.mark.asyncio
+async def test_background_import_job(client, auth_headers):
+    files = {"file": ("books.csv", CSV_DATA, "text/csv")}
+    r = await client.post("/books/import?background=true", files=files, headers=auth_headers)
+    assert r.status_code == 202
+    job_id = r.json()["id"]
+    assert r.json()["rows_total"] == 4
+
+    await job_manager._queue.join()
+    r = await client.get(f"/books/import/{job_id}", headers=auth_headers)
+    assert r.status_code == 200
+    body = r.json()
+    assert body["status"] == "completed"
+    assert (body["rows_processed"], body["rows_imported"], body["rows_rejected"]) == (4, 3, 1)
+    assert body["rejected"][0]["row"] == 3
+
+
+@pytest.mark.asyncio
+async def test_interrupted_job_resumes_after_last_batch(db_session, job_dir):
+    path = job_dir / "resume.csv"
+    path.write_text(CSV_DATA.replace("Job Book", "Resumed Book"))
+    # a previous process committed the first batch of two rows, then died
+    db_session.add(models.ImportJob(id="resume-job", filename="resume.csv", path=str(path), format="csv",
+                                    rows_total=4, rows_processed=2, rows_imported=2))
+    await db_session.commit()
+
+    job_manager.batch_size = 2
+    try:
+        await job_manager.start()
+        await job_manager._queue.join()
+    finally:
+        job_manager.batch_size = jobs.IMPORT_BATCH_SIZE
+
+    job = await db_session.get(models.ImportJob, "resume-job", populate_existing=True)
+    assert (job.status, job.rows_processed, job.rows_imported, job.rows_rejected) == ("completed", 4, 3, 1)
+    res = await db_session.execute(select(models.Book.title).where(models.Book.title.like("Resumed Book%")))
+    assert res.scalars().all() == ["Resumed Book 3"]
+    assert not path.exists()
+
+
+@pytest.mark.asyncio
+async def test_stopped_job_is_requeued_and_completes_on_next_start(db_session, job_dir, monkeypatch):
+    path = job_dir / "stopped.csv"
+    path.write_text(CSV_DATA.replace("Job Book", "Stopped Book"))
+    db_session.add(models.ImportJob(id="stopped-job", filename="stopped.csv", path=str(path), format="csv",
+                                    rows_total=4))
+    await db_session.commit()
+
+    # the second batch hangs until the process is stopped
+    import_frame = jobs.import_frame
+    second_batch = asyncio.Event()
+
+    async def hanging_import_frame(session, df, commit=True):
+        if df.index[0] >= 2:
+            second_batch.set()
+            await asyncio.Event().wait()
+        return await import_frame(session, df, commit=commit)
+
+    monkeypatch.setattr(jobs, "import_frame", hanging_import_frame)
+    monkeypatch.setattr(job_manager, "batch_size", 2)
+    await job_manager.start()
+    await asyncio.wait_for(second_batch.wait(), 5)
+    job = await db_session.get(models.ImportJob, "stopped-job", populate_existing=True)
+    assert job.status == "running"
+    await job_manager.stop()
+
+    job = await db_session.get(models.ImportJob, "stopped-job", populate_existing=True)
+    assert (job.status, job.rows_processed) == ("queued", 2)
+
+    monkeypatch.setattr(jobs, "import_frame", import_frame)
+    await job_manager.start()
+    await job_manager._queue.join()
+    job = await db_session.get(models.ImportJob, "stopped-job", populate_existing=True)
+    assert (job.status, job.rows_processed, job.rows_imported, job.rows_rejected) == ("completed", 4, 3, 1)
+    res = await db_session.execute(select(models.Book.title).where(models.Book.title.like("Stopped Book%")))
+    assert sorted(res.scalars().all()) == ["Stopped Book 1", "Stopped Book 2", "Stopped Book 3"]
+
+
+@pytest.mark.asyncio
+async def test_failed_job_removes_its_upload(db_session, job_dir, monkeypatch):
+    path = job_dir / "failed.csv"
+    path.write_text(CSV_DATA.replace("Job Book", "Failed Book"))
+    db_session.add(models.ImportJob(id="failed-job", filename="failed.csv", path=str(path), format="csv",
+                                    rows_total=4))
+    await db_session.commit()
+
+    async def failing_import_frame(session, df, commit=True):
+        raise ValueError("bad batch")
+
+    monkeypatch.setattr(jobs, "import_frame", failing_import_frame)
+    await job_manager.start()
+    await job_manager._queue.join()
+    job = await db_session.get(models.ImportJob, "failed-job", populate_existing=True)
+    assert (job.status, job.error) == ("failed", "ValueError: bad batch")
+    assert not path.exists()
+
+
+@pytest.mark.asyncio
+async def test_sweep_requeues_jobs_of_a_dead_process(db_session, job_dir):
+    await job_manager.start()
+    path = job_dir / "orphan.csv"
+    path.write_text(CSV_DATA.replace("Job Book", "Orphan Book"))
+    # left "running" by a worker that was killed, heartbeat long gone
+    old = datetime.utcnow() - timedelta(seconds=jobs.IMPORT_JOB_STALE_SECONDS + 1)
+    db_session.add(models.ImportJob(id="orphan-job", filename="orphan.csv", path=str(path), format="csv",
+                                    status="running", started_at=old, updated_at=old))
+    await db_session.commit()
+
+    assert await job_manager.requeue_stale() == 1
+    await job_manager._queue.join()
+    job = await db_session.get(models.ImportJob, "orphan-job", populate_existing=True)
+    assert (job.status, job.rows_imported) == ("completed", 3)
+
+
+@pytest.mark.asyncio
+async def test_background_import_of_raw_body(client, auth_headers):
+    headers = {**auth_headers, "Content-Type": "text/csv"}
+    r = await client.post("/books/import?background=true", content=CSV_DATA.replace("Job Book", "Raw Job"),
+                          headers=headers)
+    assert r.status_code == 202
+    assert r.json()["rows_total"] == 4
+
+    await job_manager._queue.join()
+    body = (await client.get(f"/books/import/{r.json()['id']}", headers=auth_headers)).json()
+    assert (body["status"], body["rows_imported"], body["rows_rejected"]) == ("completed", 3, 1)
@@ -0,0 +1,67 @@
+# tests/test_limiter.py
+import random
+
+import pytest
+from limits import parse
+from limits.storage import MemoryStorage
+from limits.strategies import SlidingWindowCounterRateLimiter
+from starlette.requests import Request
+
+from src.auth import create_access_token
+from src.utils import limiter as limiter_module
+from src.utils.limiter import LEASE_SWEEP_MIN, LeasedRateLimiter, user_or_ip
+
+
+def _request(headers=None):
+    scope = {"type": "http", "headers": [(k.lower().encode(), v.encode()) for k, v in (headers or {}).items()],
+             "client": ("10.0.0.1", 1234)}
+    return Request(scope)
+
+
+def test_key_is_jwt_subject_or_address():
+    token = create_access_token({"sub": "alice"})
+    assert user_or_ip(_request({"Authorization": f"Bearer {token}"})) == "user:alice"
+    assert user_or_ip(_request({"Authorization": "Bearer forged"})) == "10.0.0.1"
+    assert user_or_ip(_request()) == "10.0.0.1"
+
+
+def test_leases_share_one_budget_across_workers():
+    # one storage stands in for redis, each LeasedRateLimiter for a worker process
+    storage = MemoryStorage()
+    workers = [LeasedRateLimiter(SlidingWindowCounterRateLimiter(storage), 0.1) for _ in range(2)]
+    limit = parse("100/minute")
+
+    assert all(workers[i % 2].hit(limit, "user:bob", "read_books") for i in range(100))
+    # leases grow with each worker's own traffic: most requests never reach the storage
+    assert workers[0].remote_hits + workers[1].remote_hits < 25
+    assert not any(worker.hit(limit, "user:bob", "read_books") for worker in workers)
+
+    assert workers[0].hit(limit, "user:carol", "read_books")
+
+
+@pytest.mark.parametrize("spread", ["round-robin", "random"])
+def test_client_under_the_limit_is_not_rejected_across_many_workers(spread):
+    storage = MemoryStorage()
+    workers = [LeasedRateLimiter(SlidingWindowCounterRateLimiter(storage), 0.05) for _ in range(16)]
+    limit = parse("120/minute")
+    pick = random.Random(7)
+
+    for i in range(60):
+        worker = workers[i % 16] if spread == "round-robin" else pick.choice(workers)
+        assert worker.hit(limit, "user:dave", "read_books")
+
+
+def test_expired_leases_are_swept(monkeypatch):
+    clock = [1000.0]
+    monkeypatch.setattr(limiter_module.time, "monotonic", lambda: clock[0])
+    worker = LeasedRateLimiter(SlidingWindowCounterRateLimiter(MemoryStorage()), 0.1)
+    limit = parse("100/minute")
+
+    for i in range(LEASE_SWEEP_MIN):
+        assert worker.hit(limit, f"10.0.{i // 256}.{i % 256}", "read_books")
+    assert len(worker._leases) == LEASE_SWEEP_MIN
+
+    # every lease has expired by now; the next trip to the storage drops them
+    clock[0] += 60
+    assert worker.hit(limit, "10.9.9.9", "read_books")
+    assert list(worker._leases) == [limit.key_for("10.9.9.9", "read_books")]
@@ -0,0 +1,68 @@
+# tests/test_metrics.py
+import json
+import logging
+
+import pytest
+from sqlalchemy import text
+
+from src import metrics
+
+
+@pytest.mark.asyncio
+async def test_metrics_count_requests_and_statements(client, auth_headers):
+    payload = {"title": "Metered", "author": "Meter Ann", "genre": "History", "published_year": 1990}
+    book_id = (await client.post("/books/", json=payload, headers=auth_headers)).json()["id"]
+    before = metrics.REQUEST_STATEMENTS.count("/books/{book_id}")
+    assert (await client.get(f"/books/{book_id}")).status_code == 200
+    assert metrics.REQUEST_STATEMENTS.count("/books/{book_id}") == before + 1
+
+    r = await client.get("/metrics")
+    assert r.headers["content-type"].startswith("text/plain")
+    body = r.text
+    assert 'http_requests_total{method="GET",route="/books/{book_id}",status="200"}' in body
+    assert 'http_request_phase_seconds_count{route="/books/{book_id}",phase="serialization"}' in body
+    assert 'http_request_phase_seconds_count{route="/auth/token",phase="bcrypt"}' in body
+    assert 'db_statement_duration_seconds_count{operation="SELECT"}' in body
+
+
+@pytest.mark.asyncio
+async def test_slow_queries_and_repeats_are_logged(db_session, monkeypatch, caplog):
+    monkeypatch.setattr(metrics, "SLOW_QUERY_MS", 0.000001)
+    stats = metrics.RequestStats()
+    token = metrics._current.set(stats)
+    try:
+        with caplog.at_level(logging.WARNING, logger="src.metrics"):
+            for i in range(metrics.N_PLUS_ONE_THRESHOLD):
+                await db_session.execute(text("SELECT :n"), {"n": i})
+    finally:
+        metrics._current.reset(token)
+    assert stats.statements == metrics.N_PLUS_ONE_THRESHOLD
+    assert "slow query" in caplog.text and "parameters: (3,)" in caplog.text
+
+    before = metrics.N_PLUS_ONE.value("/test")
+    with caplog.at_level(logging.WARNING, logger="src.metrics"):
+        metrics.MetricsMiddleware._record("GET", "/test", 200, 0.01, stats)
+    assert metrics.N_PLUS_ONE.value("/test") == before + 1
+    assert "possible N+1" in caplog.text
+
+
+@pytest.mark.asyncio
+async def test_metrics_are_summed_across_workers(client, monkeypatch, tmp_path):
+    monkeypatch.setattr(metrics, "METRICS_DIR", str(tmp_path))
+    await client.get("/books/")
+    own = metrics.REQUESTS.value("GET", "/books/", 200)
+
+    # another worker's snapshot, and the counts of one that has already exited
+    other = metrics.REQUESTS.empty()
+    other.inc("GET", "/books/", 200, amount=5)
+    (tmp_path / "worker-2-abc.json").write_text(json.dumps({metrics.REQUESTS.name: other.dump()}))
+    (tmp_path / "archive.json").write_text(json.dumps({metrics.REQUESTS.name: other.dump()}))
+
+    body = (await client.get("/metrics")).text
+    assert f'http_requests_total{{method="GET",route="/books/",status="200"}} {own + 10}' in body
+
+    # a worker leaving (at shutdown) moves its counts into the archive: the total doesn't drop
+    metrics.retire()
+    assert sorted(p.name for p in tmp_path.glob("*.json")) == ["archive.json", "worker-2-abc.json"]
+    left = metrics.merge([json.loads(p.read_text()) for p in tmp_path.glob("*.json")])
+    assert left[metrics.REGISTRY.index(metrics.REQUESTS)].value("GET", "/books/", 200) == own + 10
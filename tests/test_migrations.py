@@ -0,0 +1,66 @@
+# tests/test_migrations.py
+import os
+
+import pytest
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import func, insert, inspect, select, text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from src import models
+from src.crud import select_book_rows
+from src.routes.books import BookFilters
+
+MIGRATIONS = os.path.join(os.path.dirname(__file__), "..", "migrations")
+
+
+def _upgrade(sync_conn):
+    # no ini file, so alembic leaves the logging configuration alone
+    cfg = Config()
+    cfg.set_main_option("script_location", MIGRATIONS)
+    cfg.attributes["connection"] = sync_conn
+    command.upgrade(cfg, "head")
+
+
+async def _plan(conn, query) -> str:
+    sql = query.compile(conn.engine.sync_engine, compile_kwargs={"literal_binds": True})
+    rows = (await conn.execute(text(f"EXPLAIN QUERY PLAN {sql}"))).all()
+    return "\n".join(row[-1] for row in rows)
+
+
+@pytest.mark.asyncio
+async def test_migrations_build_schema_and_hot_queries_use_indexes():
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.connect() as conn:
+        await conn.run_sync(_upgrade)
+        await conn.commit()
+
+        tables = await conn.run_sync(lambda c: set(inspect(c).get_table_names()))
+        assert set(models.Base.metadata.tables) <= tables
+        indexes = await conn.run_sync(lambda c: {i["name"] for i in inspect(c).get_indexes("books")})
+        assert {"ix_books_genre_year_id", "ix_books_author_id_id"} <= indexes
+
+        genres = ["Fiction", "History", "Science", "Fantasy"]
+        await conn.execute(insert(models.Author.__table__), [{"name": f"Plan Author {i}"} for i in range(200)])
+        await conn.execute(insert(models.Book.__table__), [
+            {"title": f"Plan {i}", "genre": genres[i % 4], "published_year": 1900 + i % 120, "author_id": 1 + i % 200}
+            for i in range(5000)
+        ])
+        await conn.execute(text("ANALYZE"))
+
+        b = models.Book
+        # GET /books/?genre=&year_from=&year_to=&sort=published_year: one range scan, already in order
+        q = BookFilters(genre="History", year_from=1990, year_to=1999).apply(select_book_rows(), author_joined=True)
+        plan = await _plan(conn, q.order_by(b.published_year.asc().nulls_last(), b.id).limit(20))
+        assert "USING INDEX ix_books_genre_year_id" in plan
+        assert "TEMP B-TREE" not in plan
+
+        # recommendation candidates by author
+        plan = await _plan(conn, select(b.id).where(b.author_id == 5)
+                           .order_by(func.abs(b.published_year - 1990)).limit(20))
+        assert "USING INDEX ix_books_author_id_id" in plan
+
+        # GET /books/{id}: primary keys on both sides of the join
+        plan = await _plan(conn, select_book_rows().where(b.id == 5))
+        assert "SCAN" not in plan
+    await engine.dispose()
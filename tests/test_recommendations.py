@@ -0,0 +1,54 @@
+# tests/test_recommendations.py
+import numpy as np
+import pandas as pd
+import pytest
+from sqlalchemy import func, select
+
+from src import models
+from src.recommendations import Catalogue, neighbours, rebuild_recommendations
+
+
+def test_neighbours_rank_author_genre_and_year():
+    cat = Catalogue(pd.DataFrame([
+        (1, 10, "Fantasy", 2000, "Dragon Song"),
+        (2, 10, "Fantasy", 2002, "Dragon Fire"),    # same author, genre, close year, shared token
+        (3, 10, "History", 1950, "Old Roads"),      # same author only
+        (4, 20, "Fantasy", 2001, "Elf Queen"),      # same genre, close year
+        (5, 30, "Science", 2000, "Atoms"),          # nothing in common
+        (6, 40, None, None, "Untitled"),
+    ], columns=["id", "author_id", "genre", "published_year", "title"]))
+    idx, scores = neighbours(cat, k=3)
+
+    assert cat.ids[idx[0][idx[0] >= 0]].tolist() == [2, 3, 4]
+    assert np.all(np.diff(scores[0][idx[0] >= 0]) <= 0)
+    assert 5 not in cat.ids[idx[0][idx[0] >= 0]]
+    assert (idx[5] == -1).all()
+    assert all(i not in row for i, row in enumerate(idx))
+
+
+@pytest.mark.asyncio
+async def test_recommend_reads_materialized_pages(client, auth_headers, db_session):
+    books = [("Moon Tides", 1990), ("Moon Gates", 1992), ("Sun Gates", 2010), ("Star Maps", 1950)]
+    ids = []
+    for title, year in books:
+        payload = {"title": title, "author": "Rec Author", "genre": "Fantasy", "published_year": year}
+        ids.append((await client.post("/books/", json=payload, headers=auth_headers)).json()["id"])
+
+    csv_data = "title,author,genre,published_year\nMoon Rivers,Rec Author,Fantasy,1991\n"
+    r = await client.post("/books/import", files={"file": ("b.csv", csv_data, "text/csv")}, headers=auth_headers)
+    assert r.json()["imported"] == 1
+    imported_id = max((await db_session.execute(select(models.Book.id))).scalars())
+    # not materialized yet: computed on the spot
+    r = await client.get(f"/books/{imported_id}/recommend", params={"limit": 2})
+    assert [b["title"] for b in r.json()] == ["Moon Tides", "Moon Gates"]
+
+    stored = await rebuild_recommendations(db_session, k=20)
+    assert stored == (await db_session.execute(select(func.count()).select_from(models.BookRecommendation))).scalar()
+
+    first = (await client.get(f"/books/{ids[0]}/recommend", params={"limit": 2})).json()
+    second = (await client.get(f"/books/{ids[0]}/recommend", params={"limit": 2, "skip": 2})).json()
+    assert [b["title"] for b in first][:2] == ["Moon Rivers", "Moon Gates"]
+    assert first[0]["score"] >= first[1]["score"] >= second[0]["score"]
+    assert ids[0] not in [b["id"] for b in first + second]
+
+    assert (await client.get("/books/999999/recommend")).status_code == 404
@@ -0,0 +1,156 @@
+# tests/test_replicas.py
+import asyncio
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import insert, update
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from src import models, replicas
+from src.cache import cache
+from src.crud import bump_catalogue_version, get_catalogue_state
+from src.database import Base
+from tests.conftest import AsyncSessionLocal
+
+
+@pytest.mark.asyncio
+async def test_reads_go_to_a_caught_up_replica_except_after_own_writes(client, auth_headers, db_session,
+                                                                       tmp_path, monkeypatch):
+    # a second SQLite database stands in for the replica
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/replica.db")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    replica_session = async_sessionmaker(engine, expire_on_commit=False)
+    async with replica_session() as session:
+        author = models.Author(name="Replica Author")
+        session.add(models.Book(title="Replica Only", genre="History", published_year=2001, author=author))
+        await bump_catalogue_version(session)
+        await session.commit()
+    await bump_catalogue_version(db_session)
+    await db_session.commit()
+
+    router = replicas.ReplicaRouter([replicas.Replica("replica", replica_session)], max_lag=5,
+                                    session_factory=AsyncSessionLocal)
+    monkeypatch.setattr(replicas, "replica_router", router)
+    await router.check()
+
+    def titles(r):
+        return [b["title"] for b in r.json()]
+
+    # the replica's catalogue version is behind the primary's, but only by a moment
+    assert titles(await client.get("/books/", params={"title": "Replica"})) == ["Replica Only"]
+    assert router.replicas[0].lag < 5
+
+    payload = {"title": "Replica Written", "author": "Replica Author", "genre": "History", "published_year": 2002}
+    r = await client.post("/books/", json=payload, headers=auth_headers)
+    assert replicas.PRIMARY_COOKIE in r.cookies
+    assert titles(await client.get("/books/", params={"title": "Replica"})) == ["Replica Written"]
+
+    # the read-your-writes window passes
+    client.cookies.clear()
+    monkeypatch.setattr(replicas, "time", SimpleNamespace(time=lambda: time.time() + 60, monotonic=time.monotonic))
+    # new params, so the response cached by the previous read isn't reused
+    assert titles(await client.get("/books/", params={"title": "Replica", "limit": 8})) == ["Replica Only"]
+    # ... and the replica's possibly stale answer is not cached for anyone else
+    hits = cache.hits
+    assert titles(await client.get("/books/", params={"title": "Replica", "limit": 8})) == ["Replica Only"]
+    assert cache.hits == hits
+
+    # a replica that has missed a write for longer than max_lag is skipped
+    await db_session.execute(update(models.CatalogueState).values(
+        updated_at=datetime.utcnow() - timedelta(minutes=1)))
+    await db_session.commit()
+    await router.check()
+    assert titles(await client.get("/books/", params={"title": "Replica", "limit": 9})) == ["Replica Written"]
+    assert router.replicas[0].lag > 5
+    assert router.stats()["replica_reads"] == 3
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_writers_without_the_cookie_still_read_their_writes(client, auth_headers, tmp_path, monkeypatch):
+    # an empty replica that claims to be caught up: any read it serves misses the write
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/replica.db")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    router = replicas.ReplicaRouter([replicas.Replica("replica", async_sessionmaker(engine))])
+    router.replicas[0].lag = 0.0
+    monkeypatch.setattr(replicas, "replica_router", router)
+
+    payload = {"title": "Cookieless Write", "author": "Script Author", "genre": "Science", "published_year": 2003}
+    assert (await client.post("/books/", json=payload, headers=auth_headers)).status_code == 200
+    client.cookies.clear()
+
+    def read(limit):
+        return client.get("/books/", params={"title": "Cookieless", "limit": limit}, headers=auth_headers)
+
+    # same token, no cookie: served by the primary
+    assert [b["title"] for b in (await read(5)).json()] == ["Cookieless Write"]
+    assert router.stats()["replica_reads"] == 0
+
+    # once the window has passed, reads go back to the replica
+    monkeypatch.setattr(replicas, "time", SimpleNamespace(time=lambda: time.time() + 60, monotonic=time.monotonic))
+    assert (await read(6)).json() == []
+    assert router.stats()["replica_reads"] == 1
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_caught_up_replica_fills_the_cache(db_session, client, tmp_path, monkeypatch):
+    await bump_catalogue_version(db_session)
+    await db_session.commit()
+    version, updated_at = await get_catalogue_state(db_session)
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/replica.db")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(insert(models.CatalogueState).values(id=1, version=version, updated_at=updated_at))
+    router = replicas.ReplicaRouter([replicas.Replica("replica", async_sessionmaker(engine))],
+                                    session_factory=AsyncSessionLocal)
+    monkeypatch.setattr(replicas, "replica_router", router)
+    await router.check()
+
+    params = {"title": "Filled From Replica"}
+    await client.get("/books/", params=params)
+    hits = cache.hits
+    await client.get("/books/", params=params)
+    assert cache.hits == hits + 1 and router.stats()["replica_reads"] == 2
+
+    # after a write of this process the replica is not known to have it until the next check
+    router.wrote()
+    assert not router.caught_up(version)
+    await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_hanging_replica_does_not_stall_reads(client, tmp_path, monkeypatch):
+    class Hang:
+        async def __aenter__(self):
+            await asyncio.sleep(3600)
+
+        async def __aexit__(self, *exc):
+            return False
+
+    engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/replica.db")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    router = replicas.ReplicaRouter([replicas.Replica("black-hole", lambda: Hang()),
+                                     replicas.Replica("ok", async_sessionmaker(engine))],
+                                    check_interval=3600, check_timeout=0.2, session_factory=AsyncSessionLocal)
+    monkeypatch.setattr(replicas, "replica_router", router)
+    try:
+        router.start()
+        # requests don't wait for the check in progress: they use the last known lag (none yet: primary)
+        started = time.monotonic()
+        assert (await client.get("/books/", params={"title": "Hang"})).status_code == 200
+        assert time.monotonic() - started < 0.2
+        assert router.stats()["primary_reads"] == 1
+
+        # the check gives up on the hanging replica alone
+        await asyncio.sleep(0.4)
+        assert router.stats()["replicas"] == {"black-hole": None, "ok": router.replicas[1].lag}
+        assert router.replicas[1].lag is not None and router.pick().name == "ok"
+    finally:
+        await router.stop()
+        await engine.dispose()
@@ -0,0 +1,99 @@
+# tests/test_search_index.py
+import pytest
+
+from src.routes import books as books_routes
+from src import search_index as search_index_module
+from src.search_index import InvertedIndex, search_index
+
+
+@pytest.fixture
+def index():
+    idx = InvertedIndex()
+    idx.add_book(1, "The Hobbit", 10, "J. R. R. Tolkien")
+    idx.add_book(2, "The Silmarillion", 10, "J. R. R. Tolkien")
+    idx.add_book(3, "Hobbit Recipes", 20, "Someone Else")
+    return idx
+
+
+def test_term_prefix_and_fuzzy_queries(index):
+    assert [i for i, _ in index.search("hobbit", mode="term")] == [1, 3]
+    assert index.search("hob", mode="term") == []
+    assert [i for i, _ in index.search("silm")] == [2]
+    assert [i for i, _ in index.search("hobit", mode="fuzzy")] == [1, 3]
+    assert [i for i, _ in index.search("tolkein", mode="fuzzy")] == [1, 2]
+
+
+def test_terms_must_all_match_and_titles_rank_first(index):
+    assert index.search("tolkien hobbit") == [(1, 3.0)]
+    index.add_book(4, "About Tolkien", 20, "Someone Else")
+    # title match (2) beats author match (1)
+    assert index.search("tolkien") == [(4, 2.0), (1, 1.0), (2, 1.0)]
+
+
+def test_update_and_delete(index):
+    index.add_book(1, "There and Back Again", 10, "J. R. R. Tolkien")
+    assert [i for i, _ in index.search("hobbit")] == [3]
+    assert [i for i, _ in index.search("back")] == [1]
+    index.remove_book(3)
+    assert index.search("hobbit") == []
+    index.compact()
+    assert index.search("recipes") == []
+    assert len(index) == 2
+
+
+@pytest.mark.asyncio
+async def test_search_endpoint_uses_index(client, auth_headers, db_session, monkeypatch):
+    monkeypatch.setattr(books_routes, "SEARCH_INDEX_ENABLED", True)
+    await search_index.build(db_session)
+
+    payload = {"title": "Zyzzyva Chronicles", "author": "Index Author", "genre": "Fantasy", "published_year": 2001}
+    created = (await client.post("/books/", json=payload, headers=auth_headers)).json()
+    r = await client.get("/books/search", params={"q": "zyzzyvaa", "mode": "fuzzy"})
+    assert r.status_code == 200
+    assert [b["id"] for b in r.json()] == [created["id"]]
+
+    await client.delete(f"/books/{created['id']}", headers=auth_headers)
+    r = await client.get("/books/search", params={"q": "zyzzyva"})
+    assert r.json() == []
+
+
+@pytest.mark.asyncio
+async def test_build_sorts_new_terms_once(client, auth_headers, db_session, monkeypatch):
+    for title in ("Walrus Quest", "Aardvark Tales", "Marmot Saga"):
+        payload = {"title": title, "author": "Bulk Author", "genre": "Fantasy", "published_year": 2002}
+        await client.post("/books/", json=payload, headers=auth_headers)
+
+    def no_insort(*args):
+        raise AssertionError("insort during a bulk load")
+
+    monkeypatch.setattr(search_index_module, "insort", no_insort)
+    idx = InvertedIndex()
+    await idx.build(db_session)
+    assert idx._sorted_terms == sorted(idx._sorted_terms)
+    assert len(idx.search("aardv")) == 1 and len(idx.search("walr")) == 1
+
+    # incremental adds still keep the terms sorted
+    monkeypatch.undo()
+    idx.add_book(idx.max_book_id + 1, "Zebra Mornings", 1, "Bulk Author")
+    assert idx._sorted_terms == sorted(idx._sorted_terms)
+    assert len(idx.search("zebr")) == 1
+
+
+@pytest.mark.asyncio
+async def test_imported_book_reusing_a_deleted_id_is_indexed(client, auth_headers, db_session, monkeypatch):
+    monkeypatch.setattr(books_routes, "SEARCH_INDEX_ENABLED", True)
+    await search_index.build(db_session)
+    payload = {"title": "Doomed Last Book", "author": "Reuse Author", "genre": "Fantasy", "published_year": 2004}
+    last_id = (await client.post("/books/", json=payload, headers=auth_headers)).json()["id"]
+    await client.delete(f"/books/{last_id}", headers=auth_headers)
+
+    # SQLite gives the deleted last row's id to the next insert, below the index's max_book_id
+    csv_data = "title,author,genre,published_year\nQuokka Dreams,Reuse Author,Fantasy,2005\n"
+    r = await client.post("/books/import", files={"file": ("books.csv", csv_data, "text/csv")}, headers=auth_headers)
+    assert r.json()["imported"] == 1
+    r = await client.get("/books/search", params={"q": "quokka"})
+    assert [b["title"] for b in r.json()] == ["Quokka Dreams"]
+
+    r = await client.post("/books/batch", json=[{**payload, "title": "Wombat Nights"}], headers=auth_headers)
+    assert r.json()["succeeded"] == 1
+    assert [b["title"] for b in (await client.get("/books/search", params={"q": "wombat"})).json()] == ["Wombat Nights"]
@@ -0,0 +1,67 @@
+# tests/test_server.py
+import os
+
+import pytest
+
+from src import main, server
+from src.database import InstrumentedQueuePool, create_engine
+from src.server import worker_pool_settings
+from tests.conftest import engine_test
+
+
+def test_worker_pool_settings_share_max_connections():
+    assert worker_pool_settings(4, max_connections=0, pool_size=10, max_overflow=10) == {
+        "DB_POOL_SIZE": 10, "DB_MAX_OVERFLOW": 10}
+    assert worker_pool_settings(32, max_connections=200, pool_size=10, max_overflow=10) == {
+        "DB_POOL_SIZE": 6, "DB_MAX_OVERFLOW": 0}
+    assert worker_pool_settings(8, max_connections=100, pool_size=10, max_overflow=10) == {
+        "DB_POOL_SIZE": 10, "DB_MAX_OVERFLOW": 2}
+    # never below one connection per worker
+    assert worker_pool_settings(64, max_connections=10)["DB_POOL_SIZE"] == 1
+
+
+@pytest.mark.asyncio
+async def test_health_and_ready(client, monkeypatch):
+    monkeypatch.setattr(main, "engine", engine_test)
+    r = await client.get("/health")
+    assert r.status_code == 200 and r.json() == {"status": "ok"}
+    r = await client.get("/ready")
+    assert r.status_code == 200 and r.json()["status"] == "ready"
+
+
+@pytest.mark.asyncio
+async def test_ready_fails_while_pool_is_exhausted(client, monkeypatch, tmp_path):
+    engine = create_engine(f"sqlite+aiosqlite:///{tmp_path}/ready.db", poolclass=InstrumentedQueuePool,
+                           pool_size=1, max_overflow=0, pool_timeout=5)
+    monkeypatch.setattr(main, "engine", engine)
+    monkeypatch.setattr(main, "READY_TIMEOUT", 0.05)
+    async with engine.connect():
+        r = await client.get("/ready")
+        assert r.status_code == 503
+        body = r.json()
+        assert body["reason"] == "pool checkout timed out" and body["pool"]["in_use"] == 1
+    assert (await client.get("/ready")).status_code == 200
+    await engine.dispose()
+
+
+def test_metrics_dir_is_emptied_or_created(monkeypatch, tmp_path):
+    (tmp_path / "worker-1-abc.json").write_text("{}")
+    monkeypatch.setattr(server, "METRICS_DIR", str(tmp_path))
+    assert server.metrics_dir() == str(tmp_path) and not list(tmp_path.iterdir())
+
+    monkeypatch.setattr(server, "METRICS_DIR", "")
+    created = server.metrics_dir()
+    assert os.path.isdir(created) and created != str(tmp_path)
+    os.rmdir(created)
+
+
+def test_per_process_state_is_reported(monkeypatch):
+    monkeypatch.setattr(server, "RATE_LIMIT_STORAGE_URI", "memory://")
+    monkeypatch.setattr(server, "CACHE_BACKEND", "memory")
+    monkeypatch.setattr(server, "SEARCH_INDEX_ENABLED", False)
+    assert [s.split(":")[0] for s in server.per_process_state()] == [
+        "RATE_LIMIT_STORAGE_URI=memory", "CACHE_BACKEND=memory"]
+
+    monkeypatch.setattr(server, "RATE_LIMIT_STORAGE_URI", "redis://redis:6379")
+    monkeypatch.setattr(server, "CACHE_BACKEND", "redis")
+    assert server.per_process_state() == []